@@ -3,3 +3,6 @@ class AdminPanelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'admin_panel'
 
+    def ready(self):
+        import admin_panel.signals  # noqa
+
@@ -0,0 +1,174 @@
+"""
+管理后台仪表板计数器
+通过模型信号增量维护待审核队列、总数和每日新增等计数，读取仪表板时只查询计数表；
+计数行缺失时即时重算，recount_dashboard_counters 命令定期全量校准
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete
+from django.utils import timezone
+
+from .models import DashboardCounter
+
+# 计数名称 -> 全量计算函数
+COUNTERS = {}
+
+# 每日计数前缀 -> (模型, 时间字段)，计数名称形如 "new_users:2025-10-30"
+DAILY_COUNTERS = {}
+
+# 模型 -> [(计数名称, 实例状态属性, 判断函数), ...]，供批量更新后同步计数
+TRACKED = {}
+
+
+def register_counter(name, compute):
+    COUNTERS[name] = compute
+
+
+def register_daily_counter(prefix, model, date_field):
+    DAILY_COUNTERS[prefix] = (model, date_field)
+
+
+def daily_name(prefix, day=None):
+    day = day or timezone.localdate()
+    return f"{prefix}:{day.isoformat()}"
+
+
+def day_range(day):
+    """某一自然日的[开始, 结束)时间范围，用于可走索引的范围查询"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def compute(name):
+    """全量计算单个计数"""
+    if name in COUNTERS:
+        return COUNTERS[name]()
+
+    prefix, _, day = name.partition(':')
+    if prefix in DAILY_COUNTERS and day:
+        model, date_field = DAILY_COUNTERS[prefix]
+        start, end = day_range(datetime.strptime(day, '%Y-%m-%d').date())
+        return model.objects.filter(**{f'{date_field}__gte': start, f'{date_field}__lt': end}).count()
+
+    raise KeyError(f'未注册的计数: {name}')
+
+
+def recount(names):
+    """全量重算指定计数并写入计数表，返回 {名称: 值}"""
+    values = {}
+    with transaction.atomic():
+        for name in names:
+            values[name] = compute(name)
+            DashboardCounter.objects.update_or_create(name=name, defaults={'value': values[name]})
+    return values
+
+
+def increment(name, delta=1):
+    """增量更新计数；计数行不存在时改为全量重算"""
+    if not delta:
+        return
+    with transaction.atomic():
+        updated = DashboardCounter.objects.filter(name=name).update(
+            value=F('value') + delta, updated_at=timezone.now()
+        )
+        if not updated:
+            recount([name])
+
+
+def get_counters(names):
+    """一次查询读取多个计数，缺失的计数即时重算"""
+    values = dict(DashboardCounter.objects.filter(name__in=names).values_list('name', 'value'))
+    missing = [name for name in names if name not in values]
+    if missing:
+        values.update(recount(missing))
+    return values
+
+
+def track_counter(model, name, **filters):
+    """
+    注册计数并通过信号维护：模型实例的字段等于filters中的值时计入name
+    （filters为空时统计全部实例）；实例加载时这些字段被延迟则退化为全量重算
+    """
+    register_counter(name, lambda: model.objects.filter(**filters).count())
+    attr = f'_dashboard_state_{name}'
+
+    def predicate(instance):
+        return all(getattr(instance, field) == value for field, value in filters.items())
+
+    TRACKED.setdefault(model, []).append((name, attr, predicate))
+
+    def remember(sender, instance, **kwargs):
+        if not instance.pk:
+            state = False
+        elif instance.get_deferred_fields() & set(filters):
+            state = None
+        else:
+            state = predicate(instance)
+        setattr(instance, attr, state)
+
+    def saved(sender, instance, created, **kwargs):
+        old = False if created else getattr(instance, attr, None)
+        new = predicate(instance)
+        if old is None:
+            recount([name])
+        elif old != new:
+            increment(name, 1 if new else -1)
+        setattr(instance, attr, new)
+
+    def deleted(sender, instance, **kwargs):
+        old = getattr(instance, attr, None)
+        if old is None:
+            recount([name])
+        elif old:
+            increment(name, -1)
+
+    uid = f'dashboard_counter_{name}'
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=uid)
+
+
+def sync_bulk_update(model, instances):
+    """
+    bulk_update/update不会触发信号，批量修改已加载的实例后调用，
+    按实例加载时记录的状态合并计数变化，每个计数只写一次
+    """
+    for name, attr, predicate in TRACKED.get(model, ()):
+        delta = 0
+        unknown = False
+        for instance in instances:
+            old = getattr(instance, attr, None)
+            new = predicate(instance)
+            if old is None:
+                unknown = True
+            elif old != new:
+                delta += 1 if new else -1
+            setattr(instance, attr, new)
+        if unknown:
+            recount([name])
+        else:
+            increment(name, delta)
+
+
+def track_daily_counter(model, prefix, date_field):
+    """注册每日新增计数并在实例创建、删除时增量维护"""
+    register_daily_counter(prefix, model, date_field)
+
+    def saved(sender, instance, created, **kwargs):
+        created_at = getattr(instance, date_field, None)
+        if created and created_at:
+            increment(daily_name(prefix, timezone.localdate(created_at)))
+
+    def deleted(sender, instance, **kwargs):
+        created_at = getattr(instance, date_field, None)
+        if created_at:
+            # 只在计数行已存在时扣减，缺失的行下次读取时会全量计算
+            DashboardCounter.objects.filter(
+                name=daily_name(prefix, timezone.localdate(created_at))
+            ).update(value=F('value') - 1, updated_at=timezone.now())
+
+    uid = f'dashboard_daily_counter_{prefix}'
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=uid)
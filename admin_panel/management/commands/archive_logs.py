@@ -0,0 +1,55 @@
+"""
+日志归档管理命令
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from utils.log_archive import available_archives, get_archive
+
+
+class Command(BaseCommand):
+    help = '将超过保留期的操作日志和登录历史移入压缩归档，并分批删除已归档的行'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log',
+            action='append',
+            dest='logs',
+            help='只归档指定日志（可多次指定），可选值见 LOG_ARCHIVE_MODELS',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.LOG_RETENTION_DAYS,
+            help=f'保留天数（默认{settings.LOG_RETENTION_DAYS}天）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.LOG_ARCHIVE_BATCH_SIZE,
+            help='每批归档并删除的行数',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='只统计待归档的行数，不写入文件也不删除',
+        )
+
+    def handle(self, *args, **options):
+        names = options['logs'] or available_archives()
+        unknown = set(names) - set(available_archives())
+        if unknown:
+            raise CommandError(f"未知或未安装的日志: {', '.join(sorted(unknown))}")
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        self.stdout.write(f'开始归档 {cutoff:%Y-%m-%d %H:%M} 之前的日志..')
+
+        for name in names:
+            count = get_archive(name).archive(
+                cutoff, batch_size=options['batch_size'], dry_run=options['dry_run']
+            )
+            verb = '待归档' if options['dry_run'] else '已归档'
+            self.stdout.write(self.style.SUCCESS(f'{name}: {verb} {count} 行'))
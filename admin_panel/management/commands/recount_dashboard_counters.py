@@ -0,0 +1,53 @@
+"""
+仪表板计数器校准管理命令
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from admin_panel.models import DashboardCounter
+from admin_panel.dashboard_counters import COUNTERS, DAILY_COUNTERS, daily_name, recount
+
+
+class Command(BaseCommand):
+    help = '全量重算仪表板计数器，校正增量维护产生的偏差并清理过期的每日计数'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=1,
+            help='重算最近N天的每日新增计数（默认只重算今天）',
+        )
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=31,
+            help='每日计数保留天数，更早的计数行将被删除（默认31天）',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        names = list(COUNTERS)
+        for offset in range(options['days']):
+            day = today - timedelta(days=offset)
+            names.extend(daily_name(prefix, day) for prefix in DAILY_COUNTERS)
+
+        stored = dict(DashboardCounter.objects.filter(name__in=names).values_list('name', 'value'))
+        values = recount(names)
+        for name, value in values.items():
+            if stored.get(name) != value:
+                self.stdout.write(self.style.WARNING(f"{name}: {stored.get(name)} -> {value}"))
+
+        # 清理过期的每日计数
+        cutoff = today - timedelta(days=options['keep_days'])
+        expired = [
+            row_id for row_id, name in DashboardCounter.objects.filter(name__contains=':').values_list('id', 'name')
+            if name.partition(':')[2] < cutoff.isoformat()
+        ]
+        DashboardCounter.objects.filter(id__in=expired).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"计数器校准完成！共重算 {len(values)} 个计数，清理 {len(expired)} 个过期计数"
+        ))
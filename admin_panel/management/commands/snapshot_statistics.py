@@ -0,0 +1,47 @@
+"""
+系统统计快照管理命令
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from admin_panel.statistics import backfill_start_date, take_snapshots
+
+
+class Command(BaseCommand):
+    help = '生成每日系统统计快照（默认昨天），支持按日期范围回填历史数据'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='开始日期（YYYY-MM-DD）')
+        parser.add_argument('--end', help='结束日期（YYYY-MM-DD），默认与开始日期相同')
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='从最早的用户注册日期回填到昨天',
+        )
+
+    def _parse(self, value):
+        day = parse_date(value) if value else None
+        if value and day is None:
+            raise CommandError(f'日期格式错误: {value}')
+        return day
+
+    def handle(self, *args, **options):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        start = self._parse(options['start'])
+        end = self._parse(options['end'])
+
+        if options['backfill']:
+            start = start or backfill_start_date()
+            end = end or yesterday
+        else:
+            start = start or yesterday
+            end = end or start
+        if start > end:
+            raise CommandError('开始日期不能晚于结束日期')
+
+        self.stdout.write(f'开始生成统计快照: {start} ~ {end}')
+        count = take_snapshots(start, end)
+        self.stdout.write(self.style.SUCCESS(f'统计快照生成完成！共写入 {count} 天'))
@@ -25,3 +25,11 @@ class SystemStatistics(models.Model):
     class Meta:
         db_table = 'admin_statistics'
 
+class DashboardCounter(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'admin_dashboard_counters'
+
@@ -1,4 +1,5 @@
 ﻿from rest_framework import serializers
+from vehicles.models import Vehicle
 from .models import AdminLog, SystemStatistics
 
 class AdminLogSerializer(serializers.ModelSerializer):
@@ -13,3 +14,39 @@ class SystemStatisticsSerializer(serializers.ModelSerializer):
         model = SystemStatistics
         fields = ['id', 'date', 'total_users', 'total_vehicles', 'total_orders', 'total_revenue', 'active_users']
 
+class VehicleReviewSerializer(serializers.ModelSerializer):
+    """审核队列中的车辆"""
+    brand_name = serializers.CharField(source='brand.name', read_only=True)
+    seller_name = serializers.CharField(source='seller.username', read_only=True)
+    main_photo = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Vehicle
+        fields = [
+            'id', 'vin', 'brand', 'brand_name', 'model_name', 'year', 'mileage', 'price',
+            'seller', 'seller_name', 'main_photo', 'status', 'review_status', 'review_notes',
+            'is_suspected_duplicate', 'duplicate_flags', 'created_at',
+        ]
+
+    def get_main_photo(self, obj):
+        # 使用photos.all()以便复用prefetch_related的结果
+        photo = next((photo for photo in obj.photos.all() if photo.is_main), None)
+        return photo.image.url if photo and photo.image else None
+
+class VehicleReviewBulkActionSerializer(serializers.Serializer):
+    vehicle_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=500,
+    )
+    action = serializers.ChoiceField(choices=['approve', 'reject'])
+    review_note = serializers.CharField(required=False, allow_blank=True, max_length=1000)
+
+    def validate_vehicle_ids(self, value):
+        """去重并保持提交顺序"""
+        return list(dict.fromkeys(value))
+
+    def validate(self, data):
+        if data['action'] == 'reject' and not data.get('review_note'):
+            raise serializers.ValidationError({'review_note': '拒绝审核时必须填写拒绝原因'})
+        return data
@@ -0,0 +1,17 @@
+"""
+管理后台信号注册
+为仪表板计数器挂接用户、车辆和订单的增量维护
+"""
+from users.models import User
+from vehicles.models import Vehicle
+from orders.models import Order
+from .dashboard_counters import track_counter, track_daily_counter
+
+track_counter(User, 'total_users')
+track_counter(Vehicle, 'total_vehicles')
+track_counter(Order, 'total_orders')
+track_counter(Vehicle, 'pending_vehicles', review_status='pending')
+
+track_daily_counter(User, 'new_users', 'date_joined')
+track_daily_counter(Vehicle, 'new_vehicles', 'created_at')
+track_daily_counter(Order, 'new_orders', 'created_at')
@@ -0,0 +1,134 @@
+"""
+系统统计快照
+按天生成 SystemStatistics 行（截至当天结束的累计用户、车辆、订单、成交额及当天活跃用户），
+并提供按日/周/月降采样的时间序列，增长图表只读取预聚合的快照行
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from users.models import User, UserLoginHistory
+from vehicles.models import Vehicle
+from orders.models import Order
+
+from .dashboard_counters import day_range
+from .models import SystemStatistics
+
+INTERVALS = ('day', 'week', 'month')
+
+# 累计字段，降采样时取区间最后一天的值
+TOTAL_FIELDS = ('total_users', 'total_vehicles', 'total_orders', 'total_revenue')
+
+
+def _daily(queryset, field, start, end, value):
+    """[start, end)内按本地日期分组的聚合值 {日期: 值}，一次分组查询"""
+    rows = queryset.filter(**{f'{field}__gte': start, f'{field}__lt': end}).annotate(
+        day=TruncDate(field)
+    ).order_by().values('day').annotate(value=value)
+    return {row['day']: row['value'] for row in rows}
+
+
+def _totals_before(moment):
+    """某一时刻之前的累计值"""
+    return {
+        'total_users': User.objects.filter(date_joined__lt=moment).count(),
+        'total_vehicles': Vehicle.objects.filter(created_at__lt=moment).count(),
+        'total_orders': Order.objects.filter(created_at__lt=moment).count(),
+        'total_revenue': Order.objects.filter(
+            status='completed', completed_at__lt=moment
+        ).aggregate(total=Sum('price'))['total'] or Decimal('0'),
+    }
+
+
+def compute_snapshots(start_date, end_date):
+    """
+    计算[start_date, end_date]内每天的统计值，返回 [(日期, {字段: 值}), ...]
+    起始日之前做一次累计查询，范围内每个数据源按日期分组查询一次，再逐日滚动累加
+    """
+    start, end = day_range(start_date)[0], day_range(end_date)[1]
+    totals = _totals_before(start)
+    new_users = _daily(User.objects, 'date_joined', start, end, Count('id'))
+    new_vehicles = _daily(Vehicle.objects, 'created_at', start, end, Count('id'))
+    new_orders = _daily(Order.objects, 'created_at', start, end, Count('id'))
+    revenue = _daily(Order.objects.filter(status='completed'), 'completed_at', start, end, Sum('price'))
+    active_users = _daily(
+        UserLoginHistory.objects.filter(success=True), 'login_time', start, end, Count('user_id', distinct=True)
+    )
+
+    results = []
+    day = start_date
+    while day <= end_date:
+        totals['total_users'] += new_users.get(day, 0)
+        totals['total_vehicles'] += new_vehicles.get(day, 0)
+        totals['total_orders'] += new_orders.get(day, 0)
+        totals['total_revenue'] += revenue.get(day) or Decimal('0')
+        results.append((day, dict(totals, active_users=active_users.get(day, 0))))
+        day += timedelta(days=1)
+    return results
+
+
+def take_snapshots(start_date, end_date=None):
+    """生成（或覆盖）日期范围内的快照行，返回写入的行数"""
+    end_date = end_date or start_date
+    snapshots = compute_snapshots(start_date, end_date)
+    with transaction.atomic():
+        for day, values in snapshots:
+            SystemStatistics.objects.update_or_create(date=day, defaults=values)
+    return len(snapshots)
+
+
+def backfill_start_date():
+    """最早有数据的日期，用于历史回填"""
+    first_joined = User.objects.order_by('date_joined').values_list('date_joined', flat=True).first()
+    return timezone.localdate(first_joined) if first_joined else timezone.localdate()
+
+
+def _bucket_start(day, interval):
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def time_series(start_date, end_date, interval='day'):
+    """
+    读取快照并按日/周/月降采样
+    累计字段取区间最后一天的值，新增量为相邻区间累计值之差，活跃用户为区间内日活的平均值和峰值
+    """
+    rows = SystemStatistics.objects.filter(
+        date__gte=start_date, date__lte=end_date
+    ).order_by('date').values('date', 'active_users', *TOTAL_FIELDS)
+
+    buckets = []
+    for row in rows:
+        key = _bucket_start(row['date'], interval)
+        if not buckets or buckets[-1]['date'] != key:
+            buckets.append({'date': key, 'active_days': []})
+        bucket = buckets[-1]
+        bucket.update({field: row[field] for field in TOTAL_FIELDS})
+        bucket['active_days'].append(row['active_users'])
+
+    # 第一个区间的新增量以起始日前一天的快照为基准
+    previous = SystemStatistics.objects.filter(date__lt=start_date).order_by('-date').values(*TOTAL_FIELDS).first()
+
+    series = []
+    for bucket in buckets:
+        active_days = bucket.pop('active_days')
+        point = {
+            'date': bucket['date'],
+            **{field: bucket[field] for field in TOTAL_FIELDS},
+            'new_users': bucket['total_users'] - previous['total_users'] if previous else None,
+            'new_vehicles': bucket['total_vehicles'] - previous['total_vehicles'] if previous else None,
+            'new_orders': bucket['total_orders'] - previous['total_orders'] if previous else None,
+            'revenue': bucket['total_revenue'] - previous['total_revenue'] if previous else None,
+            'active_users': round(sum(active_days) / len(active_days)),
+            'peak_active_users': max(active_days),
+        }
+        series.append(point)
+        previous = bucket
+    return series
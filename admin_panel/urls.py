@@ -5,6 +5,7 @@ from . import views
 router = DefaultRouter()
 router.register(r'logs', views.AdminLogViewSet, basename='log')
 router.register(r'statistics', views.SystemStatisticsViewSet, basename='statistics')
+router.register(r'vehicle-reviews', views.VehicleReviewViewSet, basename='vehicle-review')
 
 urlpatterns = [path('', include(router.urls))]
 
@@ -1,21 +1,54 @@
 ﻿from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.db import transaction
 from django.db.models import Count, Q, Sum
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
 from .models import AdminLog, SystemStatistics
-from .serializers import AdminLogSerializer, SystemStatisticsSerializer
-from users.models import User
+from .serializers import (
+    AdminLogSerializer, SystemStatisticsSerializer, VehicleReviewSerializer, VehicleReviewBulkActionSerializer,
+)
+from .dashboard_counters import daily_name, get_counters, sync_bulk_update
+from users.counters import sync_vehicle_bulk_update
 from vehicles.models import Vehicle
-from orders.models import Order
+from vehicles.signals import sync_listing_bulk_update
+from .statistics import INTERVALS, time_series
+from utils.log_archive import available_archives, get_archive
 
 class AdminLogViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = AdminLog.objects.all()
     serializer_class = AdminLogSerializer
     permission_classes = [IsAuthenticated]
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def archived(self, request):
+        """
+        查询可归档日志（热表与归档合并，按时间倒序，游标翻页）
+        GET /api/admin/logs/archived/?log=user_login&user=1&start=2025-01-01&end=2025-03-31&cursor=...
+        """
+        name = request.query_params.get('log')
+        if name not in available_archives():
+            return Response({'error': f"log 必须是 {', '.join(available_archives())} 之一"}, status=status.HTTP_400_BAD_REQUEST)
+
+        archive = get_archive(name)
+        try:
+            page_size = max(1, min(int(request.query_params.get('page_size', 20)), 100))
+        except ValueError:
+            page_size = 20
+        try:
+            records, next_cursor = archive.search(limit=page_size, **archive.search_params(request.query_params))
+        except ValueError:
+            return Response({'error': '时间或游标格式错误'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'items': records,
+            'page_size': page_size,
+            'next_cursor': next_cursor,
+        })
+
 class SystemStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = SystemStatistics.objects.all()
     serializer_class = SystemStatisticsSerializer
@@ -23,13 +56,141 @@ class SystemStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
-        today = timezone.now().date()
+        today_orders = daily_name('new_orders')
+        today_users = daily_name('new_users')
+        today_vehicles = daily_name('new_vehicles')
+        counters = get_counters([
+            'total_users', 'total_vehicles', 'total_orders', 'pending_vehicles',
+            today_orders, today_users, today_vehicles,
+        ])
         stats = {
-            'total_users': User.objects.count(),
-            'total_vehicles': Vehicle.objects.count(),
-            'total_orders': Order.objects.count(),
-            'today_orders': Order.objects.filter(created_at__date=today).count(),
-            'pending_reviews': Vehicle.objects.filter(review_status='pending').count(),
+            'total_users': counters['total_users'],
+            'total_vehicles': counters['total_vehicles'],
+            'total_orders': counters['total_orders'],
+            'today_orders': counters[today_orders],
+            'today_new_users': counters[today_users],
+            'today_new_vehicles': counters[today_vehicles],
+            'pending_reviews': counters['pending_vehicles'],
         }
         return Response(stats)
 
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """
+        增长趋势时间序列（读取每日快照）
+        GET /api/admin/statistics/timeseries/?start=2025-01-01&end=2025-12-31&interval=week
+        """
+        interval = request.query_params.get('interval', 'day')
+        if interval not in INTERVALS:
+            return Response({'error': f"interval 必须是 {', '.join(INTERVALS)} 之一"}, status=status.HTTP_400_BAD_REQUEST)
+
+        today = timezone.localdate()
+        try:
+            end = parse_date(request.query_params.get('end', '')) or today
+            start = parse_date(request.query_params.get('start', '')) or end - timedelta(days=29)
+        except ValueError:
+            return Response({'error': '日期格式应为YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end:
+            return Response({'error': '开始日期不能晚于结束日期'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'start': start,
+            'end': end,
+            'interval': interval,
+            'series': time_series(start, end, interval),
+        })
+
+def get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0]
+    return request.META.get('REMOTE_ADDR')
+
+class VehicleReviewViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    车辆审核队列
+    - GET /api/admin/vehicle-reviews/?review_status=pending&suspected_duplicate=true
+    - POST /api/admin/vehicle-reviews/bulk_process/
+    """
+    serializer_class = VehicleReviewSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        queryset = Vehicle.objects.select_related('brand', 'seller').prefetch_related('photos')
+        review_status = self.request.query_params.get('review_status', 'pending')
+        if review_status:
+            queryset = queryset.filter(review_status=review_status)
+        if self.request.query_params.get('suspected_duplicate') in ('true', '1'):
+            queryset = queryset.filter(is_suspected_duplicate=True)
+        return queryset.order_by('-created_at')
+
+    @action(detail=False, methods=['post'])
+    def bulk_process(self, request):
+        """
+        批量审核车辆
+        POST /api/admin/vehicle-reviews/bulk_process/
+        {"vehicle_ids": [1, 2, 3], "action": "approve", "review_note": ""}
+        在一个事务中锁定车辆，批量更新审核状态并批量写入操作日志，返回每辆车的处理结果
+        """
+        serializer = VehicleReviewBulkActionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        vehicle_ids = serializer.validated_data['vehicle_ids']
+        action = serializer.validated_data['action']
+        review_note = serializer.validated_data.get('review_note', '')
+        review_status = 'approved' if action == 'approve' else 'rejected'
+        vehicle_status = 'listed' if action == 'approve' else 'rejected'
+        now = timezone.now()
+        ip_address = get_client_ip(request)
+
+        results = {}
+        with transaction.atomic():
+            vehicles = Vehicle.objects.select_related('brand').select_for_update(of=('self',)).filter(id__in=vehicle_ids)
+
+            processed = []
+            for vehicle in vehicles:
+                if vehicle.review_status != 'pending':
+                    results[vehicle.id] = {'success': False, 'error': '该车辆已审核，无法重复操作'}
+                    continue
+                vehicle.review_status = review_status
+                vehicle.status = vehicle_status
+                vehicle.review_notes = review_note
+                vehicle.updated_at = now
+                processed.append(vehicle)
+
+            Vehicle.objects.bulk_update(processed, ['review_status', 'status', 'review_notes', 'updated_at'])
+
+            # bulk_update不触发信号，手动同步计数、相似车辆索引、市场行情和在售快照
+            sync_bulk_update(Vehicle, processed)
+            sync_vehicle_bulk_update(processed)
+            sync_listing_bulk_update(processed)
+
+            logs = []
+            for vehicle in processed:
+                if action == 'approve':
+                    description = f"审核通过车辆: {vehicle.brand.name} {vehicle.model_name}"
+                else:
+                    description = f"审核拒绝车辆: {vehicle.brand.name} {vehicle.model_name} - {review_note}"
+                logs.append(AdminLog(
+                    admin_user=request.user,
+                    operation_type=f'vehicle_{action}',
+                    description=description,
+                    target_type='vehicle',
+                    target_id=vehicle.id,
+                    ip_address=ip_address,
+                ))
+                results[vehicle.id] = {'success': True, 'review_status': vehicle.review_status}
+            AdminLog.objects.bulk_create(logs)
+
+        items = [
+            {'id': vehicle_id, **results.get(vehicle_id, {'success': False, 'error': '车辆不存在'})}
+            for vehicle_id in vehicle_ids
+        ]
+        succeeded = sum(1 for item in items if item['success'])
+        return Response({
+            'message': f'批量审核完成，成功 {succeeded} 条，失败 {len(items) - succeeded} 条',
+            'succeeded': succeeded,
+            'failed': len(items) - succeeded,
+            'results': items,
+        })
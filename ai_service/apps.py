@@ -6,3 +6,6 @@ class AiServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_service'
     verbose_name = 'AI服务'
+
+    def ready(self):
+        import ai_service.signals
@@ -0,0 +1,153 @@
+"""
+AI接口熔断器
+按接口统计最近一段时间内上游请求的失败率和慢调用比例，超过阈值时熔断：
+熔断期间请求立即失败（由调用方返回本地结果），熔断时间结束后进入半开状态，只放行一个探测请求，
+探测成功则恢复，失败则重新熔断。状态和计数保存在Django缓存中，使用共享缓存时各工作进程共享
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import ai_metrics
+
+STATE_KEY = 'ai_breaker:{}:state'
+PROBE_KEY = 'ai_breaker:{}:probe'
+RESET_KEY = 'ai_breaker:{}:reset'
+COUNTER_KEY = 'ai_breaker:{}:{}:{}'
+
+# 经过熔断器的上游接口
+ENDPOINTS = ('recommend', 'price', 'describe', 'chat', 'summary')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    window秒内按bucket_seconds分桶计数；调用数达到min_calls且失败率达到failure_rate，
+    或耗时超过slow_call_seconds的调用比例达到slow_call_rate时熔断open_seconds秒
+    """
+
+    def __init__(self, window, bucket_seconds, min_calls, failure_rate,
+                 slow_call_seconds, slow_call_rate, open_seconds, probe_timeout):
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.probe_timeout = probe_timeout
+
+    def _bucket(self, now):
+        return int(now // self.bucket_seconds)
+
+    def _incr(self, key):
+        ttl = self.window + self.bucket_seconds
+        if not cache.add(key, 1, timeout=ttl):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=ttl)
+
+    def _counts(self, endpoint, now):
+        """当前窗口（上次恢复之后）的调用数、失败数和慢调用数"""
+        current = self._bucket(now)
+        first = current - self.window // self.bucket_seconds + 1
+        reset = cache.get(RESET_KEY.format(endpoint))
+        if reset is not None:
+            first = max(first, reset + 1)
+        keys = {
+            COUNTER_KEY.format(endpoint, bucket, kind): kind
+            for bucket in range(first, current + 1)
+            for kind in ('calls', 'failures', 'slow')
+        }
+        counts = {'calls': 0, 'failures': 0, 'slow': 0}
+        for key, value in cache.get_many(list(keys)).items():
+            counts[keys[key]] += value
+        return counts
+
+    def state(self, endpoint, now=None):
+        now = time.time() if now is None else now
+        opened = cache.get(STATE_KEY.format(endpoint))
+        if opened is None:
+            return CLOSED
+        return OPEN if now < opened['until'] else HALF_OPEN
+
+    def allow(self, endpoint):
+        """是否放行本次请求；半开状态下只有抢到探测权的请求放行"""
+        state = self.state(endpoint)
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and cache.add(PROBE_KEY.format(endpoint), 1, timeout=self.probe_timeout):
+            ai_metrics.incr(f'{endpoint}.breaker.probe')
+            return True
+        ai_metrics.incr(f'{endpoint}.breaker.rejected')
+        return False
+
+    def _open(self, endpoint, now):
+        cache.set(STATE_KEY.format(endpoint), {'opened_at': now, 'until': now + self.open_seconds}, timeout=None)
+        cache.delete(PROBE_KEY.format(endpoint))
+        ai_metrics.incr(f'{endpoint}.breaker.opened')
+
+    def _close(self, endpoint, now):
+        # 恢复后只统计之后的调用，熔断前的失败不再计入
+        cache.set(RESET_KEY.format(endpoint), self._bucket(now), timeout=self.window + self.bucket_seconds)
+        cache.delete_many([STATE_KEY.format(endpoint), PROBE_KEY.format(endpoint)])
+        ai_metrics.incr(f'{endpoint}.breaker.closed')
+
+    def record(self, endpoint, success, seconds):
+        """记录一次上游请求尝试的结果和耗时"""
+        now = time.time()
+        slow = seconds >= self.slow_call_seconds
+        state = self.state(endpoint, now)
+        if state == HALF_OPEN:
+            if success and not slow:
+                self._close(endpoint, now)
+            else:
+                self._open(endpoint, now)
+            return
+        if state == OPEN:
+            return
+
+        bucket = self._bucket(now)
+        self._incr(COUNTER_KEY.format(endpoint, bucket, 'calls'))
+        if not success:
+            self._incr(COUNTER_KEY.format(endpoint, bucket, 'failures'))
+        if slow:
+            self._incr(COUNTER_KEY.format(endpoint, bucket, 'slow'))
+        if success and not slow:
+            return
+
+        counts = self._counts(endpoint, now)
+        if counts['calls'] < self.min_calls:
+            return
+        if (counts['failures'] / counts['calls'] >= self.failure_rate
+                or counts['slow'] / counts['calls'] >= self.slow_call_rate):
+            self._open(endpoint, now)
+
+    def snapshot(self, endpoints):
+        now = time.time()
+        result = {}
+        for endpoint in endpoints:
+            opened = cache.get(STATE_KEY.format(endpoint))
+            result[endpoint] = {
+                'state': self.state(endpoint, now),
+                'opened_at': opened['opened_at'] if opened else None,
+                **self._counts(endpoint, now),
+            }
+        return result
+
+
+breaker = CircuitBreaker(
+    window=settings.AI_BREAKER_WINDOW,
+    bucket_seconds=settings.AI_BREAKER_BUCKET_SECONDS,
+    min_calls=settings.AI_BREAKER_MIN_CALLS,
+    failure_rate=settings.AI_BREAKER_FAILURE_RATE,
+    slow_call_seconds=settings.AI_BREAKER_SLOW_CALL_SECONDS,
+    slow_call_rate=settings.AI_BREAKER_SLOW_CALL_RATE,
+    open_seconds=settings.AI_BREAKER_OPEN_SECONDS,
+    probe_timeout=settings.DEEPSEEK_TIMEOUT + settings.DEEPSEEK_CONNECT_TIMEOUT,
+)
@@ -0,0 +1,248 @@
+"""
+AI聊天会话的服务端存储和上下文窗口管理
+会话按session_id保存在Django缓存中（多进程部署需使用共享缓存），包括较早轮次的摘要和最近的原文消息；
+每次调用前按token预算构造上下文：摘要 + 预算内最近的消息 + 本轮消息，请求大小与会话长度无关。
+超出保留条数的旧消息在后台线程中折叠进摘要
+"""
+import logging
+import math
+import re
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .deepseek_service import DeepSeekError, deepseek
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_KEY = 'ai_chat:conversation:{}'
+FOLD_LOCK_KEY = 'ai_chat:fold_lock:{}'
+WRITE_LOCK_KEY = 'ai_chat:write_lock:{}'
+# 写锁只在读取-修改-写回期间持有；持有者异常退出时锁在WRITE_LOCK_TIMEOUT秒后过期
+WRITE_LOCK_TIMEOUT = 5
+WRITE_LOCK_POLL = 0.01
+SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+SUMMARY_PREFIX = '以下是此前对话的摘要：'
+
+# 每条消息在请求中的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-summary')
+
+
+def estimate_tokens(text):
+    """粗略估算token数：中文字符和全角符号每个按1个计，其余字符每4个按1个计"""
+    if not text:
+        return 0
+    cjk = len(CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def message_tokens(message):
+    return estimate_tokens(message.get('content', '')) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_to_tokens(text, budget, keep_tail=False):
+    """截断文本使其估算token数不超过budget，keep_tail时保留末尾"""
+    if estimate_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        part = text[-middle:] if keep_tail else text[:middle]
+        if estimate_tokens(part) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    if low == 0:
+        return ''
+    return text[-low:] if keep_tail else text[:low]
+
+
+def new_conversation():
+    return {'summary': '', 'folded': 0, 'messages': []}
+
+
+class ConversationStore:
+    """会话存储：{'summary': 摘要, 'folded': 已折叠的消息数, 'messages': 最近的原文消息}"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def load(self, session_id):
+        """
+        读取会话，返回 (session_id, 会话)
+        session_id为空、格式不合法或会话已过期时新建会话
+        """
+        if session_id and SESSION_ID_RE.match(str(session_id)):
+            conversation = cache.get(CONVERSATION_KEY.format(session_id))
+            if conversation is not None:
+                return session_id, conversation
+        return secrets.token_urlsafe(16), new_conversation()
+
+    def save(self, session_id, conversation):
+        cache.set(CONVERSATION_KEY.format(session_id), conversation, self.ttl)
+
+    @contextmanager
+    def write_lock(self, session_id):
+        """
+        会话写锁（cache.add），同一会话的读取-修改-写回在各进程间串行执行，避免并发追加时丢失消息；
+        等待超过WRITE_LOCK_TIMEOUT秒时视为持有者已失效，不加锁继续
+        """
+        lock_key = WRITE_LOCK_KEY.format(session_id)
+        waited = 0.0
+        while not cache.add(lock_key, 1, timeout=WRITE_LOCK_TIMEOUT):
+            if waited >= WRITE_LOCK_TIMEOUT:
+                logger.warning(f"等待会话 {session_id} 的写锁超时")
+                break
+            time.sleep(WRITE_LOCK_POLL)
+            waited += WRITE_LOCK_POLL
+        try:
+            yield
+        finally:
+            cache.delete(lock_key)
+
+    def append_exchange(self, session_id, user_message, reply):
+        """追加一问一答，返回更新后的会话"""
+        with self.write_lock(session_id):
+            _, conversation = self.load(session_id)
+            conversation['messages'].extend([
+                {'role': 'user', 'content': user_message},
+                {'role': 'assistant', 'content': reply},
+            ])
+            self.save(session_id, conversation)
+        return conversation
+
+    def delete(self, session_id):
+        if session_id and SESSION_ID_RE.match(str(session_id)):
+            cache.delete(CONVERSATION_KEY.format(session_id))
+
+
+class ContextWindow:
+    """
+    按token预算构造上下文
+    max_tokens为整个请求（摘要、历史消息、本轮消息）的预算，recent_messages为原文保留的消息条数上限，
+    summary_tokens为摘要的长度上限
+    """
+
+    def __init__(self, max_tokens, recent_messages, summary_tokens):
+        self.max_tokens = max_tokens
+        self.recent_messages = recent_messages
+        self.summary_tokens = summary_tokens
+
+    def build(self, conversation, user_message):
+        """返回本轮之前的上下文消息（不含本轮消息），总量连同本轮消息不超过预算"""
+        budget = self.max_tokens - estimate_tokens(user_message) - MESSAGE_OVERHEAD_TOKENS
+        context = []
+
+        summary = conversation.get('summary')
+        if summary:
+            allowance = budget - MESSAGE_OVERHEAD_TOKENS - estimate_tokens(SUMMARY_PREFIX)
+            summary = truncate_to_tokens(summary, min(self.summary_tokens, allowance))
+        if summary:
+            summary_message = {'role': 'system', 'content': SUMMARY_PREFIX + summary}
+            budget -= message_tokens(summary_message)
+            context.append(summary_message)
+
+        # 从最新的消息向前按一问一答成对选取，直到超出预算或条数上限
+        recent = []
+        messages = conversation.get('messages', [])[-self.recent_messages:]
+        for index in range(len(messages) - 2, -1, -2):
+            pair = messages[index:index + 2]
+            cost = sum(message_tokens(message) for message in pair)
+            if cost > budget:
+                break
+            budget -= cost
+            recent[:0] = pair
+        return context + recent
+
+    def overflow(self, conversation):
+        """超出原文保留条数、需要折叠进摘要的旧消息"""
+        messages = conversation.get('messages', [])
+        excess = len(messages) - self.recent_messages
+        if excess <= 0:
+            return []
+        # 按一问一答成对折叠
+        return messages[:excess + excess % 2]
+
+
+def local_summary(previous_summary, messages, budget):
+    """上游不可用时的摘要：保留旧摘要，并按顺序拼接各条消息的开头，超出长度时保留最新的部分"""
+    lines = [previous_summary] if previous_summary else []
+    for message in messages:
+        speaker = '用户' if message['role'] == 'user' else '助手'
+        lines.append(f"{speaker}：{truncate_to_tokens(message['content'], 60)}")
+    return truncate_to_tokens('\n'.join(lines), budget, keep_tail=True)
+
+
+def summarize(previous_summary, messages, budget):
+    """将旧摘要和较早的消息合并为新的摘要"""
+    transcript = '\n'.join(
+        f"{'用户' if message['role'] == 'user' else '助手'}：{message['content']}" for message in messages
+    )
+    prompt = (
+        f"已有摘要：{previous_summary or '无'}\n"
+        f"新增对话：\n{transcript}\n"
+        f"请将已有摘要和新增对话合并为一段不超过{budget}字的中文摘要，"
+        "保留用户的购车需求、预算、偏好和已讨论过的车辆等关键信息，只输出摘要正文。"
+    )
+    try:
+        content = deepseek.request_completion(
+            [{'role': 'user', 'content': prompt}], temperature=0.3, max_tokens=budget, endpoint='summary'
+        )
+    except DeepSeekError as e:
+        logger.warning(f"会话摘要生成失败，使用本地摘要: {e}")
+        return local_summary(previous_summary, messages, budget)
+    return truncate_to_tokens(content.strip(), budget, keep_tail=True)
+
+
+def fold_conversation(session_id):
+    """将会话中超出保留条数的旧消息折叠进摘要；折叠期间会话已被其他进程折叠时放弃本次结果"""
+    lock_key = FOLD_LOCK_KEY.format(session_id)
+    if not cache.add(lock_key, 1, timeout=settings.DEEPSEEK_DEADLINE + 10):
+        return False
+    try:
+        _, conversation = conversation_store.load(session_id)
+        overflow = context_window.overflow(conversation)
+        if not overflow:
+            return False
+        summary = summarize(conversation['summary'], overflow, context_window.summary_tokens)
+
+        # 摘要生成期间可能追加了新消息，只移除已折叠的部分
+        with conversation_store.write_lock(session_id):
+            _, current = conversation_store.load(session_id)
+            if current['folded'] != conversation['folded'] or current['messages'][:len(overflow)] != overflow:
+                return False
+            current['summary'] = summary
+            current['folded'] += len(overflow)
+            current['messages'] = current['messages'][len(overflow):]
+            conversation_store.save(session_id, current)
+        return True
+    finally:
+        cache.delete(lock_key)
+
+
+def _fold_task(session_id):
+    try:
+        fold_conversation(session_id)
+    except Exception as e:
+        logger.error(f"折叠会话 {session_id} 失败: {str(e)}")
+
+
+def schedule_fold(session_id, conversation):
+    """会话超出保留条数时在后台线程中折叠旧消息"""
+    if context_window.overflow(conversation):
+        _executor.submit(_fold_task, session_id)
+
+
+conversation_store = ConversationStore(settings.AI_CHAT_SESSION_TTL)
+context_window = ContextWindow(
+    max_tokens=settings.AI_CHAT_CONTEXT_TOKENS,
+    recent_messages=settings.AI_CHAT_RECENT_MESSAGES,
+    summary_tokens=settings.AI_CHAT_SUMMARY_TOKENS,
+)
@@ -1,86 +1,479 @@
+import asyncio
 import requests
+import httpx
 import json
+import logging
+import random
+import threading
+import time
+import weakref
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 
+from .circuit_breaker import breaker
+from .metrics import ai_metrics
+from .response_cache import (
+    canonical_preferences, canonical_vehicle_data, endpoint_ttl, make_key,
+    response_cache, vehicle_version,
+)
+from .single_flight import SingleFlightTimeout, single_flight
+
+logger = logging.getLogger(__name__)
+
+# 可重试的上游状态码：限流和服务端错误
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# 失败时返回给用户的提示
+FALLBACK_MESSAGES = {
+    'timeout': "很抱歉，AI服务响应超时。请稍后再试。",
+    'unavailable': "很抱歉，AI服务暂时不可用。请稍后再试。",
+    'decode': "很抱歉，AI服务暂时遇到技术问题。请稍后再试或联系我们的客服人员获得帮助。",
+    'error': "很抱歉，AI服务出现异常。请稍后再试。",
+    'circuit_open': "很抱歉，AI服务繁忙。请稍后再试。",
+    'invalid': None,
+}
+
+
+def is_fallback_reply(reply):
+    """回复是否为上游失败时的提示（或为空）"""
+    return not reply or reply in FALLBACK_MESSAGES.values()
+
+
+class DeepSeekError(Exception):
+    """上游调用失败；kind 对应 FALLBACK_MESSAGES 中的提示类型"""
+
+    def __init__(self, kind, message=''):
+        super().__init__(message or kind)
+        self.kind = kind
+
+    def __reduce__(self):
+        # 保证经共享缓存序列化后kind不丢失
+        return (self.__class__, (self.kind, self.args[0]))
+
+    @property
+    def fallback_message(self):
+        if self.kind in FALLBACK_MESSAGES:
+            return FALLBACK_MESSAGES[self.kind]
+        return FALLBACK_MESSAGES['error']
+
+
+def build_session(pool_size):
+    """
+    创建带连接池的长连接会话，最多保持pool_size个空闲长连接
+    urllib3的连接池不阻塞（阻塞等待没有超时），并发上限由DeepSeekService按截止时间等待的信号量控制；
+    重试由服务自身的退避逻辑处理，不使用urllib3的自动重试
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# 每个事件循环一个异步客户端及其关闭钩子：httpx的连接池绑定创建它的事件循环
+_async_clients = weakref.WeakKeyDictionary()
+
+# 上游SSE响应的结束标记
+_STREAM_DONE = object()
+
+
+async def _close_with_loop(client):
+    """挂起直到事件循环关闭：loop.shutdown_asyncgens()结束该生成器时关闭客户端的连接池"""
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+async def get_async_client(pool_size):
+    """获取当前事件循环的异步客户端，用于流式请求；事件循环结束时（asyncio.run、uvicorn退出）客户端随之关闭"""
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        client = httpx.AsyncClient(limits=limits)
+        closer = _close_with_loop(client)
+        # 首次迭代后生成器登记到事件循环，由其在关闭前结束
+        await closer.__anext__()
+        entry = _async_clients[loop] = (client, closer)
+    return entry[0]
+
+
 class DeepSeekService:
-    def __init__(self):
-        self.api_key = settings.DEEPSEEK_API_KEY
-        self.api_url = settings.DEEPSEEK_API_URL
-        self.model = settings.DEEPSEEK_MODEL
-        self.timeout = settings.DEEPSEEK_TIMEOUT
-        self.max_retries = settings.DEEPSEEK_MAX_RETRIES
-
-    def call_api(self, messages, temperature=0.7, max_tokens=1000):
-        headers = {
+    def __init__(self, api_url=None, api_key=None, session=None, **options):
+        """
+        参数默认取自settings，测试时可传入本地模拟服务的api_url，
+        或通过options覆盖timeout、max_retries、deadline等配置
+        """
+        self.api_key = api_key or settings.DEEPSEEK_API_KEY
+        self.api_url = api_url or settings.DEEPSEEK_API_URL
+        self.model = options.get('model', settings.DEEPSEEK_MODEL)
+        self.timeout = options.get('timeout', settings.DEEPSEEK_TIMEOUT)
+        self.connect_timeout = options.get('connect_timeout', settings.DEEPSEEK_CONNECT_TIMEOUT)
+        self.max_retries = options.get('max_retries', settings.DEEPSEEK_MAX_RETRIES)
+        self.deadline = options.get('deadline', settings.DEEPSEEK_DEADLINE)
+        self.backoff_base = options.get('backoff_base', settings.DEEPSEEK_BACKOFF_BASE)
+        self.backoff_max = options.get('backoff_max', settings.DEEPSEEK_BACKOFF_MAX)
+        pool_size = options.get('pool_size', settings.DEEPSEEK_POOL_SIZE)
+        self.session = session or build_session(pool_size)
+        # 同时进行的上游请求数上限，与连接池大小一致
+        self.slots = threading.BoundedSemaphore(pool_size)
+        self.stream_pool_size = options.get('stream_pool_size', settings.DEEPSEEK_STREAM_POOL_SIZE)
+
+    def _headers(self):
+        return {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
 
+    def _backoff(self, attempt, retry_after=None):
+        """带完全抖动的指数退避；上游给出Retry-After时以其为下限"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    @staticmethod
+    def _record_attempt(endpoint, outcome, seconds):
+        """记录一次上游请求尝试的指标，并计入该接口的熔断统计"""
+        ai_metrics.record_attempt(endpoint, outcome, seconds)
+        breaker.record(endpoint, outcome == 'ok', seconds)
+
+    @staticmethod
+    def _check_breaker(endpoint, attempt, last_error):
+        """熔断时立即失败，不再等待上游"""
+        if not breaker.allow(endpoint):
+            raise last_error if attempt else DeepSeekError('circuit_open', f'Circuit open: {endpoint}')
+
+    @staticmethod
+    def _parse_content(response):
+        try:
+            try:
+                data = response.json()
+            except UnicodeDecodeError:
+                response.encoding = 'utf-8-sig'
+                data = response.json()
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise DeepSeekError('decode', f'JSON/Unicode decode error: {e}')
+
+        if 'choices' not in data or not data['choices']:
+            raise DeepSeekError('invalid', f'Invalid API response format: {str(data)[:500]}')
+        content = data['choices'][0]['message']['content']
+        if not isinstance(content, str):
+            return str(content)
+        return content.encode('utf-8', errors='replace').decode('utf-8')
+
+    def request_completion(self, messages, temperature=0.7, max_tokens=1000, endpoint='chat'):
+        """
+        调用上游接口并返回回复文本，失败时抛出DeepSeekError
+        在总截止时间内重试超时、连接错误、限流和5xx响应，重试间隔为带抖动的指数退避；
+        并发请求已达连接池上限时等待空闲连接，等待时间计入总截止时间，超时抛出timeout；
+        每次尝试的耗时和结果记录到ai_metrics并计入熔断统计，熔断期间立即抛出circuit_open
+        """
         payload = {
             'model': self.model,
             'messages': messages,
             'temperature': temperature,
             'max_tokens': max_tokens,
         }
+        deadline = time.monotonic() + self.deadline
+        last_error = DeepSeekError('unavailable')
 
         for attempt in range(self.max_retries):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._check_breaker(endpoint, attempt, last_error)
+
+            acquired = self.slots.acquire(timeout=remaining)
+            started = time.monotonic()
+            remaining = deadline - started
+            if not acquired or remaining <= 0:
+                if acquired:
+                    self.slots.release()
+                logger.warning(f"API connection pool exhausted (attempt {attempt + 1}/{self.max_retries})")
+                last_error = DeepSeekError('timeout', 'Timed out waiting for a pooled connection')
+                break
+
+            retry_after = None
             try:
-                response = requests.post(
+                response = self.session.post(
                     self.api_url,
-                    headers=headers,
+                    headers=self._headers(),
                     json=payload,
-                    timeout=self.timeout
+                    timeout=(min(self.connect_timeout, remaining), min(self.timeout, remaining)),
                 )
-
+                elapsed = time.monotonic() - started
                 if response.status_code == 200:
-                    try:
-                        # Try multiple encoding approaches
-                        try:
-                            data = response.json()
-                        except UnicodeDecodeError:
-                            # Try with different encoding
-                            response.encoding = 'utf-8-sig'
-                            data = response.json()
-
-                        if 'choices' in data and len(data['choices']) > 0:
-                            content = data['choices'][0]['message']['content']
-                            # Ensure the returned content is properly encoded
-                            if isinstance(content, str):
-                                # Clean up any encoding issues
-                                try:
-                                    return content.encode('utf-8', errors='ignore').decode('utf-8')
-                                except:
-                                    # Fallback: replace problematic characters
-                                    return content.encode('utf-8', errors='replace').decode('utf-8')
-                            else:
-                                return str(content)
-                        else:
-                            print(f"Invalid API response format: {data}")
-                            return None
-                    except (json.JSONDecodeError, UnicodeDecodeError) as e:
-                        print(f"JSON/Unicode decode error: {e}")
-                        # Return a fallback response instead of None
-                        return "很抱歉，AI服务暂时遇到技术问题。请稍后再试或联系我们的客服人员获得帮助。"
-                else:
-                    print(f"API request failed with status {response.status_code}: {response.text[:500]}")
-                    if attempt < self.max_retries - 1:
-                        continue
-                    return "很抱歉，AI服务暂时不可用。请稍后再试。"
+                    self._record_attempt(endpoint, 'ok', elapsed)
+                    return self._parse_content(response)
+
+                self._record_attempt(endpoint, f'http_{response.status_code}', elapsed)
+                logger.warning(f"API request failed with status {response.status_code}: {response.text[:500]}")
+                last_error = DeepSeekError('unavailable', f'HTTP {response.status_code}')
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise last_error
+                retry_after = response.headers.get('Retry-After')
             except requests.exceptions.Timeout:
-                print(f"API request timeout (attempt {attempt + 1}/{self.max_retries})")
-                if attempt < self.max_retries - 1:
-                    continue
-                return "很抱歉，AI服务响应超时。请稍后再试。"
-            except Exception as e:
-                print(f"API request exception: {e}")
-                if attempt < self.max_retries - 1:
-                    continue
-                return "很抱歉，AI服务出现异常。请稍后再试。"
-
-        return "很抱歉，AI服务暂时不可用。请稍后再试。"
+                self._record_attempt(endpoint, 'timeout', time.monotonic() - started)
+                logger.warning(f"API request timeout (attempt {attempt + 1}/{self.max_retries})")
+                last_error = DeepSeekError('timeout')
+            except requests.exceptions.RequestException as e:
+                self._record_attempt(endpoint, 'error', time.monotonic() - started)
+                logger.warning(f"API request exception: {e}")
+                last_error = DeepSeekError('error', str(e))
+            finally:
+                self.slots.release()
+
+            if attempt < self.max_retries - 1:
+                delay = self._backoff(attempt, retry_after)
+                if time.monotonic() + delay >= deadline:
+                    break
+                time.sleep(delay)
+
+        raise last_error
+
+    @staticmethod
+    def _stream_text(line):
+        """解析上游SSE响应的一行：返回增量文本（没有文本时为None），遇到[DONE]返回_STREAM_DONE"""
+        if not line.startswith('data:'):
+            return None
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return _STREAM_DONE
+        try:
+            chunk = json.loads(data)
+        except json.JSONDecodeError as e:
+            raise DeepSeekError('decode', f'Stream chunk decode error: {e}')
+        choices = chunk.get('choices') or []
+        if not choices:
+            return None
+        return (choices[0].get('delta') or {}).get('content') or None
+
+    @classmethod
+    async def _iter_stream(cls, response):
+        """解析上游的SSE响应，逐个产出增量文本，遇到[DONE]结束"""
+        async for line in response.aiter_lines():
+            text = cls._stream_text(line)
+            if text is _STREAM_DONE:
+                return
+            if text:
+                yield text
+
+    @classmethod
+    def _iter_stream_sync(cls, response):
+        """_iter_stream的同步版本，用于requests的流式响应；按上游的传输分块读取，不等待凑满固定大小的缓冲"""
+        for line in response.iter_lines(chunk_size=None):
+            text = cls._stream_text(line.decode('utf-8', errors='replace'))
+            if text is _STREAM_DONE:
+                return
+            if text:
+                yield text
+
+    @staticmethod
+    def _record_stream_success(endpoint, started, first_token):
+        """流式尝试正常结束：指标记录总耗时，熔断的慢调用按首字延迟判断（回复总耗时随长度变化）"""
+        elapsed = time.monotonic() - started
+        ai_metrics.record_attempt(endpoint, 'ok', elapsed)
+        breaker.record(endpoint, True, elapsed if first_token is None else first_token)
+
+    async def stream_completion(self, messages, temperature=0.7, max_tokens=1000, endpoint='chat'):
+        """
+        以流式方式调用上游接口，逐段产出回复文本，失败时抛出DeepSeekError
+        收到首个片段之前按request_completion的规则重试；已开始输出后出错不再重试。
+        首个片段的延迟记录为 {endpoint}.first_token；每次尝试在结束时只计入一次熔断统计：
+        正常结束时以首字延迟计为成功，中途出错时计为失败
+        """
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'stream': True,
+        }
+        client = await get_async_client(self.stream_pool_size)
+        deadline = time.monotonic() + self.deadline
+        last_error = DeepSeekError('unavailable')
+
+        for attempt in range(self.max_retries):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._check_breaker(endpoint, attempt, last_error)
+
+            started = time.monotonic()
+            retry_after = None
+            received = False
+            first_token = None
+            # 读超时作用于相邻两个片段之间的间隔
+            timeout = httpx.Timeout(min(self.timeout, remaining), connect=min(self.connect_timeout, remaining))
+            try:
+                async with client.stream('POST', self.api_url, headers=self._headers(),
+                                         json=payload, timeout=timeout) as response:
+                    if response.status_code == 200:
+                        async for text in self._iter_stream(response):
+                            if not received:
+                                received = True
+                                first_token = time.monotonic() - started
+                                ai_metrics.observe(f'{endpoint}.first_token', first_token)
+                            yield text
+                        self._record_stream_success(endpoint, started, first_token)
+                        return
+
+                    body = await response.aread()
+                    self._record_attempt(endpoint, f'http_{response.status_code}', time.monotonic() - started)
+                    logger.warning(f"API stream request failed with status {response.status_code}: {body[:500]!r}")
+                    last_error = DeepSeekError('unavailable', f'HTTP {response.status_code}')
+                    if response.status_code not in RETRYABLE_STATUS:
+                        raise last_error
+                    retry_after = response.headers.get('Retry-After')
+            except httpx.TimeoutException:
+                self._record_attempt(endpoint, 'timeout', time.monotonic() - started)
+                logger.warning(f"API stream timeout (attempt {attempt + 1}/{self.max_retries})")
+                last_error = DeepSeekError('timeout')
+                if received:
+                    raise last_error
+            except httpx.HTTPError as e:
+                self._record_attempt(endpoint, 'error', time.monotonic() - started)
+                logger.warning(f"API stream exception: {e}")
+                last_error = DeepSeekError('error', str(e))
+                if received:
+                    raise last_error
+
+            if attempt < self.max_retries - 1:
+                delay = self._backoff(attempt, retry_after)
+                if time.monotonic() + delay >= deadline:
+                    break
+                await asyncio.sleep(delay)
+
+        raise last_error
+
+    def stream_completion_sync(self, messages, temperature=0.7, max_tokens=1000, endpoint='chat'):
+        """
+        stream_completion的同步版本，供WSGI部署（如runserver）使用：通过长连接会话流式调用上游，逐段产出回复文本
+        重试、截止时间、指标和熔断规则与stream_completion相同；
+        输出期间占用一个连接名额，与request_completion共用并发上限，生成器关闭时释放
+        """
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'stream': True,
+        }
+        deadline = time.monotonic() + self.deadline
+        last_error = DeepSeekError('unavailable')
+
+        for attempt in range(self.max_retries):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._check_breaker(endpoint, attempt, last_error)
+
+            acquired = self.slots.acquire(timeout=remaining)
+            started = time.monotonic()
+            remaining = deadline - started
+            if not acquired or remaining <= 0:
+                if acquired:
+                    self.slots.release()
+                logger.warning(f"API connection pool exhausted (attempt {attempt + 1}/{self.max_retries})")
+                last_error = DeepSeekError('timeout', 'Timed out waiting for a pooled connection')
+                break
+
+            retry_after = None
+            received = False
+            first_token = None
+            try:
+                # 读超时作用于相邻两个片段之间的间隔
+                with self.session.post(
+                    self.api_url,
+                    headers=self._headers(),
+                    json=payload,
+                    stream=True,
+                    timeout=(min(self.connect_timeout, remaining), min(self.timeout, remaining)),
+                ) as response:
+                    if response.status_code == 200:
+                        for text in self._iter_stream_sync(response):
+                            if not received:
+                                received = True
+                                first_token = time.monotonic() - started
+                                ai_metrics.observe(f'{endpoint}.first_token', first_token)
+                            yield text
+                        self._record_stream_success(endpoint, started, first_token)
+                        return
+
+                    self._record_attempt(endpoint, f'http_{response.status_code}', time.monotonic() - started)
+                    logger.warning(f"API stream request failed with status {response.status_code}: {response.text[:500]}")
+                    last_error = DeepSeekError('unavailable', f'HTTP {response.status_code}')
+                    if response.status_code not in RETRYABLE_STATUS:
+                        raise last_error
+                    retry_after = response.headers.get('Retry-After')
+            except requests.exceptions.Timeout:
+                self._record_attempt(endpoint, 'timeout', time.monotonic() - started)
+                logger.warning(f"API stream timeout (attempt {attempt + 1}/{self.max_retries})")
+                last_error = DeepSeekError('timeout')
+                if received:
+                    raise last_error
+            except requests.exceptions.RequestException as e:
+                self._record_attempt(endpoint, 'error', time.monotonic() - started)
+                logger.warning(f"API stream exception: {e}")
+                last_error = DeepSeekError('error', str(e))
+                if received:
+                    raise last_error
+            finally:
+                self.slots.release()
+
+            if attempt < self.max_retries - 1:
+                delay = self._backoff(attempt, retry_after)
+                if time.monotonic() + delay >= deadline:
+                    break
+                time.sleep(delay)
+
+        raise last_error
+
+    def call_api(self, messages, temperature=0.7, max_tokens=1000, endpoint='chat'):
+        """调用上游接口，失败时返回面向用户的提示文本"""
+        try:
+            return self.request_completion(messages, temperature, max_tokens, endpoint=endpoint)
+        except DeepSeekError as e:
+            logger.error(f"DeepSeek调用失败[{endpoint}]: {e}")
+            return e.fallback_message
+
+    def cached_call(self, messages, endpoint, key_extra=None):
+        """
+        先查响应缓存，未命中时调用上游并缓存成功的回复（失败提示不缓存）
+        缓存键由规范化后的提示和key_extra（如车辆版本号）生成；
+        相同键的并发调用通过single-flight合并为一次上游请求
+        """
+        key = make_key(endpoint, {'messages': messages, 'extra': key_extra})
+        content = response_cache.get(key)
+        if content is not None:
+            return content
+
+        ttl = endpoint_ttl(endpoint)
+        try:
+            content = single_flight.do(
+                key,
+                lambda: self.request_completion(messages, endpoint=endpoint),
+                timeout=self.deadline + settings.AI_SINGLE_FLIGHT_GRACE,
+                result_ttl=ttl,
+            )
+        except DeepSeekError as e:
+            logger.error(f"DeepSeek调用失败[{endpoint}]: {e}")
+            return e.fallback_message
+        except SingleFlightTimeout:
+            logger.error(f"等待相同AI请求结果超时[{endpoint}]")
+            return FALLBACK_MESSAGES['timeout']
+
+        response_cache.set(key, content, ttl)
+        return content
 
     def recommend_vehicles(self, user_preferences):
-        # Ensure proper encoding of user preferences
+        # 规范化偏好，相近的偏好共用同一提示和缓存结果
+        user_preferences = canonical_preferences(user_preferences)
         try:
             preferences_str = json.dumps(user_preferences, ensure_ascii=False)
         except:
@@ -95,31 +488,39 @@ class DeepSeekService:
             "确保内容自然通顺、无乱码。"
         )
         messages = [{'role': 'user', 'content': prompt}]
-        return self.call_api(messages)
+        return self.cached_call(messages, endpoint='recommend')
 
-    def calculate_vehicle_price(self, vehicle_data):
-        # Ensure proper encoding of vehicle data
+    def calculate_vehicle_price(self, vehicle_data, vehicle_id=None, market=None):
+        # 规范化定价字段；已有车辆的结果随车辆版本号失效。market为同款可比车辆的价格统计，作为定价参考
+        vehicle_data = canonical_vehicle_data(vehicle_data)
         try:
             vehicle_str = json.dumps(vehicle_data, ensure_ascii=False)
         except:
             vehicle_str = str(vehicle_data)
 
         prompt = f"Calculate market price for vehicle: {vehicle_str}. Provide suggested price, min/max range, and confidence score. Please respond in Chinese."
+        if market:
+            prompt += (
+                f" Comparable vehicles in the same brand/model/year/mileage band: {market['count']} samples, "
+                f"median {market['median_price']:.0f}, quartiles {market['q1_price']:.0f}-{market['q3_price']:.0f}."
+            )
         messages = [{'role': 'user', 'content': prompt}]
-        return self.call_api(messages)
+        key_extra = {'vehicle_id': vehicle_id, 'version': vehicle_version(vehicle_id)} if vehicle_id else None
+        return self.cached_call(messages, endpoint='price', key_extra=key_extra)
 
     def analyze_vehicle_description(self, description):
         # Ensure description is properly encoded
         if not isinstance(description, str):
             description = str(description)
+        description = ' '.join(description.split())
 
         prompt = f"Analyze this vehicle description and extract key features and issues: {description}. Please respond in Chinese."
         messages = [{'role': 'user', 'content': prompt}]
-        return self.call_api(messages)
+        return self.cached_call(messages, endpoint='describe')
 
     def chat_assistant(self, conversation_history, user_message):
         conversation_history.append({'role': 'user', 'content': user_message})
-        response = self.call_api(conversation_history)
+        response = self.call_api(conversation_history, endpoint='chat')
         if response:
             conversation_history.append({'role': 'assistant', 'content': response})
         return response
@@ -0,0 +1,98 @@
+"""
+AI服务不可用（熔断或调用失败）时的本地结果
+推荐：为按偏好筛选出的在售车辆生成说明文字；
+定价：同品牌车型、相近年份车辆的价格按年份和里程差异调整后取中位数和四分位区间
+"""
+import statistics
+
+from vehicles.models import Vehicle
+
+# 每年的折旧率，每万公里的折价率
+ANNUAL_DEPRECIATION = 0.08
+MILEAGE_DEPRECIATION = 0.02
+COMPARABLE_YEAR_RANGE = 2
+MIN_COMPARABLES = 3
+MAX_COMPARABLES = 200
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def recommendation_text(vehicles):
+    """根据匹配车辆生成推荐说明，格式与AI推荐一致（编号分行的纯文本）"""
+    if not vehicles:
+        return "AI服务暂时繁忙，当前没有找到符合您偏好的在售车辆，建议适当放宽品牌、价格或年份条件后再试。"
+
+    lines = [f"AI服务暂时繁忙，以下是根据您的偏好从在售车辆中筛选出的{len(vehicles)}辆车，供您参考："]
+    for index, vehicle in enumerate(vehicles[:5], 1):
+        lines.append(
+            f"{index}. {vehicle['year']}年 {vehicle['brand']} {vehicle['model']}，"
+            f"售价{vehicle['price'] / 10000:.2f}万元，行驶{vehicle['mileage'] / 10000:.1f}万公里"
+        )
+    return '\n'.join(lines)
+
+
+def _adjust(price, year, mileage, target_year, target_mileage):
+    """将可比车辆的价格按年份和里程差异折算到目标车辆"""
+    if target_year is not None:
+        price /= (1 - ANNUAL_DEPRECIATION) ** (target_year - year)
+    if target_mileage is not None:
+        factor = 1 - MILEAGE_DEPRECIATION * (target_mileage - mileage) / 10000
+        price *= min(1.5, max(0.5, factor))
+    return price
+
+
+def estimate_price(vehicle_data, vehicle=None):
+    """
+    基于规则的本地定价，返回与AI定价相同结构的字典；
+    可比车辆不足时参考车辆自身的标价，二者都没有时返回None
+    """
+    brand = str(vehicle_data.get('brand') or '').strip()
+    model = str(vehicle_data.get('model') or '').strip()
+    year = _to_int(vehicle_data.get('year'))
+    mileage = _to_int(vehicle_data.get('mileage'))
+
+    prices = []
+    if brand and model:
+        comparables = Vehicle.objects.filter(
+            brand__name__iexact=brand,
+            model_name__iexact=model,
+            review_status='approved',
+            status__in=('listed', 'sold'),
+        )
+        if year is not None:
+            comparables = comparables.filter(
+                year__gte=year - COMPARABLE_YEAR_RANGE, year__lte=year + COMPARABLE_YEAR_RANGE
+            )
+        if vehicle is not None:
+            comparables = comparables.exclude(pk=vehicle.pk)
+        prices = [
+            _adjust(float(price), comparable_year, comparable_mileage, year, mileage)
+            for price, comparable_year, comparable_mileage
+            in comparables.values_list('price', 'year', 'mileage')[:MAX_COMPARABLES]
+        ]
+
+    if len(prices) >= MIN_COMPARABLES:
+        suggested = statistics.median(prices)
+        low, _, high = statistics.quantiles(prices, n=4)
+        confidence = min(0.8, 0.4 + 0.02 * len(prices))
+        analysis = f"基于{len(prices)}辆同款相近年份车辆的价格，按年份和里程差异调整后估算"
+    elif vehicle is not None:
+        suggested = float(vehicle.price)
+        low, high = suggested * 0.9, suggested * 1.1
+        confidence = 0.3
+        analysis = "暂无足够的同款车辆可供比较，参考车辆当前标价估算"
+    else:
+        return None
+
+    return {
+        'suggested_price': round(suggested, 2),
+        'min_price': round(min(low, suggested), 2),
+        'max_price': round(max(high, suggested), 2),
+        'confidence': round(confidence, 2),
+        'analysis': analysis,
+    }
@@ -0,0 +1,66 @@
+"""
+AI服务运行指标
+进程内记录各接口的调用次数、结果分布和最近若干次调用的延迟分位数
+"""
+import threading
+from collections import defaultdict, deque
+
+# 每个指标保留的最近延迟样本数
+LATENCY_SAMPLES = 1000
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return round(ordered[index], 4)
+
+
+class AIMetrics:
+    """线程安全的计数器和延迟样本"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._latencies = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self._latencies[name].append(seconds)
+
+    def record_attempt(self, endpoint, outcome, seconds):
+        """记录一次上游请求尝试（outcome 如 ok、timeout、http_503、error）"""
+        with self._lock:
+            self._counters[f'{endpoint}.attempt.{outcome}'] += 1
+            self._latencies[f'{endpoint}.attempt'].append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            latencies = {name: list(samples) for name, samples in self._latencies.items()}
+        return {
+            'counters': dict(sorted(counters.items())),
+            'latency': {
+                name: {
+                    'count': len(samples),
+                    'p50': _percentile(samples, 0.5),
+                    'p95': _percentile(samples, 0.95),
+                    'p99': _percentile(samples, 0.99),
+                    'max': round(max(samples), 4) if samples else None,
+                }
+                for name, samples in sorted(latencies.items())
+            },
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._latencies.clear()
+
+
+ai_metrics = AIMetrics()
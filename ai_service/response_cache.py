@@ -0,0 +1,192 @@
+"""
+AI响应缓存
+按规范化后的提示内容（偏好JSON排序、价格/年份/里程分档、定价所用的车辆字段）生成缓存键，
+进程内LRU存储，支持按接口设置TTL、按条目数和字节数淘汰，并统计命中率；
+车辆变更时通过共享缓存中的版本号使相关定价结果失效
+"""
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import ai_metrics
+
+VEHICLE_VERSION_KEY = 'ai_cache:vehicle_version:{}'
+
+
+def _normalize_text(value):
+    return re.sub(r'\s+', ' ', str(value)).strip().lower()
+
+
+def _to_number(value):
+    try:
+        if value is None or value == '':
+            return None
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError, TypeError):
+        return None
+
+
+def _band(value, size, round_up=False):
+    """将数值归入size宽的档位：下限向下取整，上限向上取整"""
+    number = _to_number(value)
+    if number is None:
+        return None
+    rounder = math.ceil if round_up else math.floor
+    return int(rounder(number / size) * size)
+
+
+def canonical_preferences(preferences):
+    """
+    规范化购车偏好：去除空值、文本统一空白和大小写、价格和年份按档位取整，
+    相近的偏好得到相同的结果，既用于缓存键也用于构造提示
+    """
+    if not isinstance(preferences, dict):
+        return {}
+
+    price_band = settings.AI_CACHE_PRICE_BAND
+    year_band = settings.AI_CACHE_YEAR_BAND
+    canonical = {}
+    for key, value in preferences.items():
+        if value in (None, '', [], {}):
+            continue
+        if key == 'price_min':
+            value = _band(value, price_band)
+        elif key == 'price_max':
+            value = _band(value, price_band, round_up=True)
+        elif key == 'year_min':
+            value = _band(value, year_band)
+        elif key == 'year_max':
+            value = _band(value, year_band, round_up=True)
+        elif isinstance(value, str):
+            value = _normalize_text(value)
+        if value not in (None, ''):
+            canonical[key] = value
+    return dict(sorted(canonical.items()))
+
+
+def canonical_vehicle_data(vehicle_data):
+    """规范化定价所用的车辆字段，里程按档位取整"""
+    if not isinstance(vehicle_data, dict):
+        return {}
+
+    canonical = {}
+    for key, value in vehicle_data.items():
+        if value in (None, ''):
+            continue
+        if key == 'mileage':
+            value = _band(value, settings.AI_CACHE_MILEAGE_BAND)
+        elif isinstance(value, str):
+            value = _normalize_text(value)
+        canonical[key] = value
+    return dict(sorted(canonical.items()))
+
+
+def vehicle_version(vehicle_id):
+    """车辆缓存版本号，车辆变更时递增"""
+    return cache.get(VEHICLE_VERSION_KEY.format(vehicle_id), 0)
+
+
+def bump_vehicle_version(vehicle_id):
+    key = VEHICLE_VERSION_KEY.format(vehicle_id)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def make_key(endpoint, parts):
+    """由接口名和规范化内容生成缓存键"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return f"{endpoint}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+class AIResponseCache:
+    """
+    线程安全的进程内LRU缓存
+    条目数或总字节数超过上限时淘汰最久未使用的条目，过期条目在读取时删除
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(key, value):
+        return len(key.encode('utf-8')) + len(value.encode('utf-8'))
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key):
+        endpoint = key.split(':', 1)[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                ai_metrics.incr(f'{endpoint}.cache.miss')
+                return None
+            self._entries.move_to_end(key)
+        ai_metrics.incr(f'{endpoint}.cache.hit')
+        return entry[0]
+
+    def set(self, key, value, ttl):
+        size = self._size(key, value)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        counters = ai_metrics.snapshot()['counters']
+        endpoints = {}
+        for name, value in counters.items():
+            endpoint, _, metric = name.partition('.cache.')
+            if metric in ('hit', 'miss'):
+                endpoints.setdefault(endpoint, {'hit': 0, 'miss': 0})[metric] = value
+        for values in endpoints.values():
+            total = values['hit'] + values['miss']
+            values['hit_rate'] = round(values['hit'] / total, 4) if total else None
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'endpoints': endpoints,
+            }
+
+
+def endpoint_ttl(endpoint):
+    return settings.AI_CACHE_TTL.get(endpoint, 0)
+
+
+response_cache = AIResponseCache(settings.AI_CACHE_MAX_ENTRIES, settings.AI_CACHE_MAX_BYTES)
@@ -0,0 +1,14 @@
+"""
+AI服务信号处理
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .response_cache import bump_vehicle_version
+
+
+@receiver(post_save, sender='vehicles.Vehicle')
+@receiver(post_delete, sender='vehicles.Vehicle')
+def invalidate_vehicle_ai_cache(sender, instance, **kwargs):
+    """车辆变更时递增版本号，使该车辆的AI定价缓存失效"""
+    bump_vehicle_version(instance.pk)
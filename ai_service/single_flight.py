@@ -0,0 +1,112 @@
+"""
+相同AI请求的合并（single-flight）
+同一缓存键的并发调用只由一个调用方（leader）请求上游，其余调用方等待并共享其结果或异常：
+进程内通过事件等待；跨进程时leader在共享缓存中持有锁，结果（或异常）写入共享缓存，
+其他进程轮询读取。使用LocMemCache时跨进程部分退化为仅进程内合并
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import ai_metrics
+
+LOCK_KEY = 'ai_flight:lock:{}'
+RESULT_KEY = 'ai_flight:result:{}'
+
+
+class SingleFlightTimeout(Exception):
+    """等待其他调用方的结果超时"""
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self, lock_ttl, error_ttl, poll_interval=0.1, max_poll_interval=0.5):
+        self.lock_ttl = lock_ttl
+        self.error_ttl = error_ttl
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout, result_ttl):
+        """
+        执行fn并返回结果；相同key已有调用在进行时等待并共享其结果，
+        fn抛出的异常同样传递给所有等待者，等待超过timeout秒抛出SingleFlightTimeout
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            ai_metrics.incr('single_flight.local_shared')
+            if not call.event.wait(timeout):
+                raise SingleFlightTimeout(key)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_shared(key, fn, timeout, result_ttl)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _do_shared(self, key, fn, timeout, result_ttl):
+        """跨进程合并：抢到共享锁的进程调用fn，其余进程轮询共享结果"""
+        lock_key = LOCK_KEY.format(key)
+        result_key = RESULT_KEY.format(key)
+        deadline = time.monotonic() + timeout
+        interval = self.poll_interval
+        waited = False
+
+        while True:
+            shared = cache.get(result_key)
+            if shared is not None:
+                if waited:
+                    ai_metrics.incr('single_flight.remote_shared')
+                if 'error' in shared:
+                    raise shared['error']
+                return shared['result']
+
+            if cache.add(lock_key, 1, timeout=self.lock_ttl):
+                ai_metrics.incr('single_flight.leader')
+                try:
+                    result = fn()
+                except Exception as e:
+                    cache.set(result_key, {'error': e}, self.error_ttl)
+                    raise
+                else:
+                    # 结果至少保留error_ttl秒，保证轮询中的其他进程能读到
+                    cache.set(result_key, {'result': result}, max(result_ttl, self.error_ttl))
+                    return result
+                finally:
+                    cache.delete(lock_key)
+
+            # 其他进程正在请求上游，等待其结果；锁过期（leader异常退出）后由本进程接手
+            if time.monotonic() + interval > deadline:
+                raise SingleFlightTimeout(key)
+            waited = True
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+
+
+single_flight = SingleFlight(
+    lock_ttl=settings.DEEPSEEK_DEADLINE + 10,
+    error_ttl=settings.AI_SINGLE_FLIGHT_ERROR_TTL,
+)
@@ -0,0 +1,123 @@
+"""
+AI聊天的流式输出
+将上游逐段返回的文本按 AIServiceViewSet._sanitize_ai_text 的规则增量清理，
+并编码为server-sent events
+"""
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+
+from .conversation import context_window, conversation_store, schedule_fold
+from .deepseek_service import FALLBACK_MESSAGES, DeepSeekError
+
+logger = logging.getLogger(__name__)
+
+ZERO_WIDTH_CHARS = {'\u200b', '\u200c', '\u200d'}
+REMOVED_CHARS = {'#', '!', '*'}
+
+
+class StreamSanitizer:
+    """
+    增量文本清理，整段输入的输出与 _sanitize_ai_text 一致：
+    统一换行符、去除零宽字符和#、!、*，行首尾空白去除、行内连续空白合并为一个空格，
+    连续空行最多保留一个，整体去除首尾空白。
+    行内空白和换行先挂起，遇到下一个可见字符时再输出，因此无需等待整行
+    """
+
+    def __init__(self):
+        self.started = False
+        self.line_has_text = False
+        self.pending_space = False
+        self.pending_newlines = 0
+        self.after_cr = False
+
+    def feed(self, chunk):
+        """输入一段原始文本，返回可以立即输出的清理后文本"""
+        output = []
+        for char in chunk:
+            if self.after_cr:
+                self.after_cr = False
+                if char == '\n':
+                    continue
+            if char in ZERO_WIDTH_CHARS or char in REMOVED_CHARS:
+                continue
+            if char in '\r\n':
+                self.after_cr = char == '\r'
+                self.pending_newlines += 1
+                self.pending_space = False
+                self.line_has_text = False
+                continue
+            if char.isspace():
+                self.pending_space = self.line_has_text
+                continue
+
+            if self.pending_newlines and self.started:
+                output.append('\n' * min(self.pending_newlines, 2))
+            elif self.pending_space:
+                output.append(' ')
+            self.pending_newlines = 0
+            self.pending_space = False
+            self.started = True
+            self.line_has_text = True
+            output.append(char)
+        return ''.join(output)
+
+
+def sse_event(event, data):
+    """编码一条server-sent event，data为JSON"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _chat_messages(conversation, user_message):
+    return context_window.build(conversation, user_message) + [{'role': 'user', 'content': user_message}]
+
+
+def _error_event(error):
+    logger.error(f"DeepSeek流式调用失败[chat]: {error}")
+    return sse_event('error', {'error': error.fallback_message or FALLBACK_MESSAGES['error']})
+
+
+def _finish(session_id, user_message, reply):
+    """保存本轮问答，返回done事件"""
+    if reply:
+        conversation = conversation_store.append_exchange(session_id, user_message, reply)
+        schedule_fold(session_id, conversation)
+    return sse_event('done', {'response': reply, 'session_id': session_id})
+
+
+async def chat_event_stream(service, session_id, conversation, user_message):
+    """
+    流式聊天的事件序列：delta事件携带增量文本，结束时保存本轮问答，done事件携带完整回复和session_id；
+    上游失败时发送error事件，已输出的部分保留在客户端，本轮不计入会话
+    """
+    sanitizer = StreamSanitizer()
+    parts = []
+    try:
+        async for text in service.stream_completion(_chat_messages(conversation, user_message), endpoint='chat'):
+            cleaned = sanitizer.feed(text)
+            if cleaned:
+                parts.append(cleaned)
+                yield sse_event('delta', {'text': cleaned})
+    except DeepSeekError as e:
+        yield _error_event(e)
+        return
+
+    yield await sync_to_async(_finish)(session_id, user_message, ''.join(parts))
+
+
+def chat_event_stream_sync(service, session_id, conversation, user_message):
+    """chat_event_stream的同步版本，WSGI下由工作线程逐段写出"""
+    sanitizer = StreamSanitizer()
+    parts = []
+    try:
+        for text in service.stream_completion_sync(_chat_messages(conversation, user_message), endpoint='chat'):
+            cleaned = sanitizer.feed(text)
+            if cleaned:
+                parts.append(cleaned)
+                yield sse_event('delta', {'text': cleaned})
+    except DeepSeekError as e:
+        yield _error_event(e)
+        return
+
+    yield _finish(session_id, user_message, ''.join(parts))
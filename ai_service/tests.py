@@ -0,0 +1,279 @@
+"""
+AI服务测试
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from rest_framework.throttling import AnonRateThrottle
+
+from .conversation import conversation_store
+from .circuit_breaker import breaker
+from .deepseek_service import DeepSeekError, DeepSeekService, get_async_client
+from .streaming import sse_event
+
+
+class MockDeepSeekHandler(BaseHTTPRequestHandler):
+    """模拟上游接口：按server.script依次返回 (状态码, 延迟秒数, 响应头)，脚本用完后返回200"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.requests.append(self.client_address)
+            status, delay, headers = server.script.pop(0) if server.script else (200, 0, {})
+        time.sleep(delay)
+        reply = 'echo:' + body['messages'][-1]['content']
+        if status == 200 and body.get('stream'):
+            self.send_stream(reply)
+            return
+        if status == 200:
+            data = json.dumps({'choices': [{'message': {'content': reply}}]})
+        else:
+            data = json.dumps({'error': status})
+        data = data.encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stream(self, reply):
+        """以分块传输的SSE逐字返回回复；server.truncate_stream时只发送第一个片段后断开连接"""
+        events = [
+            'data: ' + json.dumps({'choices': [{'delta': {'content': char}}]}) + '\n\n' for char in reply
+        ] + ['data: [DONE]\n\n']
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        if self.server.truncate_stream:
+            events = events[:1]
+            self.close_connection = True
+        for event in events:
+            data = event.encode('utf-8')
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+        if not self.server.truncate_stream:
+            self.wfile.write(b'0\r\n\r\n')
+
+
+class DeepSeekServiceTests(SimpleTestCase):
+    """DeepSeekService 对本地模拟服务的长连接复用、重试退避和连接池等待"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), MockDeepSeekHandler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.api_url = f'http://127.0.0.1:{cls.server.server_port}/v1/chat/completions'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        # 熔断器状态保存在缓存中
+        cache.clear()
+        self.server.requests = []
+        self.server.script = []
+        self.server.truncate_stream = False
+
+    def service(self, **options):
+        options = {'timeout': 2, 'connect_timeout': 1, 'max_retries': 3, 'deadline': 5,
+                   'backoff_base': 0.05, 'backoff_max': 1, **options}
+        return DeepSeekService(api_url=self.api_url, api_key='test', **options)
+
+    @staticmethod
+    def messages(text):
+        return [{'role': 'user', 'content': text}]
+
+    def test_keep_alive_connection_is_reused(self):
+        service = self.service()
+        for index in range(5):
+            self.assertEqual(service.request_completion(self.messages(f'q{index}')), f'echo:q{index}')
+        self.assertEqual(len(self.server.requests), 5)
+        # 5次请求来自同一个客户端端口，即复用了同一条长连接
+        self.assertEqual(len(set(self.server.requests)), 1)
+
+    def test_retryable_status_backs_off_and_retries(self):
+        self.server.script = [(503, 0, {}), (429, 0, {'Retry-After': '0.3'})]
+        delays = []
+
+        def backoff(service, attempt, retry_after=None):
+            delay = original(service, attempt, retry_after)
+            delays.append(delay)
+            return delay
+
+        original = DeepSeekService._backoff
+        with mock.patch.object(DeepSeekService, '_backoff', autospec=True, side_effect=backoff):
+            self.assertEqual(self.service().request_completion(self.messages('retry')), 'echo:retry')
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(delays), 2)
+        self.assertLessEqual(delays[0], 0.05)
+        # Retry-After 作为第二次退避的下限
+        self.assertGreaterEqual(delays[1], 0.3)
+
+    def test_client_error_is_not_retried(self):
+        self.server.script = [(400, 0, {})]
+        with self.assertRaises(DeepSeekError) as raised:
+            self.service().request_completion(self.messages('bad'))
+        self.assertEqual(raised.exception.kind, 'unavailable')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_retries_stop_at_deadline(self):
+        self.server.script = [(503, 0, {'Retry-After': '5'})] * 3
+        started = time.monotonic()
+        with self.assertRaises(DeepSeekError):
+            self.service(deadline=1, backoff_max=5).request_completion(self.messages('slow'))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_waiting_for_pooled_connection_respects_deadline(self):
+        self.server.script = [(200, 1, {})]
+        service = self.service(pool_size=1)
+        busy = threading.Thread(target=lambda: self.service_call(service, 'busy'))
+        busy.start()
+        time.sleep(0.1)
+        # 唯一的连接被占用约1秒，之后的调用只有0.3秒的截止时间
+        service.deadline = 0.3
+
+        started = time.monotonic()
+        with self.assertRaises(DeepSeekError) as raised:
+            service.request_completion(self.messages('waiting'))
+        self.assertEqual(raised.exception.kind, 'timeout')
+        self.assertLess(time.monotonic() - started, 0.5)
+        busy.join()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def stream(self, service, text):
+        async def collect():
+            return [chunk async for chunk in service.stream_completion(self.messages(text))]
+        return ''.join(asyncio.run(collect()))
+
+    def test_stream_records_one_breaker_outcome(self):
+        with mock.patch.object(breaker, 'record', wraps=breaker.record) as record:
+            self.assertEqual(self.stream(self.service(), 'hi'), 'echo:hi')
+        self.assertEqual(record.call_count, 1)
+        self.assertIs(record.call_args.args[1], True)
+
+    def test_stream_failure_after_first_token_records_one_failure(self):
+        self.server.truncate_stream = True
+        with mock.patch.object(breaker, 'record', wraps=breaker.record) as record:
+            with self.assertRaises(DeepSeekError):
+                self.stream(self.service(), 'hi')
+        self.assertEqual(record.call_count, 1)
+        self.assertIs(record.call_args.args[1], False)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_sync_stream_records_one_breaker_outcome(self):
+        with mock.patch.object(breaker, 'record', wraps=breaker.record) as record:
+            self.assertEqual(''.join(self.service().stream_completion_sync(self.messages('hi'))), 'echo:hi')
+        self.assertEqual(record.call_count, 1)
+        self.assertIs(record.call_args.args[1], True)
+
+    def test_sync_stream_failure_after_first_token_records_one_failure(self):
+        self.server.truncate_stream = True
+        service = self.service(pool_size=1)
+        with mock.patch.object(breaker, 'record', wraps=breaker.record) as record:
+            with self.assertRaises(DeepSeekError):
+                ''.join(service.stream_completion_sync(self.messages('hi')))
+        self.assertEqual(record.call_count, 1)
+        self.assertIs(record.call_args.args[1], False)
+        # 出错后连接名额已释放
+        self.assertEqual(service.request_completion(self.messages('ok')), 'echo:ok')
+
+    def test_async_client_is_closed_with_its_loop(self):
+        async def client():
+            return await get_async_client(2)
+
+        first = asyncio.run(client())
+        self.assertTrue(first.is_closed)
+        self.assertIsNot(asyncio.run(client()), first)
+
+    def test_chat_stream_streams_under_wsgi(self):
+        with mock.patch('ai_service.views.deepseek', self.service()):
+            response = self.client.post('/api/ai/chat_stream/', {'message': 'hi'}, content_type='application/json')
+            self.assertTrue(response.streaming)
+            events = [chunk.decode('utf-8') for chunk in response.streaming_content]
+        self.assertEqual(events[0], sse_event('delta', {'text': 'e'}))
+        self.assertTrue(events[-1].startswith('event: done'))
+        self.assertIn('"response": "echo:hi"', events[-1])
+
+    def service_call(self, service, text):
+        try:
+            service.request_completion(self.messages(text))
+        except DeepSeekError:
+            pass
+
+
+class ChatStreamThrottleTests(SimpleTestCase):
+    """流式聊天接口应用与DRF接口相同的限流"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_requests_are_throttled(self):
+        with mock.patch.object(AnonRateThrottle, 'rate', '2/min', create=True):
+            for _ in range(2):
+                response = self.client.post('/api/ai/chat_stream/', {}, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+            response = self.client.post('/api/ai/chat_stream/', {'message': '你好'}, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(response.has_header('Retry-After'))
+
+    def test_invalid_token_is_rejected(self):
+        response = self.client.post('/api/ai/chat_stream/', {'message': '你好'}, content_type='application/json',
+                                    HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(response.status_code, 401)
+
+
+class ConversationStoreTests(SimpleTestCase):
+    """并发追加同一会话时不丢失消息"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_appends_keep_every_exchange(self):
+        session_id, conversation = conversation_store.load(None)
+        conversation_store.save(session_id, conversation)
+
+        def append(worker):
+            for index in range(5):
+                conversation_store.append_exchange(session_id, f'{worker}-{index}', 'ok')
+
+        def slow_load(session_id):
+            # 拉长读取与写回之间的间隔，使未加锁的并发追加必然互相覆盖
+            loaded = load(session_id)
+            time.sleep(0.002)
+            return loaded
+
+        load = conversation_store.load
+        workers = [threading.Thread(target=append, args=(worker,)) for worker in range(8)]
+        with mock.patch.object(conversation_store, 'load', side_effect=slow_load):
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        _, conversation = conversation_store.load(session_id)
+        questions = [message['content'] for message in conversation['messages'] if message['role'] == 'user']
+        self.assertEqual(len(questions), 40)
+        self.assertEqual(len(set(questions)), 40)
@@ -6,5 +6,6 @@ router = DefaultRouter()
 router.register(r'', views.AIServiceViewSet, basename='ai')
 
 urlpatterns = [
+    path('chat_stream/', views.chat_stream, name='ai-chat-stream'),
     path('', include(router.urls))
 ]
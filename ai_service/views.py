@@ -1,10 +1,24 @@
-from rest_framework import viewsets, status
+from rest_framework import exceptions, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from vehicles.description_analysis import analysis_text, extract
+from vehicles.market_index import spec_stats, vehicle_stats
 from vehicles.models import Vehicle
-from .deepseek_service import deepseek
+from .deepseek_service import deepseek, is_fallback_reply
+from .circuit_breaker import ENDPOINTS, breaker
+from .local_fallback import estimate_price, recommendation_text
+from .metrics import ai_metrics
+from .response_cache import response_cache
+from .conversation import context_window, conversation_store, estimate_tokens, schedule_fold
+from .streaming import chat_event_stream, chat_event_stream_sync
 import json
 import logging
 import re
@@ -29,7 +43,7 @@ class AIServiceViewSet(viewsets.ViewSet):
             text = str(text)
 
         cleaned = text.replace('\r\n', '\n').replace('\r', '\n')
-        cleaned = re.sub(r'[\\u200b\\u200c\\u200d]', '', cleaned)  # 零宽字符
+        cleaned = re.sub(r'[\u200b\u200c\u200d]', '', cleaned)  # 零宽字符
         cleaned = re.sub(r'[#!*]+', '', cleaned)  # 去除#、!、*
 
         lines = []
@@ -39,7 +53,7 @@ class AIServiceViewSet(viewsets.ViewSet):
                 lines.append('')
                 continue
             # 避免多余空格，保持原有数字编号
-            line = re.sub(r'\\s+', ' ', line)
+            line = re.sub(r'\s+', ' ', line)
             lines.append(line)
 
         cleaned_text = '\n'.join(lines).strip()
@@ -102,46 +116,50 @@ class AIServiceViewSet(viewsets.ViewSet):
 
         return queryset.select_related('brand').prefetch_related('photos')
 
+    def _matching_vehicles(self, request, preferences, limit=6):
+        """按偏好从在售车辆中筛选，主图取自预取的照片"""
+        vehicles = []
+        for vehicle in self._build_vehicle_queryset(preferences)[:limit]:
+            photos = list(vehicle.photos.all())
+            main_photo = next((photo for photo in photos if photo.is_main), photos[0] if photos else None)
+            photo_url = None
+            if main_photo and getattr(main_photo, 'image', None):
+                try:
+                    photo_url = request.build_absolute_uri(main_photo.image.url)
+                except Exception:
+                    photo_url = main_photo.image.url
+
+            vehicles.append({
+                'id': vehicle.id,
+                'brand': vehicle.brand.name,
+                'model': vehicle.model_name,
+                'year': vehicle.year,
+                'price': float(vehicle.price),
+                'mileage': vehicle.mileage,
+                'color': vehicle.color,
+                'main_photo': photo_url,
+            })
+        return vehicles
+
     @action(detail=False, methods=['post'])
     def vehicle_recommendation(self, request):
         """
         综合车辆推荐
         POST /api/ai/vehicle_recommendation/
+        AI服务不可用（熔断或调用失败）时返回基于匹配车辆的本地推荐，source为local
         """
         try:
             preferences = request.data.get('preferences') or {}
 
             ai_raw = deepseek.recommend_vehicles(preferences)
-            if not ai_raw:
-                return Response({
-                    'success': False,
-                    'error': 'AI服务暂时不可用，请稍后再试'
-                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-
-            cleaned_text = self._sanitize_ai_text(ai_raw)
-
-            queryset = self._build_vehicle_queryset(preferences)
-            vehicles = []
+            vehicles = self._matching_vehicles(request, preferences)
 
-            for vehicle in queryset[:6]:
-                main_photo = vehicle.photos.filter(is_main=True).first() or vehicle.photos.first()
-                photo_url = None
-                if main_photo and getattr(main_photo, 'image', None):
-                    try:
-                        photo_url = request.build_absolute_uri(main_photo.image.url)
-                    except Exception:
-                        photo_url = main_photo.image.url
-
-                vehicles.append({
-                    'id': vehicle.id,
-                    'brand': vehicle.brand.name,
-                    'model': vehicle.model_name,
-                    'year': vehicle.year,
-                    'price': float(vehicle.price),
-                    'mileage': vehicle.mileage,
-                    'color': vehicle.color,
-                    'main_photo': photo_url,
-                })
+            if is_fallback_reply(ai_raw):
+                source = 'local'
+                cleaned_text = recommendation_text(vehicles)
+            else:
+                source = 'ai'
+                cleaned_text = self._sanitize_ai_text(ai_raw)
 
             return Response({
                 'success': True,
@@ -151,6 +169,7 @@ class AIServiceViewSet(viewsets.ViewSet):
                     'recommendations': cleaned_text,
                 },
                 'matching_vehicles': vehicles,
+                'source': source,
             }, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -165,6 +184,7 @@ class AIServiceViewSet(viewsets.ViewSet):
         """
         车辆智能定价
         POST /api/ai/price_estimate/
+        AI服务不可用时返回基于可比车辆的本地定价，source为local
         """
         try:
             vehicle_id = request.data.get('vehicle_id')
@@ -184,10 +204,27 @@ class AIServiceViewSet(viewsets.ViewSet):
                 # 根据输入数据定价
                 vehicle_data = request.data.get('vehicle_data', {})
 
+            market = vehicle_stats(vehicle) if vehicle_id else spec_stats(vehicle_data)
+
             # 调用DeepSeek API获取价格建议
-            ai_result = deepseek.calculate_vehicle_price(vehicle_data)
+            ai_result = deepseek.calculate_vehicle_price(
+                vehicle_data, vehicle_id=vehicle.id if vehicle_id else None, market=market
+            )
+
+            if is_fallback_reply(ai_result):
+                # AI服务不可用时返回基于规则的本地定价
+                price_info = estimate_price(vehicle_data, vehicle if vehicle_id else None)
+                if price_info:
+                    price_info['analysis'] = f"AI服务暂时繁忙，{price_info['analysis']}"
+                    return Response({
+                        'success': True,
+                        'vehicle_data': vehicle_data,
+                        'price_estimation': price_info,
+                        'ai_response': price_info['analysis'],
+                        'source': 'local',
+                    }, status=status.HTTP_200_OK)
 
-            if ai_result:
+            else:
                 try:
                     # 尝试解析AI返回的JSON数据
                     price_info = json.loads(ai_result) if ai_result.startswith('{') else {
@@ -210,13 +247,14 @@ class AIServiceViewSet(viewsets.ViewSet):
                     'success': True,
                     'vehicle_data': vehicle_data,
                     'price_estimation': price_info,
-                    'ai_response': ai_result
+                    'ai_response': ai_result,
+                    'source': 'ai',
                 }, status=status.HTTP_200_OK)
-            else:
-                return Response({
-                    'success': False,
-                    'error': 'AI服务暂时不可用，请稍后再试'
-                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            return Response({
+                'success': False,
+                'error': 'AI服务暂时不可用，请稍后再试'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
         except Exception as e:
             logger.error(f"AI price estimation error: {str(e)}")
@@ -234,20 +272,22 @@ class AIServiceViewSet(viewsets.ViewSet):
         try:
             user_preferences = request.data.get('preferences', {})
 
-            # 调用AI服务获取推荐
+            # 调用AI服务获取推荐，不可用时返回基于匹配车辆的本地推荐
             ai_result = deepseek.recommend_vehicles(user_preferences)
-
-            if ai_result:
+            if is_fallback_reply(ai_result):
                 return Response({
                     'success': True,
                     'preferences': user_preferences,
-                    'recommendations': ai_result
+                    'recommendations': recommendation_text(self._matching_vehicles(request, user_preferences)),
+                    'source': 'local',
                 }, status=status.HTTP_200_OK)
-            else:
-                return Response({
-                    'success': False,
-                    'error': 'AI服务暂时不可用，请稍后再试'
-                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            return Response({
+                'success': True,
+                'preferences': user_preferences,
+                'recommendations': ai_result,
+                'source': 'ai',
+            }, status=status.HTTP_200_OK)
 
         except Exception as e:
             logger.error(f"AI recommendation error: {str(e)}")
@@ -274,17 +314,23 @@ class AIServiceViewSet(viewsets.ViewSet):
             # 调用AI服务分析描述
             ai_result = deepseek.analyze_vehicle_description(description)
 
-            if ai_result:
+            if not is_fallback_reply(ai_result):
                 return Response({
                     'success': True,
                     'description': description,
-                    'analysis': ai_result
+                    'analysis': ai_result,
+                    'source': 'ai',
                 }, status=status.HTTP_200_OK)
-            else:
-                return Response({
-                    'success': False,
-                    'error': 'AI服务暂时不可用，请稍后再试'
-                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            # AI服务不可用时返回本地规则的提取结果
+            result = extract(description)
+            return Response({
+                'success': True,
+                'description': description,
+                'analysis': f"AI服务暂时繁忙，以下为根据描述关键词提取的结果：\n{analysis_text(result)}",
+                'tags': result['tags'],
+                'source': 'local',
+            }, status=status.HTTP_200_OK)
 
         except Exception as e:
             logger.error(f"AI description analysis error: {str(e)}")
@@ -298,25 +344,37 @@ class AIServiceViewSet(viewsets.ViewSet):
         """
         AI聊天助手
         POST /api/ai/chat_assistant/
+        会话保存在服务端，客户端只需回传上次响应中的session_id
         """
         try:
             message = request.data.get('message', '')
-            conversation_history = request.data.get('conversation_history', [])
 
             if not message:
                 return Response({
                     'success': False,
                     'error': '请输入消息'
                 }, status=status.HTTP_400_BAD_REQUEST)
+            if estimate_tokens(message) > settings.AI_CHAT_MAX_MESSAGE_TOKENS:
+                return Response({
+                    'success': False,
+                    'error': '消息过长，请精简后再试'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            session_id, conversation = conversation_store.load(request.data.get('session_id'))
+            context = context_window.build(conversation, message)
 
             # 调用AI聊天服务
-            ai_response = deepseek.chat_assistant(conversation_history, message)
+            ai_response = deepseek.chat_assistant(context, message)
 
             if ai_response:
+                if not is_fallback_reply(ai_response):
+                    conversation = conversation_store.append_exchange(session_id, message, ai_response)
+                    schedule_fold(session_id, conversation)
                 return Response({
                     'success': True,
                     'message': message,
-                    'response': ai_response
+                    'response': ai_response,
+                    'session_id': session_id,
                 }, status=status.HTTP_200_OK)
             else:
                 return Response({
@@ -330,3 +388,84 @@ class AIServiceViewSet(viewsets.ViewSet):
                 'success': False,
                 'error': '聊天服务出现错误，请稍后再试'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def metrics(self, request):
+        """
+        AI服务运行指标（当前进程）
+        GET /api/ai/metrics/
+        """
+        return Response({
+            **ai_metrics.snapshot(),
+            'cache': response_cache.stats(),
+            'breaker': breaker.snapshot(ENDPOINTS),
+        })
+
+
+def _error_response(message, status_code):
+    return JsonResponse({'success': False, 'error': message}, status=status_code,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def _throttle_wait(request):
+    """
+    异步视图不经过DRF的APIView：按DRF默认的认证和限流配置检查请求（与AIServiceViewSet一致），
+    返回需等待的秒数，未被限流时返回None；认证失败时抛出AuthenticationFailed
+    """
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    throttles = [throttle() for throttle in api_settings.DEFAULT_THROTTLE_CLASSES]
+    durations = [throttle.wait() for throttle in throttles if not throttle.allow_request(drf_request, None)]
+    if not durations:
+        return None
+    return max((duration for duration in durations if duration is not None), default=0)
+
+
+async def chat_stream(request):
+    """
+    AI聊天助手（流式）
+    POST /api/ai/chat_stream/
+    以server-sent events逐段返回回复：delta事件为增量文本，done事件为完整回复和session_id，error事件为错误提示。
+    异步视图在ASGI下不占用工作线程，首字节时间取决于上游首个片段的延迟；限流与其他DRF接口相同，超出时返回429。
+    WSGI下（如runserver）Django会先读完异步迭代器再发送，因此改用同步生成器逐段写出
+    """
+    if request.method != 'POST':
+        return _error_response('仅支持POST请求', 405)
+
+    try:
+        wait = await sync_to_async(_throttle_wait)(request)
+    except exceptions.AuthenticationFailed as e:
+        return _error_response(str(e.detail), 401)
+    if wait is not None:
+        response = _error_response(f'请求过于频繁，请{int(wait) + 1}秒后再试', 429)
+        response['Retry-After'] = str(int(wait) + 1)
+        return response
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return _error_response('请求格式错误', 400)
+
+    if not isinstance(data, dict):
+        data = {}
+    message = data.get('message', '')
+    if not message or not isinstance(message, str):
+        return _error_response('请输入消息', 400)
+    if estimate_tokens(message) > settings.AI_CHAT_MAX_MESSAGE_TOKENS:
+        return _error_response('消息过长，请精简后再试', 400)
+
+    session_id, conversation = await sync_to_async(conversation_store.load)(data.get('session_id'))
+    if isinstance(request, ASGIRequest):
+        events = chat_event_stream(deepseek, session_id, conversation, message)
+    else:
+        events = chat_event_stream_sync(deepseek, session_id, conversation, message)
+    response = StreamingHttpResponse(
+        events,
+        content_type='text/event-stream; charset=utf-8',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # 禁止反向代理缓冲
+    return response
+
+
+# 与DRF视图一致，接口不使用CSRF校验（Django 4.2的csrf_exempt装饰器不支持异步视图）
+chat_stream.csrf_exempt = True
@@ -29,6 +29,10 @@ class Order(models.Model):
     class Meta:
         db_table = 'orders_order'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'completed_at']),
+        ]
 
 class OrderMessage(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='messages')
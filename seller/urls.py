@@ -16,9 +16,7 @@ from rest_framework.routers import DefaultRouter
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum
-from orders.models import Order
-from vehicles.models import Vehicle
+from users.counters import get_user_counters
 from vehicles.views import VehicleViewSet
 
 # 导入seller_views中的ViewSet
@@ -40,26 +38,13 @@ class SellerStatsView(APIView):
 
     def get(self, request):
         """获取卖家统计数据"""
-        user = request.user
-
-        # 获取统计数据
-        vehicles = Vehicle.objects.filter(seller=user)
-        orders = Order.objects.filter(seller=user)
-
-        total_vehicles = vehicles.filter(status__in=['listed', 'pending_review', 'sold']).count()
-        sold_vehicles = vehicles.filter(status='sold').count()
-        pending_orders = orders.filter(status__in=['pending_payment', 'paid']).count()
-
-        # 计算总收入（已完成订单）
-        total_revenue = orders.filter(status='completed').aggregate(
-            total=Sum('price')
-        )['total'] or 0
+        counters = get_user_counters(request.user)
 
         return Response({
-            'total_vehicles': total_vehicles,
-            'sold_vehicles': sold_vehicles,
-            'pending_orders': pending_orders,
-            'total_revenue': float(total_revenue),
+            'total_vehicles': counters.listed_vehicles + counters.pending_review_vehicles + counters.sold_vehicles,
+            'sold_vehicles': counters.sold_vehicles,
+            'pending_orders': counters.pending_seller_orders + counters.paid_seller_orders,
+            'total_revenue': float(counters.sales_revenue),
         })
 
 router = DefaultRouter()
@@ -3,10 +3,12 @@
 """
 卖家中心序列化器
 """
+from django.conf import settings
 from rest_framework import serializers
 from users.models import User
 from orders.models import Order, OrderReview
 from vehicles.models import Vehicle, VehiclePrice, VehiclePriceHistory, CarBrand
+from vehicles.market_index import vehicle_stats
 
 
 class SellerOrderSerializer(serializers.ModelSerializer):
@@ -90,6 +92,17 @@ class VehiclePriceSerializer(serializers.ModelSerializer):
         return obj.suggested_price
 
     def get_market_avg_price(self, obj):
+        """
+        同款可比车辆的市场中位价；可比样本不足时沿用定价区间
+        序列化列表时视图在上下文market_stats中传入批量读取的统计 {车辆ID: 统计}
+        """
+        market_stats = self.context.get('market_stats')
+        if market_stats is not None and obj.vehicle_id in market_stats:
+            stats = market_stats[obj.vehicle_id]
+        else:
+            stats = vehicle_stats(obj.vehicle)
+        if stats:
+            return stats['median_price']
         base = obj.max_price or obj.suggested_price or getattr(obj.vehicle, 'price', None)
         return float(base) if base is not None else None
 
@@ -170,6 +183,21 @@ class SellerReviewSerializer(serializers.ModelSerializer):
         return obj.order.seller_note
 
 
+class PriceBatchEstimateSerializer(serializers.Serializer):
+    """批量估价请求：车辆ID列表和/或车辆规格行，总数不超过PRICE_BATCH_MAX_ITEMS"""
+    vehicle_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    specs = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    save = serializers.BooleanField(required=False, default=True)
+
+    def validate(self, attrs):
+        total = len(attrs['vehicle_ids']) + len(attrs['specs'])
+        if not total:
+            raise serializers.ValidationError('请提供vehicle_ids或specs')
+        if total > settings.PRICE_BATCH_MAX_ITEMS:
+            raise serializers.ValidationError(f'单次最多估价{settings.PRICE_BATCH_MAX_ITEMS}条')
+        return attrs
+
+
 class SellerAnalyticsSerializer(serializers.Serializer):
     """卖家统计数据序列化器"""
     total_revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
@@ -11,18 +11,23 @@ from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
 from django.db.models import Q, Count, Avg, Sum, F, Prefetch
 from django.utils import timezone
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from datetime import datetime, timedelta
 import csv
 import json
 
 from users.models import User
+from users.counters import get_user_counters
 from orders.models import Order, OrderReview, OrderPayment
 from vehicles.models import Vehicle, VehiclePrice, VehiclePriceHistory, CarBrand
+from vehicles.pricing_model import estimate_prices, estimate_records, save_estimates, vehicle_record
+from ai_service.local_fallback import estimate_price
+from vehicles.market_index import market_position, vehicle_stats, vehicles_stats
 from seller_serializers import (
     SellerOrderSerializer,
     VehiclePriceSerializer,
     VehiclePriceHistorySerializer,
+    PriceBatchEstimateSerializer,
     SellerReviewSerializer,
     SellerAnalyticsSerializer
 )
@@ -54,15 +59,17 @@ class SellerOrderViewSet(viewsets.ModelViewSet):
         if status_filter:
             queryset = queryset.filter(status=status_filter)
 
-        # 时间筛选
+        return self.filter_dates(queryset).order_by('-created_at')
+
+    def filter_dates(self, queryset):
+        """时间筛选"""
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
         if start_date:
             queryset = queryset.filter(created_at__gte=start_date)
         if end_date:
             queryset = queryset.filter(created_at__lte=end_date)
-
-        return queryset.order_by('-created_at')
+        return queryset
 
     def list(self, request, *args, **kwargs):
         """获取订单列表，包含统计信息"""
@@ -90,20 +97,31 @@ class SellerOrderViewSet(viewsets.ModelViewSet):
         })
 
     def get_order_stats(self):
-        """获取订单统计数据"""
-        queryset = self.get_queryset()
-
-        stats = {
-            'total': queryset.count(),
-            'pending': queryset.filter(status='pending_payment').count(),
-            'confirmed': queryset.filter(status='paid').count(),
-            'completed': queryset.filter(status='completed').count(),
-            'cancelled': queryset.filter(status='cancelled').count(),
-            'total_revenue': queryset.filter(status='completed').aggregate(
-                total=Sum('price')
-            )['total'] or 0
-        }
+        """
+        获取订单统计数据（各状态标签上的数量，不受状态筛选影响）
+        未按时间筛选时直接读取卖家的计数行，否则对时间范围内的订单做一次聚合
+        """
+        params = self.request.query_params
+        if not params.get('start_date') and not params.get('end_date'):
+            counters = get_user_counters(self.request.user)
+            return {
+                'total': counters.total_seller_orders,
+                'pending': counters.pending_seller_orders,
+                'confirmed': counters.paid_seller_orders,
+                'completed': counters.total_sales,
+                'cancelled': counters.cancelled_seller_orders,
+                'total_revenue': counters.sales_revenue,
+            }
 
+        stats = self.filter_dates(Order.objects.filter(seller=self.request.user)).aggregate(
+            total=Count('id'),
+            pending=Count('id', filter=Q(status='pending_payment')),
+            confirmed=Count('id', filter=Q(status='paid')),
+            completed=Count('id', filter=Q(status='completed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+            total_revenue=Sum('price', filter=Q(status='completed')),
+        )
+        stats['total_revenue'] = stats['total_revenue'] or 0
         return stats
 
     @action(detail=True, methods=['post'])
@@ -229,7 +247,9 @@ class SellerPricingViewSet(viewsets.ModelViewSet):
     - GET /api/seller/pricing/{id}/ - 获取价格详情
     - PUT /api/seller/pricing/{id}/ - 更新价格
     - GET /api/seller/pricing/{id}/history/ - 获取价格历史
-    - GET /api/seller/ai-pricing/{vehicle_id}/ - 获取AI定价建议
+    - GET /api/seller/pricing/ai-pricing/{vehicle_id}/ - 获取AI定价建议
+    - GET /api/seller/pricing/ai-pricing-batch/ - 批量获取全部在库车辆的定价建议
+    - POST /api/seller/pricing/batch-estimate/ - 按车辆ID或规格批量估价（流式返回）
     """
     serializer_class = VehiclePriceSerializer
     queryset = VehiclePrice.objects.all().select_related('vehicle')
@@ -239,6 +259,17 @@ class SellerPricingViewSet(viewsets.ModelViewSet):
         # 只返回当前卖家车辆的价格信息
         return VehiclePrice.objects.filter(vehicle__seller=self.request.user).select_related('vehicle').order_by('-updated_at')
 
+    def get_serializer(self, *args, **kwargs):
+        """序列化价格列表时一次读取全部车辆的市场可比统计，通过上下文传给序列化器"""
+        if kwargs.get('many') and args and self.get_serializer_class() is VehiclePriceSerializer:
+            prices = list(args[0])
+            kwargs.setdefault('context', {
+                **self.get_serializer_context(),
+                'market_stats': vehicles_stats([price.vehicle for price in prices]),
+            })
+            args = (prices, *args[1:])
+        return super().get_serializer(*args, **kwargs)
+
     @action(detail=False, methods=['get'], url_path='ai-pricing/(?P<vehicle_id>[^/.]+)')
     def ai_pricing(self, request, vehicle_id=None):
         """获取AI智能定价建议"""
@@ -250,47 +281,211 @@ class SellerPricingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # 模拟AI定价建议（实际应该调用AI服务）
-        suggested_price = self.calculate_ai_price(vehicle)
+        suggested_price = self.calculate_ai_price([vehicle])[0]
+        return Response(self._pricing_payload(vehicle, suggested_price, vehicle_stats(vehicle)))
 
+    @action(detail=False, methods=['get'], url_path='ai-pricing-batch')
+    def ai_pricing_batch(self, request):
+        """批量获取卖家全部未售车辆的定价建议（一次向量化估价）"""
+        vehicles = list(
+            Vehicle.objects.filter(seller=request.user).exclude(status='sold')
+            .select_related('brand').order_by('-created_at')
+        )
+        suggestions = self.calculate_ai_price(vehicles)
+        market_stats = vehicles_stats(vehicles)
         return Response({
-            'vehicle_id': vehicle.id,
-            'vehicle_name': f'{vehicle.brand.name} {vehicle.model_name}',
-            'recommended_price': suggested_price['price'],
-            'min_price': suggested_price['min_price'],
-            'max_price': suggested_price['max_price'],
-            'confidence': suggested_price['confidence'],
-            'reason': suggested_price['reason']
+            'count': len(vehicles),
+            'results': [
+                self._pricing_payload(vehicle, suggestion, market_stats[vehicle.id])
+                for vehicle, suggestion in zip(vehicles, suggestions)
+            ],
         })
 
-    def calculate_ai_price(self, vehicle):
-        """计算AI定价建议（简化版本）"""
-        base_price = float(vehicle.price)
-
-        # 根据车龄调整价格
-        current_year = timezone.now().year
-        vehicle_age = current_year - vehicle.year
-        age_factor = max(0.3, 1 - (vehicle_age * 0.1))
-
-        # 根据里程调整价格
-        mileage_factor = max(0.5, 1 - (vehicle.mileage / 200000))
+    @action(detail=False, methods=['post'], url_path='batch-estimate')
+    def batch_estimate(self, request):
+        """
+        批量估价
+        POST /api/seller/pricing/batch-estimate/
+        {
+            "vehicle_ids": [1, 2, 3],
+            "specs": [{"brand": "宝马", "year": 2020, "mileage": 30000, "fuel_type": "gasoline", "transmission": "auto"}],
+            "save": true
+        }
+        车辆一次查询加载，与规格行一起由定价模型一次估价；save为true时车辆的估价批量写入VehiclePrice。
+        定价模型尚未训练时与单车定价一致按规则估价（model_version为rules），规格行需提供车型名（model）。
+        结果以NDJSON逐行流式返回：每个车辆ID、每个规格行各一行，最后一行为汇总
+        """
+        serializer = PriceBatchEstimateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        vehicle_ids = list(dict.fromkeys(serializer.validated_data['vehicle_ids']))
+        specs = serializer.validated_data['specs']
+
+        vehicles = Vehicle.objects.filter(
+            seller=request.user, id__in=vehicle_ids
+        ).select_related('brand', 'price_info')
+        vehicles_by_id = {vehicle.id: vehicle for vehicle in vehicles}
+        found = [vehicles_by_id[vehicle_id] for vehicle_id in vehicle_ids if vehicle_id in vehicles_by_id]
+
+        reference_year = timezone.now().year
+        spec_records = self._spec_records(specs, reference_year)
+        records = [vehicle_record(vehicle, reference_year) for vehicle in found]
+        records += [record for record in spec_records if not isinstance(record, str)]
+
+        suggestions = estimate_records(records)
+        if suggestions is None:
+            # 定价模型尚未训练：与单车定价一致按可比车辆规则估价，规格行无法估价时为None
+            suggestions = [self._rules_suggestion(self._vehicle_data(vehicle), vehicle) for vehicle in found]
+            suggestions += self._rules_spec_suggestions(specs, spec_records)
+
+        vehicle_suggestions = dict(zip((vehicle.id for vehicle in found), suggestions))
+        spec_suggestions = iter(suggestions[len(found):])
+        market_stats = vehicles_stats(found)
+        updated = created = 0
+        if serializer.validated_data['save'] and found:
+            updated, created = save_estimates(found, suggestions[:len(found)])
+
+        def lines():
+            errors = 0
+            for vehicle_id in vehicle_ids:
+                vehicle = vehicles_by_id.get(vehicle_id)
+                if vehicle is None:
+                    errors += 1
+                    row = {'vehicle_id': vehicle_id, 'error': '车辆不存在或无权限'}
+                else:
+                    row = self._pricing_payload(vehicle, vehicle_suggestions[vehicle_id], market_stats[vehicle_id])
+                yield json.dumps(row, ensure_ascii=False) + '\n'
+
+            for index, record in enumerate(spec_records):
+                suggestion = None if isinstance(record, str) else next(spec_suggestions)
+                if isinstance(record, str):
+                    errors += 1
+                    row = {'spec_index': index, 'error': record}
+                elif suggestion is None:
+                    errors += 1
+                    row = {'spec_index': index, 'error': '定价模型尚未训练，且没有足够的同款车辆可供估价'}
+                else:
+                    row = {
+                        'spec_index': index,
+                        'recommended_price': suggestion['price'],
+                        'min_price': suggestion['min_price'],
+                        'max_price': suggestion['max_price'],
+                        'confidence': suggestion['confidence'],
+                        'model_version': suggestion['model_version'],
+                    }
+                yield json.dumps(row, ensure_ascii=False) + '\n'
+
+            yield json.dumps({'summary': {
+                'vehicles': len(found),
+                'specs': len(spec_records),
+                'errors': errors,
+                'price_records_updated': updated,
+                'price_records_created': created,
+            }}, ensure_ascii=False) + '\n'
+
+        return StreamingHttpResponse(lines(), content_type='application/x-ndjson; charset=utf-8')
+
+    @staticmethod
+    def _spec_records(specs, reference_year):
+        """
+        将规格行转换为定价模型的特征记录，无法解析的行返回错误信息字符串；
+        品牌可用名称（brand）或ID（brand_id），名称一次查询解析
+        """
+        fuel_types = {value for value, _ in Vehicle._meta.get_field('fuel_type').choices}
+        transmissions = {value for value, _ in Vehicle._meta.get_field('transmission').choices}
+        brand_names = {str(spec['brand']).strip() for spec in specs if spec.get('brand') and not spec.get('brand_id')}
+        brand_ids = dict(CarBrand.objects.filter(name__in=brand_names).values_list('name', 'id'))
 
-        # 根据品牌调整价格
-        brand_factor = 1.0
-        if vehicle.brand.country == 'import':
-            brand_factor = 1.2
+        records = []
+        for spec in specs:
+            try:
+                year = int(spec.get('year'))
+                mileage = int(spec.get('mileage', 0))
+            except (TypeError, ValueError):
+                records.append('year和mileage必须为整数')
+                continue
+            if not 1900 <= year <= reference_year + 1 or mileage < 0:
+                records.append('year或mileage超出范围')
+                continue
+            fuel_type = spec.get('fuel_type') or None
+            transmission = spec.get('transmission') or None
+            if fuel_type is not None and fuel_type not in fuel_types:
+                records.append(f'不支持的燃油类型: {fuel_type}')
+                continue
+            if transmission is not None and transmission not in transmissions:
+                records.append(f'不支持的变速箱类型: {transmission}')
+                continue
+            records.append({
+                'brand': spec.get('brand_id') or brand_ids.get(str(spec.get('brand') or '').strip()),
+                'car_type': spec.get('car_type_id'),
+                'fuel_type': fuel_type,
+                'transmission': transmission,
+                'year': year,
+                'mileage': mileage,
+                'reference_year': reference_year,
+            })
+        return records
 
-        # 计算最终价格
-        suggested_price = base_price * age_factor * mileage_factor * brand_factor
+    @staticmethod
+    def _pricing_payload(vehicle, suggestion, market):
+        """单车定价结果，market为该车的市场可比统计（批量接口用vehicles_stats一次读取）"""
+        return {
+            'vehicle_id': vehicle.id,
+            'vehicle_name': f'{vehicle.brand.name} {vehicle.model_name}',
+            'current_price': float(vehicle.price),
+            'recommended_price': suggestion['price'],
+            'min_price': suggestion['min_price'],
+            'max_price': suggestion['max_price'],
+            'confidence': suggestion['confidence'],
+            'model_version': suggestion['model_version'],
+            'reason': suggestion['reason'],
+            'market': market,
+            'market_position': market_position(vehicle.price, market),
+        }
 
+    def calculate_ai_price(self, vehicles):
+        """
+        用本地定价模型为一批车辆估价；模型尚未训练时按可比车辆的规则估价
+        """
+        suggestions = estimate_prices(vehicles)
+        if suggestions is not None:
+            return suggestions
+        return [self._rules_suggestion(self._vehicle_data(vehicle), vehicle) for vehicle in vehicles]
+
+    @staticmethod
+    def _vehicle_data(vehicle):
+        return {'brand': vehicle.brand.name, 'model': vehicle.model_name, 'year': vehicle.year, 'mileage': vehicle.mileage}
+
+    @staticmethod
+    def _rules_suggestion(vehicle_data, vehicle=None):
+        """按可比车辆的规则估价，结构与定价模型的估价一致；无法估价时返回None"""
+        local = estimate_price(vehicle_data, vehicle)
+        if local is None:
+            return None
         return {
-            'price': round(suggested_price, 2),
-            'min_price': round(suggested_price * 0.9, 2),
-            'max_price': round(suggested_price * 1.1, 2),
-            'confidence': 0.85,
-            'reason': f'基于{vehicle.year}年款、里程{vehicle.mileage}km、{vehicle.brand.name}品牌等因素计算'
+            'price': local['suggested_price'],
+            'min_price': local['min_price'],
+            'max_price': local['max_price'],
+            'confidence': local['confidence'],
+            'model_version': 'rules',
+            'reason': local['analysis'],
         }
 
+    def _rules_spec_suggestions(self, specs, spec_records):
+        """规格行的规则估价（与有效的特征记录一一对应），品牌ID一次查询解析为名称"""
+        valid = [(spec, record) for spec, record in zip(specs, spec_records) if not isinstance(record, str)]
+        brand_names = dict(CarBrand.objects.filter(
+            id__in={record['brand'] for _, record in valid if record['brand']}
+        ).values_list('id', 'name'))
+        return [
+            self._rules_suggestion({
+                'brand': brand_names.get(record['brand']) or spec.get('brand'),
+                'model': spec.get('model'),
+                'year': record['year'],
+                'mileage': record['mileage'],
+            })
+            for spec, record in valid
+        ]
+
     @action(detail=True, methods=['get'])
     def history(self, request, pk=None):
         """获取价格变化历史"""
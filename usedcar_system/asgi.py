@@ -0,0 +1,18 @@
+"""
+ASGI config for usedcar_system project.
+以ASGI方式部署（如 uvicorn usedcar_system.asgi:application）时流式AI聊天以异步方式输出，不占用工作线程；
+runserver等WSGI部署下改由工作线程同步逐段输出
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'usedcar_system.settings')
+
+application = get_asgi_application()
+
+# 进程启动时在后台构建在售车辆快照
+from vehicles.listing_snapshot import listing_snapshot  # noqa: E402
+
+listing_snapshot.start()
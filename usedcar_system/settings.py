@@ -73,6 +73,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'usedcar_system.wsgi.application'
+ASGI_APPLICATION = 'usedcar_system.asgi.application'
 
 
 # Database
@@ -212,6 +213,155 @@ DEEPSEEK_API_URL = 'https://api.deepseek.com/v1/chat/completions'
 DEEPSEEK_MODEL = 'deepseek-chat'
 DEEPSEEK_TIMEOUT = 60
 DEEPSEEK_MAX_RETRIES = 3
+DEEPSEEK_CONNECT_TIMEOUT = 5
+# 单次调用（含全部重试和退避等待）的总截止时间，秒
+DEEPSEEK_DEADLINE = 90
+# 重试退避：第n次重试前等待 [0, min(MAX, BASE * 2^n)] 秒内的随机时间
+DEEPSEEK_BACKOFF_BASE = 0.5
+DEEPSEEK_BACKOFF_MAX = 8
+# 每个进程到API主机的最大长连接数
+DEEPSEEK_POOL_SIZE = 10
+# 每个进程（事件循环）流式聊天的最大并发连接数
+DEEPSEEK_STREAM_POOL_SIZE = 100
+
+# AI Response Cache
+# 各接口的缓存时间（秒），未配置的接口不缓存
+AI_CACHE_TTL = {
+    'recommend': 60 * 60,
+    'price': 6 * 60 * 60,
+    'describe': 24 * 60 * 60,
+}
+AI_CACHE_MAX_ENTRIES = 1000
+AI_CACHE_MAX_BYTES = 16 * 1024 * 1024
+# 规范化偏好和车辆数据时的分档宽度
+AI_CACHE_PRICE_BAND = 10000
+AI_CACHE_YEAR_BAND = 2
+AI_CACHE_MILEAGE_BAND = 5000
+# 相同请求合并：等待者在上游截止时间之外额外等待的秒数，失败结果共享的秒数
+AI_SINGLE_FLIGHT_GRACE = 5
+AI_SINGLE_FLIGHT_ERROR_TTL = 5
+
+# AI Circuit Breaker
+# 按接口统计最近AI_BREAKER_WINDOW秒（按AI_BREAKER_BUCKET_SECONDS分桶）的上游请求，
+# 请求数达到MIN_CALLS且失败率或慢调用比例超过阈值时熔断OPEN_SECONDS秒，之后放行一个探测请求
+AI_BREAKER_WINDOW = 60
+AI_BREAKER_BUCKET_SECONDS = 10
+AI_BREAKER_MIN_CALLS = 5
+AI_BREAKER_FAILURE_RATE = 0.5
+AI_BREAKER_SLOW_CALL_SECONDS = 20
+AI_BREAKER_SLOW_CALL_RATE = 0.8
+AI_BREAKER_OPEN_SECONDS = 30
+
+# Vehicle Pricing Model
+# 由 train_price_model 命令定期训练（如每天一次），各进程按文件修改时间重新加载
+PRICE_MODEL_PATH = BASE_DIR / 'data' / 'price_model.npz'
+PRICE_MODEL_RELOAD_INTERVAL = 60
+PRICE_MODEL_ALPHA = 1.0
+PRICE_MODEL_MIN_SAMPLES = 30
+# 出现次数少于该值的品牌/类型等归入“其他”
+PRICE_MODEL_MIN_CATEGORY_COUNT = 3
+# 在售车辆标价样本相对成交价样本的权重
+PRICE_MODEL_LISTING_WEIGHT = 0.3
+# 批量估价接口单次请求的最大条数
+PRICE_BATCH_MAX_ITEMS = 5000
+
+# Item-to-item Recommendations
+# 由 build_item_neighbors 命令定时计算；每辆车保存的相似车辆数、最低相似度，
+# 共同用户数收缩系数（相似度乘以 共同用户数 / (共同用户数 + 系数)）
+RECOMMENDER_TOP_K = 20
+RECOMMENDER_MIN_SCORE = 0.05
+RECOMMENDER_SUPPORT_SHRINKAGE = 2.0
+# 参与计算的浏览记录时间范围（天），收藏不受限制
+RECOMMENDER_VIEW_HISTORY_DAYS = 180
+# 个性化推荐参考的最近收藏数和浏览数
+RECOMMENDER_SEED_COUNT = 20
+
+# Similar Vehicles Index
+# 各进程内存中的相似车辆索引，信号就地更新本进程，每隔REFRESH_INTERVAL秒从数据库重建一次
+# （同步其他进程的变更）；标记删除的行超过COMPACT_RATIO比例时提前重建
+SIMILAR_INDEX_REFRESH_INTERVAL = 300
+SIMILAR_INDEX_COMPACT_RATIO = 0.25
+
+# Market Comparables
+# 按 品牌、车型名、年份区间、里程区间 汇总在售标价和近期成交价，由信号增量更新，
+# rebuild_market_index 命令定期全量重建（如每天一次）
+MARKET_YEAR_BAND = 2
+MARKET_MILEAGE_BAND = 30000
+# 样本数少于该值的分组不作为市场价参考
+MARKET_MIN_COMPARABLES = 3
+# 参与统计的成交订单时间范围（天），近期价格变化率比较的时间段长度（天）
+MARKET_ORDER_HISTORY_DAYS = 365
+MARKET_TREND_DAYS = 90
+MARKET_CACHE_TTL = 60 * 60
+
+# Description Analysis
+# 车辆创建或描述修改后在后台分析描述的线程数；是否在本地规则之外调用AI生成分析摘要
+DESCRIPTION_ANALYSIS_WORKERS = 2
+DESCRIPTION_ANALYSIS_USE_AI = False
+
+# Listing Facets
+# 分面统计结果按查询参数缓存的秒数，车辆变更在此时间内反映到统计中
+FACET_CACHE_TTL = 60
+
+# Listing Snapshot
+# 各进程内存中的在售车辆列式快照，公开列表的筛选、排序和分页在快照上完成；
+# 每隔POLL_INTERVAL秒读取车辆变更记录，每隔REFRESH_INTERVAL秒在后台全量重建，
+# 标记删除的行超过COMPACT_RATIO比例时提前重建；变更记录保留RETENTION秒
+LISTING_SNAPSHOT_ENABLED = True
+LISTING_SNAPSHOT_POLL_INTERVAL = 1
+LISTING_SNAPSHOT_REFRESH_INTERVAL = 600
+LISTING_SNAPSHOT_COMPACT_RATIO = 0.25
+LISTING_CHANGE_RETENTION = 24 * 60 * 60
+
+# AI Chat Sessions
+# 会话在缓存中的保留时间（秒），多进程部署需使用共享缓存
+AI_CHAT_SESSION_TTL = 2 * 60 * 60
+# 每次请求的上下文预算（估算token数，含摘要、历史消息和本轮消息）
+AI_CHAT_CONTEXT_TOKENS = 3000
+# 原文保留的最近消息条数，更早的消息折叠进摘要
+AI_CHAT_RECENT_MESSAGES = 8
+AI_CHAT_SUMMARY_TOKENS = 400
+# 单条用户消息的上限
+AI_CHAT_MAX_MESSAGE_TOKENS = 1000
+
+# Search Trends Configuration
+# 热门搜索词的时间窗口（名称 -> 衰减半衰期，秒）
+SEARCH_TRENDS_WINDOWS = {
+    'hour': 60 * 60,
+    'day': 24 * 60 * 60,
+    'week': 7 * 24 * 60 * 60,
+}
+SEARCH_TRENDS_TOP_K = 50
+# 各进程把本地统计合并到共享缓存的间隔（秒），多进程部署需使用共享缓存后端
+SEARCH_TRENDS_FLUSH_INTERVAL = 10
+
+# Duplicate Listing Detection
+# 照片感知哈希（64位）汉明距离不超过该值视为重复图片，多索引哈希检索最多支持7
+PHOTO_DUPLICATE_MAX_DISTANCE = 6
+PHOTO_HASH_WORKERS = 4
+
+# Log Archive Configuration
+# 超过保留天数的日志行由 archive_logs 命令移入按日分片的压缩归档
+LOG_RETENTION_DAYS = 180
+LOG_ARCHIVE_BATCH_SIZE = 1000
+LOG_ARCHIVE_ROOT = BASE_DIR / 'logs' / 'archive'
+LOG_ARCHIVE_MODELS = {
+    'admin_log': {
+        'model': 'admin_panel.AdminLog',
+        'time_field': 'created_at',
+        'index_fields': ['admin_user_id', 'operation_type', 'target_type'],
+    },
+    'user_operation': {
+        'model': 'users.UserOperationLog',
+        'time_field': 'created_at',
+        'index_fields': ['user_id', 'operation_type'],
+    },
+    'user_login': {
+        'model': 'users.UserLoginHistory',
+        'time_field': 'login_time',
+        'index_fields': ['user_id'],
+    },
+}
 
 # Logging Configuration
 LOGGING = {
@@ -7,6 +7,7 @@ from django.shortcuts import render, redirect
 from django.http import JsonResponse
 from rest_framework import status
 from vehicles.models import Vehicle, CarBrand
+from vehicles.market_index import vehicles_stats
 from vehicles.serializers import VehicleSerializer
 
 logger = logging.getLogger(__name__)
@@ -271,12 +272,12 @@ def api_recent_vehicles(request):
     获取最近发布的车辆列表API
     """
     try:
-        vehicles = Vehicle.objects.filter(status='available')[:8]
-        serializer = VehicleSerializer(vehicles, many=True)
+        vehicles = list(Vehicle.objects.filter(status='available')[:8])
+        serializer = VehicleSerializer(vehicles, many=True, context={'market_stats': vehicles_stats(vehicles)})
         return JsonResponse({
             'success': True,
             'results': serializer.data,
-            'count': vehicles.count()
+            'count': len(vehicles)
         })
     except Exception as e:
         return JsonResponse({
@@ -10,3 +10,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'usedcar_system.settings')
 
 application = get_wsgi_application()
 
+# 进程启动时在后台构建在售车辆快照
+from vehicles.listing_snapshot import listing_snapshot  # noqa: E402
+
+listing_snapshot.start()
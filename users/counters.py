@@ -0,0 +1,210 @@
+"""
+用户计数器服务
+根据车辆和订单的状态变化增量维护 UserCounter，并提供全量重算（对账）
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import UserCounter
+
+logger = logging.getLogger(__name__)
+
+# 车辆状态 -> 卖家计数字段
+VEHICLE_STATUS_COUNTERS = {
+    'listed': 'listed_vehicles',
+    'pending_review': 'pending_review_vehicles',
+    'sold': 'sold_vehicles',
+}
+
+# 订单状态 -> ((角色, 计数字段), ...)
+ORDER_STATUS_COUNTERS = {
+    'pending_payment': (('buyer', 'pending_buyer_orders'), ('seller', 'pending_seller_orders')),
+    'paid': (('seller', 'paid_seller_orders'),),
+    'completed': (('buyer', 'total_purchases'), ('seller', 'total_sales')),
+    'cancelled': (('seller', 'cancelled_seller_orders'),),
+}
+
+# 实例加载时计数相关字段被延迟加载，旧状态未知
+UNKNOWN_STATE = object()
+
+COUNTER_FIELDS = (
+    'listed_vehicles', 'pending_review_vehicles', 'sold_vehicles',
+    'pending_buyer_orders', 'pending_seller_orders', 'paid_seller_orders',
+    'total_seller_orders', 'cancelled_seller_orders',
+    'total_purchases', 'total_sales', 'sales_revenue',
+)
+
+
+def vehicle_state(vehicle):
+    """车辆中影响计数的状态快照"""
+    return (vehicle.status, vehicle.seller_id)
+
+
+def order_state(order):
+    """订单中影响计数的状态快照"""
+    return (order.status, order.buyer_id, order.seller_id, order.price)
+
+
+def _vehicle_contribution(state, sign, deltas):
+    if state is None:
+        return
+    vehicle_status, seller_id = state
+    field = VEHICLE_STATUS_COUNTERS.get(vehicle_status)
+    if field and seller_id:
+        deltas[seller_id][field] += sign
+
+
+def _order_contribution(state, sign, deltas):
+    if state is None:
+        return
+    order_status, buyer_id, seller_id, price = state
+    users = {'buyer': buyer_id, 'seller': seller_id}
+    if seller_id:
+        deltas[seller_id]['total_seller_orders'] += sign
+    for role, field in ORDER_STATUS_COUNTERS.get(order_status, ()):
+        if users[role]:
+            deltas[users[role]][field] += sign
+    if order_status == 'completed' and seller_id and price is not None:
+        deltas[seller_id]['sales_revenue'] += sign * Decimal(str(price))
+
+
+def vehicle_deltas(old_state, new_state):
+    """计算车辆从old_state变为new_state时各用户计数的变化量"""
+    deltas = defaultdict(lambda: defaultdict(int))
+    if old_state != new_state:
+        _vehicle_contribution(old_state, -1, deltas)
+        _vehicle_contribution(new_state, 1, deltas)
+    return deltas
+
+
+def order_deltas(old_state, new_state):
+    """计算订单从old_state变为new_state时各用户计数的变化量"""
+    deltas = defaultdict(lambda: defaultdict(int))
+    if old_state != new_state:
+        _order_contribution(old_state, -1, deltas)
+        _order_contribution(new_state, 1, deltas)
+    return deltas
+
+
+def merge_deltas(target, deltas):
+    """将deltas累加到target中"""
+    for user_id, fields in deltas.items():
+        for field, delta in fields.items():
+            target[user_id][field] += delta
+    return target
+
+
+def sync_vehicle_bulk_update(vehicles):
+    """
+    bulk_update不会触发信号，批量修改已加载的车辆后调用，
+    按加载时记录的状态合并所有卖家的计数变化后一次写入
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    unknown_sellers = set()
+    for vehicle in vehicles:
+        old_state = getattr(vehicle, '_counter_state', None)
+        new_state = vehicle_state(vehicle)
+        if old_state is UNKNOWN_STATE:
+            unknown_sellers.add(vehicle.seller_id)
+        else:
+            merge_deltas(deltas, vehicle_deltas(old_state, new_state))
+        vehicle._counter_state = new_state
+
+    with transaction.atomic():
+        apply_deltas(deltas)
+        if unknown_sellers:
+            rebuild_counters([seller_id for seller_id in unknown_sellers if seller_id])
+
+
+def apply_deltas(deltas):
+    """
+    将计数变化量写入数据库
+    使用F表达式原子增减，在调用方事务（或新的事务）内执行
+    """
+    with transaction.atomic():
+        for user_id, fields in deltas.items():
+            changes = {field: F(field) + delta for field, delta in fields.items() if delta}
+            if not changes:
+                continue
+            updated = UserCounter.objects.filter(user_id=user_id).update(
+                updated_at=timezone.now(), **changes
+            )
+            if not updated:
+                # 计数行不存在（老用户），直接全量重算该用户
+                rebuild_counters([user_id])
+
+
+def compute_counters(user_ids=None):
+    """
+    根据车辆和订单表全量计算计数，返回 {user_id: {字段: 值}}
+    每类数据只做一次分组聚合
+    """
+    from vehicles.models import Vehicle
+    from orders.models import Order
+
+    results = defaultdict(lambda: {field: 0 for field in COUNTER_FIELDS})
+
+    vehicles = Vehicle.objects.filter(status__in=VEHICLE_STATUS_COUNTERS.keys())
+    seller_orders = Order.objects.all()
+    buyer_orders = Order.objects.all()
+    if user_ids is not None:
+        vehicles = vehicles.filter(seller_id__in=user_ids)
+        seller_orders = seller_orders.filter(seller_id__in=user_ids)
+        buyer_orders = buyer_orders.filter(buyer_id__in=user_ids)
+
+    for row in vehicles.values('seller_id', 'status').annotate(total=Count('id')):
+        results[row['seller_id']][VEHICLE_STATUS_COUNTERS[row['status']]] = row['total']
+
+    seller_rows = seller_orders.values('seller_id').annotate(
+        pending_seller_orders=Count('id', filter=Q(status='pending_payment')),
+        paid_seller_orders=Count('id', filter=Q(status='paid')),
+        total_seller_orders=Count('id'),
+        cancelled_seller_orders=Count('id', filter=Q(status='cancelled')),
+        total_sales=Count('id', filter=Q(status='completed')),
+        sales_revenue=Sum('price', filter=Q(status='completed')),
+    )
+    for row in seller_rows:
+        counters = results[row.pop('seller_id')]
+        row['sales_revenue'] = row['sales_revenue'] or Decimal('0')
+        counters.update(row)
+
+    buyer_rows = buyer_orders.values('buyer_id').annotate(
+        pending_buyer_orders=Count('id', filter=Q(status='pending_payment')),
+        total_purchases=Count('id', filter=Q(status='completed')),
+    )
+    for row in buyer_rows:
+        results[row.pop('buyer_id')].update(row)
+
+    if user_ids is not None:
+        for user_id in user_ids:
+            results[user_id]  # 无数据的用户也返回全零计数
+    return results
+
+
+def rebuild_counters(user_ids=None):
+    """全量重算并覆盖写入计数行，返回写入的计数对象列表"""
+    computed = compute_counters(user_ids)
+    rows = []
+    with transaction.atomic():
+        for user_id, values in computed.items():
+            counter, _ = UserCounter.objects.update_or_create(user_id=user_id, defaults=values)
+            rows.append(counter)
+        if user_ids is None:
+            # 全量重算时，清零已无任何车辆和订单的用户
+            UserCounter.objects.exclude(user_id__in=list(computed.keys())).update(
+                updated_at=timezone.now(), **{field: 0 for field in COUNTER_FIELDS}
+            )
+    return rows
+
+
+def get_user_counters(user):
+    """读取用户计数行，不存在时即时重算"""
+    try:
+        return UserCounter.objects.get(user=user)
+    except UserCounter.DoesNotExist:
+        return rebuild_counters([user.pk])[0]
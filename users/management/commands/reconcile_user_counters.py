@@ -0,0 +1,57 @@
+"""
+用户计数器对账管理命令
+"""
+
+from django.core.management.base import BaseCommand
+from users.models import UserCounter
+from users.counters import COUNTER_FIELDS, compute_counters, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = '根据车辆和订单表重算用户计数器，报告并修复偏差'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='只对账指定用户ID（可多次指定）',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='只报告偏差，不写入数据库',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        self.stdout.write('开始对账用户计数器..')
+
+        computed = compute_counters(user_ids)
+        stored = UserCounter.objects.all()
+        if user_ids:
+            stored = stored.filter(user_id__in=user_ids)
+        stored = {row['user_id']: row for row in stored.values('user_id', *COUNTER_FIELDS)}
+
+        drifted = 0
+        for user_id in sorted(set(computed) | set(stored)):
+            expected = computed.get(user_id) or {field: 0 for field in COUNTER_FIELDS}
+            actual = stored.get(user_id)
+            if actual is None:
+                diffs = ['计数行缺失']
+            else:
+                diffs = [
+                    f"{field}: {actual[field]} -> {expected[field]}"
+                    for field in COUNTER_FIELDS if actual[field] != expected[field]
+                ]
+            if diffs:
+                drifted += 1
+                self.stdout.write(self.style.WARNING(f"用户 {user_id}: {', '.join(diffs)}"))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"对账完成（未写入）！共 {drifted} 个用户存在偏差"))
+            return
+
+        rebuild_counters(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"对账完成！已修复 {drifted} 个用户的计数"))
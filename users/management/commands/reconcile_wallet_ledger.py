@@ -0,0 +1,53 @@
+"""
+钱包流水对账管理命令
+"""
+
+from django.core.management.base import BaseCommand
+from users.wallet_ledger import reconcile
+
+
+class Command(BaseCommand):
+    help = '按用户流式累加钱包流水，与余额快照和账户余额对账并报告偏差'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='只对账指定用户ID（可多次指定）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批处理的用户数',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='流水迭代的分块大小',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始钱包流水对账..')
+
+        drifted = 0
+        for report in reconcile(options['user_ids'], options['batch_size'], options['chunk_size']):
+            drifted += 1
+            if report['live_balance'] is not None and report['drift']:
+                self.stdout.write(self.style.WARNING(
+                    f"用户 {report['user_id']}: 账户余额 ¥{report['live_balance']}，"
+                    f"流水余额 ¥{report['ledger_balance']}，偏差 ¥{report['drift']}"
+                ))
+            for item in report['snapshot_drifts']:
+                self.stdout.write(self.style.WARNING(
+                    f"用户 {report['user_id']}: 快照#{item['snapshot_id']}（截至交易#{item['last_transaction_id']}）"
+                    f"余额 ¥{item['snapshot_balance']}，流水余额 ¥{item['ledger_balance']}"
+                ))
+
+        if drifted:
+            self.stdout.write(self.style.ERROR(f"对账完成！共 {drifted} 个用户存在偏差"))
+        else:
+            self.stdout.write(self.style.SUCCESS('对账完成！所有账户与流水一致'))
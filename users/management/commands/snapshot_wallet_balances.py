@@ -0,0 +1,46 @@
+"""
+钱包余额快照管理命令
+"""
+
+from django.core.management.base import BaseCommand
+from users.models import UserProfile
+from users.wallet_ledger import take_snapshot
+
+
+class Command(BaseCommand):
+    help = '为用户生成钱包余额快照（建议定时执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='只为指定用户ID生成快照（可多次指定）',
+        )
+        parser.add_argument(
+            '--min-transactions',
+            type=int,
+            default=1,
+            help='距上次快照新增流水少于该笔数时跳过',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始生成钱包余额快照..')
+
+        user_ids = options['user_ids']
+        if not user_ids:
+            user_ids = UserProfile.objects.order_by('user_id').values_list('user_id', flat=True).iterator()
+
+        created_count = 0
+        skipped_count = 0
+        for user_id in user_ids:
+            snapshot = take_snapshot(user_id, min_transactions=options['min_transactions'])
+            if snapshot:
+                created_count += 1
+            else:
+                skipped_count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"快照完成！生成 {created_count} 个快照，跳过 {skipped_count} 个无新流水的用户"
+        ))
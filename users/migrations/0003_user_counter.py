@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-19 01:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_payment_password_wallettransaction_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+                ('listed_vehicles', models.IntegerField(default=0, verbose_name='在售车辆数')),
+                ('pending_review_vehicles', models.IntegerField(default=0, verbose_name='待审核车辆数')),
+                ('sold_vehicles', models.IntegerField(default=0, verbose_name='已售车辆数')),
+                ('pending_buyer_orders', models.IntegerField(default=0, verbose_name='待付款订单数（买家）')),
+                ('pending_seller_orders', models.IntegerField(default=0, verbose_name='待付款订单数（卖家）')),
+                ('paid_seller_orders', models.IntegerField(default=0, verbose_name='已付款订单数（卖家）')),
+                ('total_purchases', models.IntegerField(default=0, verbose_name='总购买数')),
+                ('total_sales', models.IntegerField(default=0, verbose_name='总销售数')),
+                ('sales_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='销售总额')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '用户计数器',
+                'verbose_name_plural': '用户计数器',
+                'db_table': 'user_counters',
+            },
+        ),
+    ]
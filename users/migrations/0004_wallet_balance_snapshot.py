@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-19 01:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_transaction_id', models.BigIntegerField(default=0, verbose_name='截至交易ID')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='流水余额')),
+                ('transaction_count', models.IntegerField(default=0, verbose_name='累计交易笔数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wallet_snapshots', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '钱包余额快照',
+                'verbose_name_plural': '钱包余额快照',
+                'db_table': 'wallet_balance_snapshots',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='walletbalancesnapshot',
+            index=models.Index(fields=['user', '-last_transaction_id'], name='wallet_bala_user_id_8cf125_idx'),
+        ),
+    ]
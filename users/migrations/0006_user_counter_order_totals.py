@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-19 02:33
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    UserCounter = apps.get_model('users', 'UserCounter')
+    rows = Order.objects.values('seller_id').annotate(
+        total=Count('id'), cancelled=Count('id', filter=Q(status='cancelled'))
+    )
+    for row in rows:
+        UserCounter.objects.filter(user_id=row['seller_id']).update(
+            total_seller_orders=row['total'], cancelled_seller_orders=row['cancelled']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_statistics_indexes'),
+        ('orders', '0004_order_statistics_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounter',
+            name='cancelled_seller_orders',
+            field=models.IntegerField(default=0, verbose_name='已取消订单数（卖家）'),
+        ),
+        migrations.AddField(
+            model_name='usercounter',
+            name='total_seller_orders',
+            field=models.IntegerField(default=0, verbose_name='订单总数（卖家）'),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
@@ -6,9 +6,10 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import datetime
+from utils.dirty_fields import DirtyFieldsMixin
 
 
-class User(AbstractUser):
+class User(DirtyFieldsMixin, AbstractUser):
     """
     扩展的用户模型
     """
@@ -81,13 +82,14 @@ class User(AbstractUser):
             models.Index(fields=['email']),
             models.Index(fields=['user_type']),
             models.Index(fields=['account_status']),
+            models.Index(fields=['date_joined']),
         ]
 
     def __str__(self):
         return f"{self.username} ({self.get_user_type_display()})"
 
 
-class UserProfile(models.Model):
+class UserProfile(DirtyFieldsMixin, models.Model):
     """
     用户档案 - 存储额外的用户信息
     """
@@ -120,6 +122,38 @@ class UserProfile(models.Model):
         return f"{self.user.username}的档案"
 
 
+class UserCounter(models.Model):
+    """
+    用户计数器 - 维护车辆和订单的各类数量，由车辆和订单状态变化增量更新
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='counters', verbose_name='用户')
+
+    # 车辆（作为卖家）
+    listed_vehicles = models.IntegerField(default=0, verbose_name='在售车辆数')
+    pending_review_vehicles = models.IntegerField(default=0, verbose_name='待审核车辆数')
+    sold_vehicles = models.IntegerField(default=0, verbose_name='已售车辆数')
+
+    # 订单
+    pending_buyer_orders = models.IntegerField(default=0, verbose_name='待付款订单数（买家）')
+    pending_seller_orders = models.IntegerField(default=0, verbose_name='待付款订单数（卖家）')
+    paid_seller_orders = models.IntegerField(default=0, verbose_name='已付款订单数（卖家）')
+    total_seller_orders = models.IntegerField(default=0, verbose_name='订单总数（卖家）')
+    cancelled_seller_orders = models.IntegerField(default=0, verbose_name='已取消订单数（卖家）')
+    total_purchases = models.IntegerField(default=0, verbose_name='总购买数')
+    total_sales = models.IntegerField(default=0, verbose_name='总销售数')
+    sales_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='销售总额')
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'user_counters'
+        verbose_name = '用户计数器'
+        verbose_name_plural = '用户计数器'
+
+    def __str__(self):
+        return f"{self.user_id}的计数器"
+
+
 class UserAddress(models.Model):
     """
     用户地址 - 收货地址管理
@@ -163,6 +197,7 @@ class UserLoginHistory(models.Model):
         verbose_name_plural = '登录历史'
         indexes = [
             models.Index(fields=['user', '-login_time']),
+            models.Index(fields=['login_time']),
         ]
 
     def __str__(self):
@@ -292,4 +327,27 @@ class WalletTransaction(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.get_transaction_type_display()} - ¥{self.amount}"
\ No newline at end of file
+        return f"{self.user.username} - {self.get_transaction_type_display()} - ¥{self.amount}"
+
+
+class WalletBalanceSnapshot(models.Model):
+    """
+    钱包余额快照
+    记录截至某条交易记录（含）时按流水累计的余额，用于对账和计算历史余额
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wallet_snapshots', verbose_name='用户')
+    last_transaction_id = models.BigIntegerField(default=0, verbose_name='截至交易ID')
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='流水余额')
+    transaction_count = models.IntegerField(default=0, verbose_name='累计交易笔数')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+
+    class Meta:
+        db_table = 'wallet_balance_snapshots'
+        verbose_name = '钱包余额快照'
+        verbose_name_plural = '钱包余额快照'
+        indexes = [
+            models.Index(fields=['user', '-last_transaction_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - 截至#{self.last_transaction_id} ¥{self.balance}"
@@ -0,0 +1,274 @@
+"""
+搜索词统计模块
+异步记录车辆搜索，并用流式数据结构（Count-Min Sketch + Top-K堆）
+维护按时间衰减的热门搜索词和零结果搜索词，无需扫描搜索历史表。
+各进程先在本地统计，定期合并到共享缓存中的统计，多进程部署时热门词包含所有进程的搜索
+（默认的LocMemCache不跨进程共享，需配置Redis/Memcached等共享缓存）
+"""
+import hashlib
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_keyword(keyword):
+    """规范化搜索词：去除首尾空白、合并连续空白并转为小写"""
+    if not keyword:
+        return ''
+    return re.sub(r'\s+', ' ', str(keyword)).strip().lower()[:255]
+
+
+class CountMinSketch:
+    """
+    Count-Min Sketch
+    以固定内存估计任意键的（加权）出现次数，估计值只会偏大不会偏小
+    """
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = [[0.0] * width for _ in range(depth)]
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8 * self.depth).digest()
+        for row in range(self.depth):
+            chunk = digest[row * 8:(row + 1) * 8]
+            yield row, int.from_bytes(chunk, 'little') % self.width
+
+    def add(self, key, weight=1.0):
+        """增加键的计数，返回增加后的估计值"""
+        estimate = None
+        for row, col in self._indexes(key):
+            self.table[row][col] += weight
+            value = self.table[row][col]
+            estimate = value if estimate is None else min(estimate, value)
+        return estimate
+
+    def estimate(self, key):
+        return min(self.table[row][col] for row, col in self._indexes(key))
+
+    def scale(self, factor):
+        """所有计数乘以factor，用于衰减基准重置"""
+        for row in self.table:
+            for col in range(self.width):
+                row[col] *= factor
+
+    def merge(self, other):
+        """按表相加合并另一个同尺寸的Sketch，合并后的估计值等于两者分别计数之和的估计"""
+        for row, other_row in zip(self.table, other.table):
+            for col in range(self.width):
+                row[col] += other_row[col]
+
+
+class DecayedTopK:
+    """
+    按时间指数衰减的热门词统计
+    采用前向衰减：时刻t的一次出现权重为 2^((t - t0) / half_life)，
+    读取时再除以当前时刻的权重，等价于所有历史计数按半衰期衰减
+    """
+
+    # 权重增长到该值时重置基准时间，避免浮点溢出
+    RESCALE_THRESHOLD = 1e12
+
+    def __init__(self, half_life, k=50, width=2048, depth=4):
+        self.half_life = float(half_life)
+        self.k = k
+        self.sketch = CountMinSketch(width=width, depth=depth)
+        self.base_time = time.time()
+        self.top = {}      # 关键词 -> 前向衰减后的估计值
+        self.heap = []     # (估计值, 关键词) 最小堆，允许过期条目，读取时校验
+
+    def _weight(self, now):
+        return math.pow(2.0, (now - self.base_time) / self.half_life)
+
+    def _rescale(self, now):
+        factor = 1.0 / self._weight(now)
+        self.sketch.scale(factor)
+        self.top = {key: value * factor for key, value in self.top.items()}
+        self.heap = [(value, key) for key, value in self.top.items()]
+        heapq.heapify(self.heap)
+        self.base_time = now
+
+    def add(self, key, now=None):
+        now = now or time.time()
+        weight = self._weight(now)
+        if weight > self.RESCALE_THRESHOLD:
+            self._rescale(now)
+            weight = 1.0
+
+        estimate = self.sketch.add(key, weight)
+
+        if key in self.top or len(self.top) < self.k:
+            self.top[key] = estimate
+            heapq.heappush(self.heap, (estimate, key))
+            return
+
+        # 弹出已失效的堆顶条目，找到当前最小的候选
+        while self.heap and self.top.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+        if self.heap and estimate > self.heap[0][0]:
+            _, evicted = heapq.heappop(self.heap)
+            self.top.pop(evicted, None)
+            self.top[key] = estimate
+            heapq.heappush(self.heap, (estimate, key))
+
+        # 堆中过期条目过多时重建
+        if len(self.heap) > self.k * 4:
+            self.heap = [(value, item) for item, value in self.top.items()]
+            heapq.heapify(self.heap)
+
+    def merge(self, other):
+        """
+        合并另一个相同半衰期的统计：先把两者的衰减基准对齐到较晚的一个，再合并Sketch，
+        候选词取两者Top-K的并集，按合并后的估计值保留前k个
+        """
+        base_time = max(self.base_time, other.base_time)
+        for tracker in (self, other):
+            if tracker.base_time < base_time:
+                tracker._rescale(base_time)
+        self.sketch.merge(other.sketch)
+        candidates = set(self.top) | set(other.top)
+        estimates = sorted(
+            ((self.sketch.estimate(key), key) for key in candidates), reverse=True
+        )[:self.k]
+        self.top = {key: value for value, key in estimates}
+        self.heap = [(value, key) for key, value in self.top.items()]
+        heapq.heapify(self.heap)
+
+    def most_common(self, limit=None, now=None):
+        """返回衰减后得分最高的关键词列表 [(关键词, 得分)]"""
+        now = now or time.time()
+        weight = self._weight(now)
+        items = sorted(self.top.items(), key=lambda item: item[1], reverse=True)
+        if limit:
+            items = items[:limit]
+        return [(key, round(value / weight, 3)) for key, value in items]
+
+
+class SearchTrendTracker:
+    """
+    搜索趋势统计器
+    每个时间窗口各维护一组全部搜索词与零结果搜索词的衰减Top-K。
+    新的搜索先记入本进程的统计，每隔flush_interval秒（或读取报告时）合并到共享缓存中的统计后清空；
+    合并时用cache.add加锁，其他进程正在合并时跳过，本地统计留到下次合并
+    """
+
+    STATE_KEY = 'search_trends:state'
+    LOCK_KEY = 'search_trends:lock'
+    LOCK_TIMEOUT = 30
+
+    def __init__(self, windows, k=50, flush_interval=10):
+        self.windows = dict(windows)
+        self.k = k
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = self._empty()
+        self.pending_count = 0
+        self.flushed_at = time.monotonic()
+
+    def _empty(self):
+        return {
+            kind: {name: DecayedTopK(half_life, k=self.k) for name, half_life in self.windows.items()}
+            for kind in ('trending', 'zero_result')
+        }
+
+    def record(self, keyword, result_count, now=None):
+        now = now or time.time()
+        with self.lock:
+            for name in self.windows:
+                self.pending['trending'][name].add(keyword, now)
+                if result_count == 0:
+                    self.pending['zero_result'][name].add(keyword, now)
+            self.pending_count += 1
+            due = time.monotonic() - self.flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """将本进程的统计合并到共享统计，返回是否完成合并"""
+        if not self.pending_count:
+            return True
+        if not cache.add(self.LOCK_KEY, 1, self.LOCK_TIMEOUT):
+            return False
+        try:
+            with self.lock:
+                pending, self.pending = self.pending, self._empty()
+                self.pending_count = 0
+                self.flushed_at = time.monotonic()
+            state = cache.get(self.STATE_KEY) or self._empty()
+            for kind, trackers in pending.items():
+                for name, tracker in trackers.items():
+                    if name in state[kind]:
+                        state[kind][name].merge(tracker)
+                    else:
+                        state[kind][name] = tracker
+            cache.set(self.STATE_KEY, state, None)
+        finally:
+            cache.delete(self.LOCK_KEY)
+        return True
+
+    def _report(self, kind, window, limit):
+        if window not in self.windows:
+            raise ValueError(f'不支持的时间窗口: {window}')
+        self.flush()
+        state = cache.get(self.STATE_KEY)
+        if not state or window not in state[kind]:
+            return []
+        items = state[kind][window].most_common(limit)
+        return [{'keyword': keyword, 'score': score} for keyword, score in items]
+
+    def top_searches(self, window, limit=10):
+        return self._report('trending', window, limit)
+
+    def top_zero_result_searches(self, window, limit=10):
+        return self._report('zero_result', window, limit)
+
+
+search_trends = SearchTrendTracker(
+    windows=getattr(settings, 'SEARCH_TRENDS_WINDOWS', {'hour': 3600, 'day': 86400}),
+    k=getattr(settings, 'SEARCH_TRENDS_TOP_K', 50),
+    flush_interval=getattr(settings, 'SEARCH_TRENDS_FLUSH_INTERVAL', 10),
+)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search-log')
+
+
+def _persist_search(user_id, keyword, search_params, result_count):
+    from .models import UserSearchHistory
+
+    try:
+        search_trends.record(keyword, result_count)
+        if user_id:
+            UserSearchHistory.objects.create(
+                user_id=user_id,
+                keyword=keyword,
+                search_params=search_params,
+                result_count=result_count,
+            )
+    except Exception as e:
+        logger.error(f"记录搜索历史失败: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def record_search(user, keyword, search_params, result_count):
+    """
+    异步记录一次搜索
+    搜索历史只为登录用户落库，热门词统计包含匿名搜索
+    """
+    keyword = normalize_keyword(keyword)
+    if not keyword:
+        return
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    _executor.submit(_persist_search, user_id, keyword, dict(search_params), int(result_count))
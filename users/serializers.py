@@ -385,11 +385,19 @@ class WalletTransactionSerializer(serializers.ModelSerializer):
     """
     钱包交易记录序列化器
     """
+    balance_after = serializers.SerializerMethodField()
+
     class Meta:
         model = WalletTransaction
-        fields = ('id', 'amount', 'transaction_type', 'payment_method', 'status', 'description', 'order_number', 'created_at')
+        fields = ('id', 'amount', 'transaction_type', 'payment_method', 'status', 'description', 'order_number',
+                  'balance_after', 'created_at')
         read_only_fields = ('id', 'created_at')
 
+    def get_balance_after(self, obj):
+        """交易后余额（由视图通过context传入的流水余额）"""
+        balance = self.context.get('running_balances', {}).get(obj.id)
+        return float(balance) if balance is not None else None
+
 
 class WalletInfoSerializer(serializers.Serializer):
     """
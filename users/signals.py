@@ -1,9 +1,10 @@
 """
 用户相关信号处理器
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_init, post_delete
 from django.dispatch import receiver
-from .models import User, UserProfile
+from .models import User, UserProfile, UserCounter
+from . import counters
 
 
 @receiver(post_save, sender=User)
@@ -13,15 +14,80 @@ def create_user_profile(sender, instance, created, **kwargs):
     """
     if created:
         UserProfile.objects.create(user=instance)
+        UserCounter.objects.create(user=instance)
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, created, update_fields=None, **kwargs):
     """
-    保存用户时,确保UserProfile也被保存
+    保存用户时,同步保存已加载的UserProfile（无改动时由脏字段跟踪跳过）
     """
-    # 如果UserProfile不存在,创建一个
-    if not hasattr(instance, 'profile'):
-        UserProfile.objects.create(user=instance)
-    else:
+    if created:
+        return
+    if User.profile.is_cached(instance):
         instance.profile.save()
+    elif update_fields is None:
+        # 完整保存时确保UserProfile存在；只更新部分字段（如登录计数）时不再查询档案
+        UserProfile.objects.get_or_create(user=instance)
+
+
+def _snapshot(instance, fields, state_func):
+    """记录实例加载时的计数相关状态；字段被延迟加载时记为未知"""
+    if not instance.pk:
+        return None
+    if instance.get_deferred_fields() & set(fields):
+        return counters.UNKNOWN_STATE
+    return state_func(instance)
+
+
+def _sync_counters(instance, old_state, new_state, deltas_func, user_ids):
+    if old_state is counters.UNKNOWN_STATE:
+        # 无法得知旧状态，直接重算相关用户
+        counters.rebuild_counters([user_id for user_id in user_ids if user_id])
+    else:
+        deltas = deltas_func(old_state, new_state)
+        if deltas:
+            counters.apply_deltas(deltas)
+    instance._counter_state = new_state
+
+
+@receiver(post_init, sender='vehicles.Vehicle')
+def remember_vehicle_state(sender, instance, **kwargs):
+    """记录车辆加载时的状态，用于保存时计算计数变化"""
+    instance._counter_state = _snapshot(instance, ('status', 'seller_id'), counters.vehicle_state)
+
+
+@receiver(post_save, sender='vehicles.Vehicle')
+def update_vehicle_counters(sender, instance, created, **kwargs):
+    """车辆状态变化时更新卖家计数"""
+    old_state = None if created else getattr(instance, '_counter_state', None)
+    _sync_counters(instance, old_state, counters.vehicle_state(instance),
+                   counters.vehicle_deltas, [instance.seller_id])
+
+
+@receiver(post_delete, sender='vehicles.Vehicle')
+def release_vehicle_counters(sender, instance, **kwargs):
+    _sync_counters(instance, getattr(instance, '_counter_state', None), None,
+                   counters.vehicle_deltas, [instance.seller_id])
+
+
+@receiver(post_init, sender='orders.Order')
+def remember_order_state(sender, instance, **kwargs):
+    """记录订单加载时的状态，用于保存时计算计数变化"""
+    instance._counter_state = _snapshot(
+        instance, ('status', 'buyer_id', 'seller_id', 'price'), counters.order_state
+    )
+
+
+@receiver(post_save, sender='orders.Order')
+def update_order_counters(sender, instance, created, **kwargs):
+    """订单状态变化时更新买卖双方计数"""
+    old_state = None if created else getattr(instance, '_counter_state', None)
+    _sync_counters(instance, old_state, counters.order_state(instance),
+                   counters.order_deltas, [instance.buyer_id, instance.seller_id])
+
+
+@receiver(post_delete, sender='orders.Order')
+def release_order_counters(sender, instance, **kwargs):
+    _sync_counters(instance, getattr(instance, '_counter_state', None), None,
+                   counters.order_deltas, [instance.buyer_id, instance.seller_id])
@@ -0,0 +1,71 @@
+"""
+用户模块测试
+"""
+from django.db.models.signals import post_save
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import User, UserLoginHistory, UserProfile
+
+
+class LoginQueryTests(TestCase):
+    """登录只查询用户、写登录历史和登录计数，不读写用户档案"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer01', email='buyer01@example.com', password='Passw0rd!123')
+        self.client = APIClient()
+
+    def test_login_query_count(self):
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                '/api/users/login/', {'username': 'buyer01', 'password': 'Passw0rd!123'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.login_count, 1)
+        self.assertTrue(UserLoginHistory.objects.filter(user=self.user, success=True).exists())
+
+    def test_login_by_email(self):
+        response = self.client.post(
+            '/api/users/login/', {'username': 'buyer01@example.com', 'password': 'Passw0rd!123'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class DirtyFieldsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='seller01', password='Passw0rd!123')
+
+    def test_clean_save_skips_write_and_sends_post_save(self):
+        user = User.objects.get(pk=self.user.pk)
+        received = []
+
+        def handler(sender, instance, created, update_fields, **kwargs):
+            received.append((instance.pk, created, update_fields))
+
+        post_save.connect(handler, sender=User)
+        try:
+            with self.assertNumQueries(0):
+                user.save()
+        finally:
+            post_save.disconnect(handler, sender=User)
+        self.assertEqual(received, [(user.pk, False, frozenset())])
+
+    def test_dirty_save_updates_changed_fields(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertFalse(user.is_dirty())
+        user.nickname = 'new nickname'
+        self.assertEqual(user.get_dirty_fields(), {'nickname'})
+
+        with self.assertNumQueries(1):
+            user.save()
+        self.assertFalse(user.is_dirty())
+        self.assertEqual(User.objects.get(pk=user.pk).nickname, 'new nickname')
+
+    def test_profile_save_without_changes(self):
+        profile = UserProfile.objects.get(user=self.user)
+        with self.assertNumQueries(0):
+            profile.save()
@@ -17,6 +17,8 @@ from django.utils import timezone
 import logging
 
 from .models import User, UserProfile, UserAddress, UserLoginHistory, UserOperationLog, UserBrowsingHistory, WalletTransaction
+from .counters import get_user_counters
+from .wallet_ledger import annotate_running_balances
 from .serializers import (
     UserRegistrationSerializer,
     CustomTokenObtainPairSerializer,
@@ -265,17 +267,19 @@ class UserStatsView(APIView):
     def get(self, request):
         user = request.user
         profile = user.profile
+        counters = get_user_counters(user)
 
         stats = {
-            'total_purchases': profile.total_purchases,
-            'total_sales': profile.total_sales,
+            'total_purchases': counters.total_purchases,
+            'total_sales': counters.total_sales,
             'average_rating': profile.average_rating,
             'total_reviews': profile.total_reviews,
             'balance': float(profile.balance),
-            'published_vehicles': user.vehicles.filter(status='listed').count(),
-            'sold_vehicles': user.vehicles.filter(status='sold').count(),
-            'pending_orders': user.orders_as_seller.filter(status='pending_payment').count() | \
-                           user.orders_as_buyer.filter(status='pending_payment').count(),
+            'published_vehicles': counters.listed_vehicles,
+            'sold_vehicles': counters.sold_vehicles,
+            'pending_buyer_orders': counters.pending_buyer_orders,
+            'pending_seller_orders': counters.pending_seller_orders,
+            'pending_orders': counters.pending_seller_orders + counters.pending_buyer_orders,
         }
 
         return Response(stats)
@@ -657,15 +661,19 @@ class WalletTransactionListView(APIView):
             page_size = 20
 
         # 获取交易记录
-        queryset = WalletTransaction.objects.filter(user=user).order_by('-created_at')
+        queryset = WalletTransaction.objects.filter(user=user).order_by('-created_at', '-id')
         total = queryset.count()
 
         # 分页
         start = (page - 1) * page_size
         end = start + page_size
-        transactions = queryset[start:end]
+        transactions = list(queryset[start:end])
 
-        serializer = WalletTransactionSerializer(transactions, many=True)
+        # 基于最近的余额快照计算本页每笔交易后的余额
+        running_balances = annotate_running_balances(user.id, transactions)
+        serializer = WalletTransactionSerializer(
+            transactions, many=True, context={'running_balances': running_balances}
+        )
 
         return Response(
             {
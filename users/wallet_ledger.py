@@ -0,0 +1,180 @@
+"""
+钱包流水账本
+基于 WalletTransaction 流水计算余额，生成余额快照，并与 UserProfile.balance 对账
+"""
+import logging
+from decimal import Decimal
+
+from django.db.models import Case, F, Sum, When, DecimalField
+
+from .models import UserProfile, WalletTransaction, WalletBalanceSnapshot
+
+logger = logging.getLogger(__name__)
+
+# 减少余额的交易类型，其余成功交易均增加余额
+DEBIT_TYPES = ('purchase',)
+
+ZERO = Decimal('0.00')
+
+
+def signed_amount(transaction_type, amount):
+    """交易对余额的影响（带符号金额）"""
+    return -amount if transaction_type in DEBIT_TYPES else amount
+
+
+def signed_amount_expression():
+    return Case(
+        When(transaction_type__in=DEBIT_TYPES, then=-F('amount')),
+        default=F('amount'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def ledger_transactions(user_id):
+    """计入余额的流水（仅成功交易）"""
+    return WalletTransaction.objects.filter(user_id=user_id, status='success')
+
+
+def latest_snapshot(user_id, before_transaction_id=None):
+    """获取用户最近的快照；指定before_transaction_id时只取截至该交易之前的快照"""
+    queryset = WalletBalanceSnapshot.objects.filter(user_id=user_id)
+    if before_transaction_id is not None:
+        queryset = queryset.filter(last_transaction_id__lt=before_transaction_id)
+    return queryset.order_by('-last_transaction_id').first()
+
+
+def balance_before(user_id, transaction_id):
+    """
+    计算某笔交易之前的流水余额
+    从最近的快照开始只累加快照之后的流水，避免扫描全部历史
+    """
+    snapshot = latest_snapshot(user_id, before_transaction_id=transaction_id)
+    start_id = snapshot.last_transaction_id if snapshot else 0
+    base = snapshot.balance if snapshot else ZERO
+
+    delta = ledger_transactions(user_id).filter(
+        id__gt=start_id, id__lt=transaction_id
+    ).aggregate(total=Sum(signed_amount_expression()))['total']
+    return base + (delta or ZERO)
+
+
+def annotate_running_balances(user_id, transactions):
+    """
+    为一页交易记录计算每笔交易后的余额
+    返回 {交易ID: 交易后余额}，失败或待处理的交易不影响余额
+    """
+    transactions = sorted(transactions, key=lambda item: item.id)
+    if not transactions:
+        return {}
+
+    balance = balance_before(user_id, transactions[0].id)
+    running = {}
+    for item in transactions:
+        if item.status == 'success':
+            balance += signed_amount(item.transaction_type, item.amount)
+        running[item.id] = balance
+    return running
+
+
+def take_snapshot(user_id, min_transactions=1):
+    """
+    为用户生成新的余额快照
+    从上一个快照开始按ID顺序流式累加新流水；新流水少于min_transactions时跳过
+    """
+    snapshot = latest_snapshot(user_id)
+    balance = snapshot.balance if snapshot else ZERO
+    count = snapshot.transaction_count if snapshot else 0
+    last_id = snapshot.last_transaction_id if snapshot else 0
+
+    new_count = 0
+    rows = ledger_transactions(user_id).filter(id__gt=last_id).order_by('id').values_list(
+        'id', 'transaction_type', 'amount'
+    )
+    for transaction_id, transaction_type, amount in rows.iterator(chunk_size=2000):
+        balance += signed_amount(transaction_type, amount)
+        last_id = transaction_id
+        new_count += 1
+
+    if new_count < min_transactions:
+        return None
+
+    return WalletBalanceSnapshot.objects.create(
+        user_id=user_id,
+        last_transaction_id=last_id,
+        balance=balance,
+        transaction_count=count + new_count,
+    )
+
+
+def _user_batches(user_ids, batch_size):
+    if user_ids is not None:
+        user_ids = sorted(user_ids)
+        for start in range(0, len(user_ids), batch_size):
+            yield user_ids[start:start + batch_size]
+        return
+
+    last_user_id = 0
+    while True:
+        batch = list(
+            UserProfile.objects.filter(user_id__gt=last_user_id)
+            .order_by('user_id').values_list('user_id', flat=True)[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_user_id = batch[-1]
+
+
+def reconcile(user_ids=None, batch_size=500, chunk_size=2000):
+    """
+    流式对账
+    按用户分批读取快照和流水（按 user_id, id 排序分块迭代），
+    逐笔累加流水余额并与各快照、当前账户余额比较，产出存在偏差的用户报告
+    """
+    for batch in _user_batches(user_ids, batch_size):
+        live_balances = dict(
+            UserProfile.objects.filter(user_id__in=batch).values_list('user_id', 'balance')
+        )
+        snapshots = {}
+        for snapshot in WalletBalanceSnapshot.objects.filter(user_id__in=batch).order_by('user_id', 'last_transaction_id'):
+            snapshots.setdefault(snapshot.user_id, []).append(snapshot)
+
+        ledger = {user_id: ZERO for user_id in batch}
+        pending_snapshots = {user_id: list(items) for user_id, items in snapshots.items()}
+        snapshot_drifts = {}
+
+        def check_snapshots(user_id, up_to_id):
+            # 校验所有截至up_to_id之前的快照
+            queue = pending_snapshots.get(user_id)
+            while queue and queue[0].last_transaction_id < up_to_id:
+                snapshot = queue.pop(0)
+                if snapshot.balance != ledger[user_id]:
+                    snapshot_drifts.setdefault(user_id, []).append({
+                        'snapshot_id': snapshot.id,
+                        'last_transaction_id': snapshot.last_transaction_id,
+                        'snapshot_balance': snapshot.balance,
+                        'ledger_balance': ledger[user_id],
+                    })
+
+        rows = WalletTransaction.objects.filter(
+            user_id__in=batch, status='success'
+        ).order_by('user_id', 'id').values_list('user_id', 'id', 'transaction_type', 'amount')
+
+        for user_id, transaction_id, transaction_type, amount in rows.iterator(chunk_size=chunk_size):
+            check_snapshots(user_id, transaction_id)
+            ledger[user_id] += signed_amount(transaction_type, amount)
+
+        for user_id in batch:
+            check_snapshots(user_id, float('inf'))
+            live = live_balances.get(user_id)
+            live_drift = live is not None and live != ledger[user_id]
+            if live_drift or user_id in snapshot_drifts:
+                report = {
+                    'user_id': user_id,
+                    'ledger_balance': ledger[user_id],
+                    'live_balance': live,
+                    'drift': (live - ledger[user_id]) if live is not None else None,
+                    'snapshot_drifts': snapshot_drifts.get(user_id, []),
+                }
+                logger.warning(f"钱包对账偏差: {report}")
+                yield report
@@ -0,0 +1,104 @@
+"""
+模型脏字段跟踪
+记录从数据库加载（或上次保存）时的字段值，保存时只写入发生变化的列，
+没有任何变化时跳过写入（只发送post_save信号，不发送pre_save）
+"""
+
+import copy
+
+from django.db import router
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_save
+
+
+class DirtyFieldsMixin:
+    """
+    为模型增加脏字段跟踪的Mixin，需放在模型基类之前：
+        class UserProfile(DirtyFieldsMixin, models.Model)
+    """
+
+    @staticmethod
+    def _dirty_value(value):
+        if isinstance(value, FieldFile):
+            return value.name
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
+        return value
+
+    def _tracked_fields(self):
+        deferred = self.get_deferred_fields()
+        return [
+            field for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred
+        ]
+
+    def _reset_dirty_state(self, fields=None):
+        """以当前值作为新的基准；fields为None时重置全部已加载字段"""
+        state = getattr(self, '_original_state', None)
+        if fields is None or state is None:
+            state = {}
+        for field in self._tracked_fields():
+            if fields is None or field.name in fields or field.attname in fields:
+                state[field.attname] = self._dirty_value(getattr(self, field.attname))
+        self._original_state = state
+
+    def get_dirty_fields(self):
+        """返回自加载或上次保存以来发生变化的字段名集合"""
+        state = getattr(self, '_original_state', None)
+        if state is None:
+            return {field.name for field in self._tracked_fields()}
+        dirty = set()
+        for field in self._tracked_fields():
+            if field.attname not in state:
+                # 加载时被延迟、之后才赋值的字段
+                if field.attname in self.__dict__:
+                    dirty.add(field.name)
+                continue
+            if self._dirty_value(getattr(self, field.attname)) != state[field.attname]:
+                dirty.add(field.name)
+        return dirty
+
+    def is_dirty(self):
+        return bool(self.get_dirty_fields())
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._reset_dirty_state()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._reset_dirty_state(fields)
+
+    def save(self, *args, **kwargs):
+        # 统一为关键字参数，便于判断update_fields
+        kwargs.update(zip(('force_insert', 'force_update', 'using', 'update_fields'), args))
+        is_update = (
+            not self._state.adding
+            and getattr(self, '_original_state', None) is not None
+            and not kwargs.get('force_insert')
+        )
+
+        if is_update and kwargs.get('update_fields') is None:
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                # 不写数据库，但仍发送post_save（update_fields为空集合），保证依赖保存信号的处理器照常执行
+                post_save.send(
+                    sender=self.__class__,
+                    instance=self,
+                    created=False,
+                    update_fields=frozenset(),
+                    raw=False,
+                    using=kwargs.get('using') or router.db_for_write(self.__class__, instance=self),
+                )
+                return
+            # auto_now字段（如updated_at）随改动一起更新
+            dirty.update(
+                field.name for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+            )
+            kwargs['update_fields'] = dirty
+
+        super().save(**kwargs)
+        self._reset_dirty_state(kwargs.get('update_fields'))
@@ -0,0 +1,305 @@
+"""
+日志归档
+将超过保留期的日志行按自然日写入 gzip 压缩的 JSONL 分片文件（每个分片附带一个小索引），
+随后分批删除已归档的行；查询时先查热表，再按日期倒序扫描归档分片，
+通过 (时间, ID) 游标翻页，避免 OFFSET 和 COUNT
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _json_default(value):
+    # 时间保留完整的微秒精度，保证游标在热表和归档之间一致
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def parse_time_bound(value, is_end=False):
+    """
+    解析查询参数中的时间边界，支持日期或日期时间；
+    作为结束边界的纯日期包含当天（返回次日零点）。格式错误时抛出ValueError
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        if is_end:
+            day += timedelta(days=1)
+        moment = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def encode_cursor(moment, row_id):
+    """(时间, ID) -> 游标字符串"""
+    microseconds = (moment - EPOCH) // timedelta(microseconds=1)
+    return f'{microseconds}-{row_id}'
+
+
+def decode_cursor(cursor):
+    """游标字符串 -> (时间, ID)，格式错误时抛出ValueError"""
+    microseconds, _, row_id = cursor.partition('-')
+    return EPOCH + timedelta(microseconds=int(microseconds)), int(row_id)
+
+
+class LogArchive:
+    """
+    单个日志表的归档与查询
+    index_fields 为可过滤的字段（attname），分片索引中记录这些字段出现过的取值，
+    查询时据此跳过不包含目标取值的分片
+    """
+
+    def __init__(self, name, model, time_field, index_fields=()):
+        self.name = name
+        self.model = model
+        self.time_field = time_field
+        self.index_fields = tuple(index_fields)
+        self.fields = [field.attname for field in model._meta.concrete_fields]
+        self.root = Path(settings.LOG_ARCHIVE_ROOT) / name
+
+    # ---------- 分片文件 ----------
+
+    def shard_path(self, day):
+        return self.root / f'{day:%Y}' / f'{day:%m}' / f'{day.isoformat()}.jsonl.gz'
+
+    def index_path(self, day):
+        return self.root / f'{day:%Y}' / f'{day:%m}' / f'{day.isoformat()}.index.json'
+
+    def load_index(self, day):
+        path = self.index_path(day)
+        if not path.exists():
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def archived_days(self):
+        """所有存在分片的日期（升序）"""
+        days = []
+        for path in self.root.glob('*/*/*.jsonl.gz'):
+            try:
+                days.append(datetime.strptime(path.name[:10], '%Y-%m-%d').date())
+            except ValueError:
+                continue
+        return sorted(days)
+
+    def read_shard(self, day):
+        """读取分片中的全部记录，时间字段解析为datetime"""
+        path = self.shard_path(day)
+        if not path.exists():
+            return []
+        records = []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    record[self.time_field] = parse_datetime(record[self.time_field])
+                    records.append(record)
+        return records
+
+    def _append(self, day, rows):
+        """
+        追加一批记录到分片并更新索引
+        ID不大于索引中max_id的记录已在中断的上一次运行中写入，跳过以免重复
+        """
+        index = self.load_index(day) or {
+            'count': 0, 'min_id': None, 'max_id': 0, 'start': None, 'end': None,
+            'values': {field: [] for field in self.index_fields},
+        }
+        rows = [row for row in rows if row['id'] > index['max_id']]
+        if not rows:
+            return 0
+
+        path = self.shard_path(day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # gzip支持多成员拼接，追加写入一个新的成员即可
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=_json_default, ensure_ascii=False).encode('utf-8'))
+                    f.write(b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        times = [row[self.time_field].isoformat() for row in rows]
+        index['count'] += len(rows)
+        index['min_id'] = min(filter(None, [index['min_id'], rows[0]['id']]))
+        index['max_id'] = max(index['max_id'], rows[-1]['id'])
+        index['start'] = min(filter(None, [index['start'], min(times)]))
+        index['end'] = max(filter(None, [index['end'], max(times)]))
+        for field in self.index_fields:
+            values = set(index['values'].get(field, []))
+            values.update(str(row[field]) for row in rows if row[field] is not None)
+            index['values'][field] = sorted(values)
+
+        tmp_path = self.index_path(day).with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path(day))
+        return len(rows)
+
+    # ---------- 归档 ----------
+
+    def archive(self, cutoff, batch_size=1000, dry_run=False):
+        """
+        将时间早于cutoff的行写入归档并分批删除，返回归档行数
+        按主键顺序分批读取，每批先写入并落盘归档文件，再按ID删除该批行
+        """
+        queryset = self.model.objects.filter(**{f'{self.time_field}__lt': cutoff})
+        if dry_run:
+            return queryset.count()
+
+        total = 0
+        last_id = 0
+        while True:
+            rows = list(
+                queryset.filter(id__gt=last_id).order_by('id').values(*self.fields)[:batch_size]
+            )
+            if not rows:
+                return total
+
+            by_day = {}
+            for row in rows:
+                by_day.setdefault(timezone.localdate(row[self.time_field]), []).append(row)
+            for day, day_rows in sorted(by_day.items()):
+                self._append(day, day_rows)
+
+            self.model.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            total += len(rows)
+            last_id = rows[-1]['id']
+            logger.info(f"日志归档[{self.name}]: 已归档 {total} 行")
+
+    # ---------- 查询 ----------
+
+    def _matches(self, record, filters, start, end, before):
+        for field, value in filters.items():
+            if str(record.get(field)) != str(value):
+                return False
+        moment = record[self.time_field]
+        if start and moment < start:
+            return False
+        if end and moment >= end:
+            return False
+        if before and (moment, record['id']) >= before:
+            return False
+        return True
+
+    def _shard_may_match(self, index, filters):
+        if index is None:
+            return True
+        for field, value in filters.items():
+            if field in index['values'] and str(value) not in index['values'][field]:
+                return False
+        return True
+
+    def search(self, filters=None, start=None, end=None, limit=20, cursor=None):
+        """
+        按过滤条件和时间范围[start, end)查询热表与归档，按时间倒序返回 (记录列表, 下一页游标)
+        filters 的键为字段attname（如 admin_id、operation_type）
+        """
+        filters = {field: value for field, value in (filters or {}).items() if value not in (None, '')}
+        before = decode_cursor(cursor) if cursor else None
+
+        queryset = self.model.objects.filter(**filters)
+        if start:
+            queryset = queryset.filter(**{f'{self.time_field}__gte': start})
+        if end:
+            queryset = queryset.filter(**{f'{self.time_field}__lt': end})
+        if before:
+            moment, row_id = before
+            queryset = queryset.filter(
+                Q(**{f'{self.time_field}__lt': moment}) | Q(**{self.time_field: moment, 'id__lt': row_id})
+            )
+        records = list(
+            queryset.order_by(f'-{self.time_field}', '-id').values(*self.fields)[:limit + 1]
+        )
+
+        if len(records) <= limit:
+            seen = {record['id'] for record in records}
+            first_day = timezone.localdate(start) if start else None
+            upper_bounds = [moment for moment in (end, before[0] if before else None) if moment]
+            last_day = timezone.localdate(min(upper_bounds)) if upper_bounds else None
+            for day in reversed(self.archived_days()):
+                if len(records) > limit:
+                    break
+                if (last_day and day > last_day) or (first_day and day < first_day):
+                    continue
+                if not self._shard_may_match(self.load_index(day), filters):
+                    continue
+                matched = [
+                    record for record in self.read_shard(day)
+                    if record['id'] not in seen and self._matches(record, filters, start, end, before)
+                ]
+                matched.sort(key=lambda record: (record[self.time_field], record['id']), reverse=True)
+                records.extend(matched[:limit + 1 - len(records)])
+
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            last = records[-1]
+            next_cursor = encode_cursor(last[self.time_field], last['id'])
+        return records, next_cursor
+
+    def search_params(self, params):
+        """
+        从查询参数中提取过滤条件和时间范围：外键字段使用去掉_id的参数名（如 admin、user），
+        start/end 为时间范围，cursor 为翻页游标
+        """
+        filters = {}
+        for field in self.index_fields:
+            key = field[:-3] if field.endswith('_id') else field
+            filters[field] = params.get(key)
+        return {
+            'filters': filters,
+            'start': parse_time_bound(params.get('start')),
+            'end': parse_time_bound(params.get('end'), is_end=True),
+            'cursor': params.get('cursor') or None,
+        }
+
+    def to_instances(self, records):
+        """将记录转换为（未保存的）模型实例，便于复用模型序列化器"""
+        return [self.model(**record) for record in records]
+
+
+def get_archive(name):
+    """根据 LOG_ARCHIVE_MODELS 配置获取归档对象"""
+    config = settings.LOG_ARCHIVE_MODELS.get(name)
+    if config is None:
+        raise ImproperlyConfigured(f'未配置的日志归档: {name}')
+    return LogArchive(
+        name,
+        apps.get_model(config['model']),
+        config['time_field'],
+        config.get('index_fields', ()),
+    )
+
+
+def available_archives():
+    """已安装应用中可归档的日志名称"""
+    names = []
+    for name, config in settings.LOG_ARCHIVE_MODELS.items():
+        try:
+            apps.get_model(config['model'])
+        except LookupError:
+            continue
+        names.append(name)
+    return names
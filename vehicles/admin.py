@@ -11,7 +11,8 @@ class CarTypeAdmin(admin.ModelAdmin):
 
 @admin.register(Vehicle)
 class VehicleAdmin(admin.ModelAdmin):
-    list_display = ('vin', 'model_name', 'price', 'status')
+    list_display = ('vin', 'model_name', 'price', 'status', 'review_status', 'is_suspected_duplicate')
+    list_filter = ('review_status', 'is_suspected_duplicate')
 
 admin.site.register(VehiclePhoto)
 admin.site.register(VehiclePrice)
@@ -3,3 +3,5 @@ class VehiclesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'vehicles'
 
+    def ready(self):
+        import vehicles.signals  # noqa
@@ -0,0 +1,257 @@
+"""
+车况描述分析
+车辆创建或描述修改后在后台线程中分析描述：先用本地关键词和正则规则提取事故情况、车主数、保养记录和配置，
+可选再调用AI生成分析摘要；结果保存在车辆上（description_analysis，事故情况和车主数另存为带索引的字段），
+提取出的标签合并进亮点标签。详情页和列表筛选直接读取保存的结果
+"""
+import hashlib
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .tags import sync_vehicle_tags
+
+logger = logging.getLogger(__name__)
+
+# 规则变化时递增，旧版本的结果会在下次回填时重新分析
+ANALYSIS_VERSION = 1
+
+# 匹配位置之前同一分句内出现这些词时视为否定（如“无重大事故”“没有泡水”）
+NEGATION_RE = re.compile(r'(无|没有|没出过|未|非|不是|从未|零|\bno\b|\bnever\b)[^，。,.;；!！\s]{0,2}$', re.IGNORECASE)
+
+NO_ACCIDENT_RE = re.compile(
+    r'(无|没有|没出过|未出过|从未出过|零)(任何)?(重大)?(事故|碰撞)|非事故车|no\s+accidents?|accident[- ]free',
+    re.IGNORECASE,
+)
+MAJOR_ACCIDENT_RULES = (
+    ('泡水车', re.compile(r'泡水|水泡|涉水受损|flood', re.IGNORECASE)),
+    ('火烧车', re.compile(r'火烧|过火|fire damage', re.IGNORECASE)),
+    ('重大事故', re.compile(
+        r'重大事故|大事故|结构件|大梁|纵梁|气囊(弹出|更换|爆)|salvage|frame damage|major accident', re.IGNORECASE
+    )),
+)
+MINOR_ACCIDENT_RE = re.compile(
+    r'剐蹭|刮擦|刮蹭|钣金|补漆|喷漆|小事故|轻微(事故|碰撞)|追尾|minor accident|scratch', re.IGNORECASE
+)
+ACCIDENT_TAGS = {'none': '无事故', 'minor': '轻微事故'}
+
+CHINESE_NUMBERS = {'零': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+FIRST_OWNER_RE = re.compile(r'个人一手|一手车|原车主|首任车主|one[- ]owner|single owner|first owner', re.IGNORECASE)
+OWNER_COUNT_RE = re.compile(r'([一二两三四五六七八九\d])手车|(\d+)\s*owners', re.IGNORECASE)
+TRANSFER_COUNT_RE = re.compile(r'过户\s*([零一二两三四五六七八九\d])\s*次')
+
+MAINTENANCE_RULES = (
+    ('4S店保养', re.compile(r'4s店?[^，。,.;；\s]{0,4}(保养|维护|维修)|全程4s|dealer serviced', re.IGNORECASE)),
+    ('保养记录齐全', re.compile(
+        r'保养记录(齐全|完整|可查)|定期保养|按时保养|full service history|service records?|regularly serviced',
+        re.IGNORECASE,
+    )),
+    ('原版原漆', re.compile(r'原版原漆|原车漆|原漆|original paint', re.IGNORECASE)),
+    ('原厂质保', re.compile(r'原厂质保|质保期内|在保|under warranty', re.IGNORECASE)),
+)
+OPTION_RULES = (
+    ('全景天窗', re.compile(r'全景天窗|panoramic (sun|moon)roof', re.IGNORECASE)),
+    ('天窗', re.compile(r'(?<!全景)天窗|(?<!panoramic )(sun|moon)roof', re.IGNORECASE)),
+    ('真皮座椅', re.compile(r'真皮座椅|皮质座椅|leather seats?', re.IGNORECASE)),
+    ('座椅加热', re.compile(r'座椅加热|加热座椅|heated seats?', re.IGNORECASE)),
+    ('倒车影像', re.compile(r'倒车影像|倒车摄像|backup camera|rear ?view camera', re.IGNORECASE)),
+    ('360全景影像', re.compile(r'360度?全景|全景影像|360 camera', re.IGNORECASE)),
+    ('导航', re.compile(r'导航|navigation', re.IGNORECASE)),
+    ('自适应巡航', re.compile(r'自适应巡航|adaptive cruise', re.IGNORECASE)),
+    ('定速巡航', re.compile(r'定速巡航|(?<!adaptive )cruise control', re.IGNORECASE)),
+    ('无钥匙进入', re.compile(r'无钥匙(进入|启动)|一键启动|keyless', re.IGNORECASE)),
+    ('电动尾门', re.compile(r'电动尾门|power (tailgate|liftgate)', re.IGNORECASE)),
+    ('车道保持', re.compile(r'车道保持|lane keep(ing)? assist', re.IGNORECASE)),
+    ('抬头显示', re.compile(r'抬头显示|\bHUD\b', re.IGNORECASE)),
+    ('CarPlay', re.compile(r'carplay', re.IGNORECASE)),
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.DESCRIPTION_ANALYSIS_WORKERS, thread_name_prefix='description-analysis'
+)
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def description_hash(description):
+    return hashlib.sha1((description or '').encode('utf-8')).hexdigest()[:16]
+
+
+def _matches(pattern, text):
+    """pattern在text中未被否定的匹配"""
+    for match in pattern.finditer(text):
+        if not NEGATION_RE.search(text[max(0, match.start() - 12):match.start()]):
+            yield match
+
+
+def _found(pattern, text):
+    return next(_matches(pattern, text), None) is not None
+
+
+def _number(value):
+    return int(value) if value.isdigit() else CHINESE_NUMBERS.get(value)
+
+
+def _owner_count(text):
+    match = TRANSFER_COUNT_RE.search(text)
+    if match and _number(match.group(1)) is not None:
+        return _number(match.group(1)) + 1
+    match = OWNER_COUNT_RE.search(text)
+    if match:
+        count = _number(match.group(1) or match.group(2))
+        if count:
+            return count
+    if FIRST_OWNER_RE.search(text):
+        return 1
+    return None
+
+
+def extract(description):
+    """
+    本地规则提取，返回
+    {'accident': 'none'|'minor'|'major'|'', 'owners': 车主数或None, 'maintenance': [...], 'options': [...], 'tags': [...]}
+    """
+    text = ' '.join((description or '').split())
+    tags = []
+
+    major = [tag for tag, pattern in MAJOR_ACCIDENT_RULES if _found(pattern, text)]
+    if major:
+        accident = 'major'
+        tags.extend(major)
+    elif _found(MINOR_ACCIDENT_RE, text):
+        accident = 'minor'
+    elif NO_ACCIDENT_RE.search(text):
+        accident = 'none'
+    else:
+        accident = ''
+    if accident in ACCIDENT_TAGS:
+        tags.append(ACCIDENT_TAGS[accident])
+
+    owners = _owner_count(text)
+    if owners == 1:
+        tags.append('一手车')
+
+    maintenance = [tag for tag, pattern in MAINTENANCE_RULES if _found(pattern, text)]
+    options = [tag for tag, pattern in OPTION_RULES if _found(pattern, text)]
+    if '全景天窗' in options and '天窗' in options:
+        options.remove('天窗')
+    tags.extend(maintenance + options)
+
+    return {
+        'accident': accident,
+        'owners': owners,
+        'maintenance': maintenance,
+        'options': options,
+        'tags': tags,
+    }
+
+
+def analysis_text(result):
+    """将分析结果整理为与AI分析相同形式的纯文本"""
+    accident = {'none': '描述中注明无事故', 'minor': '描述中提到轻微事故或剐蹭、钣金喷漆',
+                'major': '描述中提到重大事故、泡水或火烧等情况'}.get(result['accident'], '描述中未说明事故情况')
+    owners = f"{result['owners']}任车主" if result['owners'] else '未说明'
+    lines = [
+        f"事故情况：{accident}",
+        f"车主情况：{owners}",
+        f"保养与车况：{'、'.join(result['maintenance']) or '未说明'}",
+        f"配置亮点：{'、'.join(result['options']) or '未提及'}",
+    ]
+    return '\n'.join(lines)
+
+
+def analyze(description, use_ai=None):
+    """分析描述，use_ai为None时按DESCRIPTION_ANALYSIS_USE_AI设置决定是否调用AI生成摘要"""
+    use_ai = settings.DESCRIPTION_ANALYSIS_USE_AI if use_ai is None else use_ai
+    result = extract(description)
+    result.update(version=ANALYSIS_VERSION, hash=description_hash(description), source='local')
+    if use_ai and description:
+        from ai_service.deepseek_service import deepseek, is_fallback_reply
+
+        reply = deepseek.analyze_vehicle_description(description)
+        if not is_fallback_reply(reply):
+            result['ai_summary'] = reply
+            result['source'] = 'ai'
+    return result
+
+
+def _merge_highlights(highlights, previous, tags):
+    """用新标签替换上次自动添加的亮点标签，卖家填写的标签保持不变；返回 (亮点标签, 本次自动添加的标签)"""
+    auto = previous.get('auto_highlights', [])
+    manual = [tag for tag in highlights or [] if tag not in auto]
+    added = [tag for tag in tags if tag not in manual]
+    return manual + added, added
+
+
+def analyze_vehicle(vehicle_id, use_ai=None, force=False):
+    """
+    分析车辆描述并保存结果，返回分析结果；描述未变化且规则版本相同时跳过（force时重新分析），车辆不存在时返回None。
+    分析（可能调用AI）在事务外进行，保存前锁定车辆行并确认描述在分析期间没有变化
+    """
+    from .models import Vehicle
+
+    vehicle = Vehicle.objects.filter(pk=vehicle_id).only('id', 'description', 'description_analysis').first()
+    if vehicle is None:
+        return None
+    previous = vehicle.description_analysis or {}
+    digest = description_hash(vehicle.description)
+    if not force and previous.get('hash') == digest and previous.get('version') == ANALYSIS_VERSION:
+        return previous
+
+    result = analyze(vehicle.description, use_ai)
+    with transaction.atomic():
+        current = Vehicle.objects.select_for_update().filter(pk=vehicle_id).only(
+            'id', 'description', 'highlights', 'description_analysis'
+        ).first()
+        if current is None or description_hash(current.description) != digest:
+            return None
+        highlights, result['auto_highlights'] = _merge_highlights(
+            current.highlights, current.description_analysis or {}, result['tags']
+        )
+        Vehicle.objects.filter(pk=vehicle_id).update(
+            description_analysis=result,
+            highlights=highlights,
+            accident_level=result['accident'],
+            owner_count=result['owners'],
+            description_analyzed_at=timezone.now(),
+        )
+        # update()不触发信号，直接同步标签关联表
+        sync_vehicle_tags(vehicle_id, highlights)
+    return result
+
+
+def _analyze_task(vehicle_id, use_ai=None, force=False):
+    close_old_connections()
+    try:
+        return vehicle_id, analyze_vehicle(vehicle_id, use_ai, force)
+    except Exception as e:
+        logger.error(f"分析车辆 {vehicle_id} 的描述失败: {str(e)}")
+        return vehicle_id, None
+    finally:
+        close_old_connections()
+
+
+def _scheduled_task(vehicle_id):
+    with _pending_lock:
+        _pending.discard(vehicle_id)
+    _analyze_task(vehicle_id)
+
+
+def schedule_analysis(vehicle_id):
+    """在后台线程中分析车辆描述，尚未开始的重复任务合并为一个"""
+    with _pending_lock:
+        if vehicle_id in _pending:
+            return
+        _pending.add(vehicle_id)
+    _executor.submit(_scheduled_task, vehicle_id)
+
+
+def analyze_vehicles(vehicle_ids, workers=4, use_ai=None, force=False):
+    """使用线程池并行分析一批车辆（调用AI时主要耗时在网络等待），返回 {车辆ID: 分析结果或None}"""
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='description-backfill') as executor:
+        return dict(executor.map(lambda vehicle_id: _analyze_task(vehicle_id, use_ai, force), vehicle_ids))
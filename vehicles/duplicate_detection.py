@@ -0,0 +1,82 @@
+"""
+重复车源检测
+车辆提交审核时按规范化VIN查找重复车辆；照片上传后在后台线程池中计算感知哈希，
+检索相似照片并将疑似重复的结果标记在待审核的车辆上（is_suspected_duplicate、duplicate_flags）
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .duplicates import find_similar_photos, hash_photo
+from .models import Vehicle, VehiclePhoto
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=settings.PHOTO_HASH_WORKERS, thread_name_prefix='duplicate-check')
+
+
+def detect_duplicates(vehicle):
+    """检测与车辆VIN相同或照片相似的其他车辆，返回标记列表"""
+    flags = []
+    if vehicle.vin_normalized:
+        others = Vehicle.objects.filter(
+            vin_normalized=vehicle.vin_normalized
+        ).exclude(pk=vehicle.pk).values('id', 'vin', 'seller_id', 'status')[:10]
+        for other in others:
+            flags.append({
+                'type': 'vin',
+                'vehicle_id': other['id'],
+                'vin': other['vin'],
+                'status': other['status'],
+                'same_seller': other['seller_id'] == vehicle.seller_id,
+            })
+
+    # 每辆疑似重复的车辆只保留距离最小的一组照片
+    best_matches = {}
+    for photo in vehicle.photos.exclude(phash='').only('id', 'phash'):
+        matches = find_similar_photos(
+            int(photo.phash, 16), settings.PHOTO_DUPLICATE_MAX_DISTANCE, exclude_vehicle_id=vehicle.pk
+        )
+        for match, distance in matches:
+            current = best_matches.get(match.vehicle_id)
+            if current is None or distance < current['distance']:
+                best_matches[match.vehicle_id] = {
+                    'type': 'photo',
+                    'vehicle_id': match.vehicle_id,
+                    'photo_id': photo.id,
+                    'matched_photo_id': match.id,
+                    'distance': distance,
+                }
+    flags.extend(sorted(best_matches.values(), key=lambda flag: flag['distance']))
+    return flags
+
+
+def flag_vehicle(vehicle_id):
+    """重新检测待审核车辆并更新其重复标记，返回标记列表（车辆不存在或已审核时返回空列表）"""
+    vehicle = Vehicle.objects.filter(pk=vehicle_id, review_status='pending').first()
+    if vehicle is None:
+        return []
+    flags = detect_duplicates(vehicle)
+    # 重复标记不影响计数、索引和快照，直接update不经过信号
+    Vehicle.objects.filter(pk=vehicle_id).update(is_suspected_duplicate=bool(flags), duplicate_flags=flags)
+    return flags
+
+
+def _check_photo(photo_id):
+    try:
+        photo = VehiclePhoto.objects.filter(pk=photo_id).first()
+        if photo is None:
+            return
+        if hash_photo(photo) is not None:
+            flag_vehicle(photo.vehicle_id)
+    except Exception as e:
+        logger.error(f"照片 {photo_id} 重复检测失败: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def schedule_photo_check(photo_id):
+    """在后台线程中计算照片哈希并更新车辆的重复标记"""
+    _executor.submit(_check_photo, photo_id)
@@ -0,0 +1,122 @@
+"""
+重复车源检测工具
+VIN码规范化，以及车辆照片的感知哈希（dHash）计算和基于多索引哈希的相似图片检索
+"""
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+from django.db.models import Q
+from PIL import Image, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# 系统为未填写VIN的车辆生成的占位VIN前缀
+AUTO_VIN_PREFIX = 'AUTO-'
+
+# VIN中不允许出现的字母（易与数字混淆）及其对应数字
+VIN_CONFUSABLES = str.maketrans({'I': '1', 'O': '0', 'Q': '0'})
+
+HASH_BITS = 64
+BAND_COUNT = 4
+BAND_BITS = HASH_BITS // BAND_COUNT
+BAND_FIELDS = tuple(f'phash_band{index}' for index in range(BAND_COUNT))
+
+
+def normalize_vin(vin):
+    """
+    规范化VIN码：去除空白和分隔符、转大写、将I/O/Q替换为易混淆的数字；
+    系统生成的占位VIN返回空字符串，不参与重复比对
+    """
+    if not vin or vin.upper().startswith(AUTO_VIN_PREFIX):
+        return ''
+    return re.sub(r'[^0-9A-Z]', '', vin.upper()).translate(VIN_CONFUSABLES)
+
+
+def dhash(image, hash_size=8):
+    """计算图片的64位差异哈希：缩放为灰度9x8，比较每行相邻像素的明暗"""
+    image = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hash_bands(value):
+    """将64位哈希拆为4个16位分段（高位在前）"""
+    mask = (1 << BAND_BITS) - 1
+    return [
+        (value >> (BAND_BITS * (BAND_COUNT - 1 - index))) & mask
+        for index in range(BAND_COUNT)
+    ]
+
+
+def band_neighbors(band):
+    """与分段汉明距离不超过1的全部取值（含自身）"""
+    return [band] + [band ^ (1 << bit) for bit in range(BAND_BITS)]
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def hash_photo(photo):
+    """计算并保存单张照片的感知哈希，图片无法读取时返回None"""
+    try:
+        with photo.image.open('rb') as f:
+            with Image.open(f) as image:
+                value = dhash(image)
+    except (OSError, ValueError, UnidentifiedImageError) as e:
+        logger.warning(f"计算照片 {photo.pk} 的感知哈希失败: {str(e)}")
+        return None
+
+    photo.phash = f'{value:016x}'
+    for field, band in zip(BAND_FIELDS, hash_bands(value)):
+        setattr(photo, field, band)
+    photo.save(update_fields=['phash', *BAND_FIELDS])
+    return value
+
+
+def _hash_photo_task(photo):
+    try:
+        return photo.pk, hash_photo(photo)
+    finally:
+        close_old_connections()
+
+
+def hash_photos(photos, workers=4):
+    """
+    使用线程池并行计算一批照片的感知哈希（图片解码和缩放在Pillow中会释放GIL），
+    返回 {照片ID: 哈希值或None}
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='photo-hash') as executor:
+        return dict(executor.map(_hash_photo_task, photos))
+
+
+def find_similar_photos(value, max_distance, exclude_vehicle_id=None):
+    """
+    查找感知哈希与value汉明距离不超过max_distance的照片
+    多索引哈希：距离不超过7的两个哈希至少有一个16位分段的距离不超过1，
+    因此先按各分段及其1位邻居走索引取候选，再精确计算汉明距离。
+    返回 [(照片, 距离), ...]，按距离升序
+    """
+    from .models import VehiclePhoto
+
+    condition = Q()
+    for field, band in zip(BAND_FIELDS, hash_bands(value)):
+        condition |= Q(**{f'{field}__in': band_neighbors(band)})
+
+    candidates = VehiclePhoto.objects.filter(condition).exclude(phash='')
+    if exclude_vehicle_id is not None:
+        candidates = candidates.exclude(vehicle_id=exclude_vehicle_id)
+
+    matches = []
+    for photo in candidates.only('id', 'vehicle_id', 'phash'):
+        distance = hamming(value, int(photo.phash, 16))
+        if distance <= max_distance:
+            matches.append((photo, distance))
+    return sorted(matches, key=lambda item: item[1])
@@ -0,0 +1,148 @@
+"""
+车辆列表分面统计
+统计品牌、车型类型、燃油类型、变速箱、排放标准以及价格、年份、里程区间的车辆数，
+每个分面按除自身以外的其他筛选条件统计（选中某个品牌后仍能看到其他品牌的数量）。
+一次分组查询得到 (各分面取值, 是否满足各分面的筛选条件) 组合的车辆数，
+再用NumPy按每个分面的掩码汇总，不按分面取值逐个COUNT；结果按查询参数缓存FACET_CACHE_TTL秒
+"""
+import hashlib
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, IntegerField, Value, When
+
+CACHE_KEY = 'vehicle_facets:{}'
+
+FIELD_FACETS = (
+    ('brand', 'brand_id'),
+    ('car_type', 'car_type_id'),
+    ('fuel_type', 'fuel_type'),
+    ('transmission', 'transmission'),
+    ('emission_standard', 'emission_standard'),
+)
+# 区间为 [min, max)，None表示不限
+RANGE_FACETS = (
+    ('price', 'price', (
+        (None, 50000, '5万以下'),
+        (50000, 100000, '5-10万'),
+        (100000, 150000, '10-15万'),
+        (150000, 200000, '15-20万'),
+        (200000, 300000, '20-30万'),
+        (300000, 500000, '30-50万'),
+        (500000, None, '50万以上'),
+    )),
+    ('year', 'year', (
+        (None, 2011, '2010年及以前'),
+        (2011, 2015, '2011-2014年'),
+        (2015, 2018, '2015-2017年'),
+        (2018, 2021, '2018-2020年'),
+        (2021, None, '2021年及以后'),
+    )),
+    ('mileage', 'mileage', (
+        (None, 10000, '1万公里以内'),
+        (10000, 30000, '1-3万公里'),
+        (30000, 60000, '3-6万公里'),
+        (60000, 100000, '6-10万公里'),
+        (100000, 150000, '10-15万公里'),
+        (150000, None, '15万公里以上'),
+    )),
+)
+FACET_NAMES = tuple(name for name, _ in FIELD_FACETS) + tuple(name for name, _, _ in RANGE_FACETS)
+
+
+def _bucket_case(field, buckets):
+    """区间编号（按buckets顺序）"""
+    whens = [
+        When(**{f'{field}__lt': upper}, then=Value(index))
+        for index, (_, upper, _) in enumerate(buckets) if upper is not None
+    ]
+    return Case(*whens, default=Value(len(buckets) - 1), output_field=IntegerField())
+
+
+def _factorize(values):
+    """将一列取值编码为整数，返回 (编码数组, 取值列表)"""
+    codes = {}
+    encoded = np.fromiter(
+        (codes.setdefault(value, len(codes)) for value in values), dtype=np.int64, count=len(values)
+    )
+    return encoded, list(codes)
+
+
+def _field_labels(name, values):
+    from .models import CarBrand, CarType, Vehicle
+
+    if name == 'brand':
+        return dict(CarBrand.objects.filter(id__in=values).values_list('id', 'name'))
+    if name == 'car_type':
+        return dict(CarType.objects.filter(id__in=values).values_list('id', 'name'))
+    return dict(Vehicle._meta.get_field(name).choices)
+
+
+def compute(queryset, conditions):
+    """
+    queryset为已应用上下文、关键词、标签等条件的车辆查询集；conditions为列表筛选条件 {条件名: Q}，
+    与分面同名的条件在统计该分面时不应用，其他条件（如颜色）直接应用；
+    返回 {'total': 满足全部条件的车辆数, 'facets': {分面名: [{'value', 'label', 'count'}, ...]}}，
+    区间分面按区间顺序返回全部区间（带min、max），其余分面按车辆数降序返回车辆数大于0的取值
+    """
+    active = [name for name in FACET_NAMES if name in conditions]
+    for name, condition in conditions.items():
+        if name not in FACET_NAMES:
+            queryset = queryset.filter(condition)
+    annotations = {f'{name}_bucket': _bucket_case(field, buckets) for name, field, buckets in RANGE_FACETS}
+    annotations.update({
+        f'{name}_match': Case(When(conditions[name], then=Value(True)), default=Value(False), output_field=BooleanField())
+        for name in active
+    })
+    columns = [field for _, field in FIELD_FACETS] + list(annotations)
+    rows = list(queryset.order_by().annotate(**annotations).values_list(*columns).annotate(total=Count('id')))
+
+    counts = np.array([row[-1] for row in rows], dtype=np.int64)
+    values = {name: [row[index] for row in rows] for index, name in enumerate(FACET_NAMES)}
+    offset = len(FACET_NAMES)
+    matches = {
+        name: np.array([bool(row[offset + index]) for row in rows], dtype=bool) for index, name in enumerate(active)
+    }
+
+    def others_mask(name):
+        """除name自身以外的条件都满足的组合"""
+        mask = np.ones(len(rows), dtype=bool)
+        for other in active:
+            if other != name:
+                mask &= matches[other]
+        return mask
+
+    facets = {}
+    for name, _ in FIELD_FACETS:
+        mask = others_mask(name)
+        encoded, uniques = _factorize(values[name])
+        totals = np.bincount(encoded[mask], weights=counts[mask], minlength=len(uniques)).astype(np.int64)
+        present = [(value, int(total)) for value, total in zip(uniques, totals) if total and value not in (None, '')]
+        labels = _field_labels(name, [value for value, _ in present])
+        present.sort(key=lambda item: (-item[1], str(item[0])))
+        facets[name] = [
+            {'value': value, 'label': labels.get(value, str(value)), 'count': count} for value, count in present
+        ]
+    for name, _, buckets in RANGE_FACETS:
+        mask = others_mask(name)
+        codes = np.asarray(values[name], dtype=np.int64)
+        totals = np.bincount(codes[mask], weights=counts[mask], minlength=len(buckets)).astype(np.int64)
+        facets[name] = [
+            {'value': index, 'label': label, 'min': lower, 'max': upper, 'count': int(totals[index])}
+            for index, (lower, upper, label) in enumerate(buckets)
+        ]
+
+    total = int(counts[others_mask(None)].sum()) if rows else 0
+    return {'total': total, 'facets': facets}
+
+
+def cached_facets(queryset, conditions, params):
+    """按规范化的查询参数缓存分面统计结果"""
+    digest = hashlib.md5(repr(sorted(params)).encode('utf-8')).hexdigest()
+    key = CACHE_KEY.format(digest)
+    result = cache.get(key)
+    if result is None:
+        result = compute(queryset, conditions)
+        cache.set(key, result, settings.FACET_CACHE_TTL)
+    return result
@@ -0,0 +1,143 @@
+"""
+车辆列表筛选条件
+筛选条件统一表示为 (字段, 'in', 取值列表) 或 (字段, 'range', (下限, 上限))（闭区间，None表示不限），
+数据库查询、分面统计和在售车辆快照都由同一份条件生成。
+多值参数支持逗号分隔或重复参数（?fuel_type=gasoline,hybrid 或 ?fuel_type=gasoline&fuel_type=hybrid）
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+# 多值参数：(参数名, 字段)
+ID_FILTERS = (('brand', 'brand_id'), ('car_type', 'car_type_id'))
+CHOICE_FILTERS = ('fuel_type', 'transmission', 'emission_standard')
+# 车况描述分析结果的筛选：事故情况（多值）、车主数上限
+ACCIDENT_FILTER = ('accident', 'accident_level')
+OWNERS_FILTER = ('owners', 'owner_count', 'max_owners')
+# 区间参数：(条件名, 字段, 下限参数, 上限参数, 类型)
+RANGE_FILTERS = (
+    ('price', 'price', 'min_price', 'max_price', Decimal),
+    ('year', 'year', 'year_min', 'year_max', int),
+    ('mileage', 'mileage', 'min_mileage', 'max_mileage', int),
+)
+MAX_FILTER_VALUES = 20
+COLOR_MAX_LENGTH = 50
+
+
+def condition_q(field, kind, value):
+    """将筛选条件转换为Q对象"""
+    if kind == 'in':
+        return Q(**{f'{field}__in': value})
+    lower, upper = value
+    condition = Q()
+    if lower is not None:
+        condition &= Q(**{f'{field}__gte': lower})
+    if upper is not None:
+        condition &= Q(**{f'{field}__lte': upper})
+    return condition
+
+
+def range_condition(field, lower, upper):
+    """上下限都未指定时返回None"""
+    if lower is None and upper is None:
+        return None
+    return field, 'range', (lower, upper)
+
+
+def multi_values(params, name):
+    """多值参数的取值，去除空白和重复值，保持顺序"""
+    values = []
+    for raw in params.getlist(name):
+        values.extend(item.strip() for item in raw.split(','))
+    return list(dict.fromkeys(value for value in values if value))
+
+
+def _number(params, name, cast, errors):
+    value = (params.get(name) or '').strip()
+    if not value:
+        return None
+    try:
+        number = cast(value)
+    except (ValueError, InvalidOperation):
+        errors[name] = '必须是数字'
+        return None
+    if isinstance(number, Decimal) and not number.is_finite():
+        errors[name] = '必须是数字'
+        return None
+    if number < 0:
+        errors[name] = '不能为负数'
+        return None
+    return number
+
+
+def _choice_values(params, name, field, errors):
+    """多值参数中的可选值，含有无效取值时记录错误并返回空列表"""
+    from .models import Vehicle
+
+    values = multi_values(params, name)
+    if not values:
+        return []
+    allowed = [value for value, _ in Vehicle._meta.get_field(field).choices]
+    invalid = [value for value in values if value not in allowed]
+    if invalid:
+        errors[name] = f"无效的取值: {', '.join(invalid)}，可选值: {', '.join(allowed)}"
+        return []
+    return values
+
+
+def parse_conditions(params):
+    """
+    解析并校验列表的筛选参数，返回 {条件名: 筛选条件}（条件名与分面名一致，颜色和车况条件除外）；
+    参数不合法时抛出ValidationError，列出每个参数的错误
+    """
+    errors = {}
+    conditions = {}
+
+    for name, field in ID_FILTERS:
+        values = multi_values(params, name)
+        if not values:
+            continue
+        if len(values) > MAX_FILTER_VALUES:
+            errors[name] = f'最多选择{MAX_FILTER_VALUES}项'
+        elif not all(value.isdigit() for value in values):
+            errors[name] = '必须是ID，多个值用逗号分隔'
+        else:
+            conditions[name] = (field, 'in', [int(value) for value in values])
+
+    for name in CHOICE_FILTERS:
+        values = _choice_values(params, name, name, errors)
+        if values:
+            conditions[name] = (name, 'in', values)
+
+    colors = multi_values(params, 'color')
+    if len(colors) > MAX_FILTER_VALUES:
+        errors['color'] = f'最多选择{MAX_FILTER_VALUES}项'
+    elif any(len(color) > COLOR_MAX_LENGTH for color in colors):
+        errors['color'] = f'颜色不能超过{COLOR_MAX_LENGTH}个字符'
+    elif colors:
+        conditions['color'] = ('color', 'in', colors)
+
+    for name, field, lower_param, upper_param, cast in RANGE_FILTERS:
+        lower = _number(params, lower_param, cast, errors)
+        upper = _number(params, upper_param, cast, errors)
+        if lower is not None and upper is not None and lower > upper:
+            errors[lower_param] = f'不能大于{upper_param}'
+            continue
+        condition = range_condition(field, lower, upper)
+        if condition:
+            conditions[name] = condition
+
+    name, field = ACCIDENT_FILTER
+    values = _choice_values(params, name, field, errors)
+    if values:
+        conditions[name] = (field, 'in', values)
+
+    name, field, upper_param = OWNERS_FILTER
+    upper = _number(params, upper_param, int, errors)
+    if upper is not None:
+        conditions[name] = range_condition(field, None, upper)
+
+    if errors:
+        raise ValidationError(errors)
+    return conditions
@@ -0,0 +1,326 @@
+"""
+在售车辆列式快照
+每个进程在内存中保存全部在售（审核通过且上架）车辆的列：ID、品牌、车型类型、价格、年份、里程、创建时间，
+以及燃油类型、变速箱、排放标准的整数编码和颜色的字典编码，每列是一段连续的NumPy数组，按创建时间升序排列。
+公开列表的筛选、排序和分页在快照上用向量化掩码完成，只按当前页的车辆ID从数据库读取完整数据。
+车辆变更后写入变更记录表（VehicleChange），各进程每隔POLL_INTERVAL秒读取新的变更记录并重新加载这些车辆；
+定期在后台全量重建（清除已删除的行）。快照尚未构建完成时列表回退为数据库查询
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Vehicle, VehicleChange
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_FIELDS = ('fuel_type', 'transmission', 'emission_standard')
+# 取值不固定的字段按出现顺序编码，编码表随快照重建
+DICTIONARY_FIELDS = ('color',)
+COLUMN_TYPES = {
+    'id': np.int64,
+    'brand_id': np.int64,
+    'car_type_id': np.int64,
+    'price': np.float64,
+    'year': np.int32,
+    'mileage': np.int64,
+    'created_at': np.int64,
+    'fuel_type': np.int8,
+    'transmission': np.int8,
+    'emission_standard': np.int8,
+    'color': np.int32,
+}
+LOAD_FIELDS = tuple(COLUMN_TYPES)
+SORT_FIELDS = ('price', 'created_at', 'mileage')
+MISSING = -1
+# 变更记录写入时间与提交时间可能有先后，每次读取时重读这段时间内的记录（重复应用是幂等的）
+CHANGE_FEED_OVERLAP = timedelta(seconds=5)
+# 一次读取到的变更超过该数量时改为全量重建
+MAX_POLL_CHANGES = 5000
+
+CATEGORY_CODES = {
+    field: {value: code for code, (value, _) in enumerate(Vehicle._meta.get_field(field).choices)}
+    for field in CATEGORY_FIELDS
+}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='listing-snapshot')
+
+
+def _encode(field, value):
+    """类别字段取值的整数编码，不在可选值中时为MISSING"""
+    return CATEGORY_CODES[field].get(value, MISSING)
+
+
+def _row(values, dictionaries):
+    """由 LOAD_FIELDS 顺序的字段值得到各列的值，新出现的字典编码字段取值加入dictionaries"""
+    row = dict(zip(LOAD_FIELDS, values))
+    row['car_type_id'] = MISSING if row['car_type_id'] is None else row['car_type_id']
+    row['price'] = float(row['price'] or 0)
+    row['created_at'] = int(row['created_at'].timestamp() * 1_000_000)
+    for field in CATEGORY_FIELDS:
+        row[field] = _encode(field, row[field])
+    for field in DICTIONARY_FIELDS:
+        codes = dictionaries[field]
+        row[field] = codes.setdefault(row[field], len(codes))
+    return row
+
+
+def _dictionaries():
+    return {field: {} for field in DICTIONARY_FIELDS}
+
+
+def _listed_vehicles():
+    return Vehicle.objects.filter(review_status='approved', status='listed')
+
+
+def record_changes(vehicle_ids):
+    """记录车辆变更（事务提交后写入），各进程的快照下次读取变更记录时重新加载这些车辆"""
+    vehicle_ids = list(vehicle_ids)
+    if vehicle_ids:
+        transaction.on_commit(lambda: VehicleChange.objects.bulk_create(
+            [VehicleChange(vehicle_id=vehicle_id) for vehicle_id in vehicle_ids]
+        ))
+
+
+class ListingSnapshot:
+    """
+    在售车辆快照：columns中各列与active按行对齐，前size行有效；
+    追加时容量不足则成倍扩容（替换为新的列字典，正在查询的线程仍持有旧数组）
+    """
+
+    def __init__(self, poll_interval, refresh_interval, compact_ratio, retention):
+        self.poll_interval = poll_interval
+        self.refresh_interval = refresh_interval
+        self.compact_ratio = compact_ratio
+        self.retention = retention
+        self.lock = threading.RLock()
+        self.built_at = None
+        self.refreshing = False
+        # 已应用的最大变更记录ID，以及上次读取变更记录的时间（单调时钟和当前时间）
+        self.cursor = 0
+        self.polled_at = 0.0
+        self.polled_wall = None
+        self._reset([], _dictionaries())
+
+    def _reset(self, rows, dictionaries):
+        capacity = max(len(rows), 16)
+        self.columns = {}
+        for field, dtype in COLUMN_TYPES.items():
+            column = np.full(capacity, MISSING, dtype=dtype)
+            column[:len(rows)] = [row[field] for row in rows]
+            self.columns[field] = column
+        self.active = np.zeros(capacity, dtype=bool)
+        self.active[:len(rows)] = True
+        self.size = len(rows)
+        self.positions = {row['id']: index for index, row in enumerate(rows)}
+        self.dictionaries = dictionaries
+        self.deleted = 0
+        # 各排序字段的行号排列，写入行后失效（删除行只修改active，不影响排列）
+        self.version = 0
+        self.sort_orders = {}
+        # 新车辆按创建时间追加，行序仍为创建时间升序；重新上架的旧车辆追加在末尾后需要按列排序
+        self.ordered = True
+
+    def build(self):
+        """从数据库重建快照，并清除超过保留时间的变更记录"""
+        # 先记下变更位置再读取车辆，读取期间的变更在下次读取变更记录时重新应用
+        cursor = VehicleChange.objects.aggregate(latest=Max('id'))['latest'] or 0
+        wall = timezone.now()
+        dictionaries = _dictionaries()
+        rows = [
+            _row(values, dictionaries) for values in
+            _listed_vehicles().order_by('created_at', 'id').values_list(*LOAD_FIELDS).iterator()
+        ]
+        with self.lock:
+            self._reset(rows, dictionaries)
+            self.cursor = cursor
+            self.polled_wall = wall
+            self.polled_at = time.monotonic()
+            self.built_at = time.monotonic()
+        VehicleChange.objects.filter(changed_at__lt=wall - timedelta(seconds=self.retention)).delete()
+        logger.info(f"在售车辆快照已重建: {len(rows)} 辆车辆")
+
+    def _grow(self):
+        capacity = len(self.active) * 2
+        columns = {}
+        for field, column in self.columns.items():
+            grown = np.full(capacity, MISSING, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            columns[field] = grown
+        active = np.zeros(capacity, dtype=bool)
+        active[:self.size] = self.active[:self.size]
+        self.columns, self.active = columns, active
+
+    def _upsert(self, row):
+        index = self.positions.get(row['id'])
+        if index is None:
+            if self.size == len(self.active):
+                self._grow()
+            index = self.size
+            if index and row['created_at'] < self.columns['created_at'][index - 1]:
+                self.ordered = False
+            self.positions[row['id']] = index
+            self.size += 1
+        for field, value in row.items():
+            self.columns[field][index] = value
+        self.active[index] = True
+        self.version += 1
+
+    def _remove(self, vehicle_id):
+        index = self.positions.pop(vehicle_id, None)
+        if index is not None:
+            self.active[index] = False
+            self.deleted += 1
+
+    def poll(self):
+        """读取上次之后的变更记录，重新加载变更的车辆：仍在售的写入快照，其余从快照中删除"""
+        if time.monotonic() - self.polled_at < self.poll_interval:
+            return
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.polled_at = time.monotonic()
+            wall = timezone.now()
+            changes = list(
+                VehicleChange.objects.filter(
+                    Q(id__gt=self.cursor) | Q(changed_at__gte=self.polled_wall - CHANGE_FEED_OVERLAP)
+                ).order_by('id').values_list('id', 'vehicle_id')[:MAX_POLL_CHANGES + 1]
+            )
+            if len(changes) > MAX_POLL_CHANGES:
+                self._schedule_refresh()
+                return
+            self.polled_wall = wall
+            if not changes:
+                return
+            vehicle_ids = {vehicle_id for _, vehicle_id in changes}
+            listed = {}
+            for values in _listed_vehicles().filter(id__in=vehicle_ids).values_list(*LOAD_FIELDS):
+                row = _row(values, self.dictionaries)
+                listed[row['id']] = row
+            for vehicle_id in vehicle_ids:
+                if vehicle_id in listed:
+                    self._upsert(listed[vehicle_id])
+                else:
+                    self._remove(vehicle_id)
+            self.cursor = max(self.cursor, max(change_id for change_id, _ in changes))
+        finally:
+            self.lock.release()
+
+    def _stale(self):
+        if time.monotonic() - self.built_at >= self.refresh_interval:
+            return True
+        return self.deleted > max(self.size * self.compact_ratio, 100)
+
+    def _refresh_task(self):
+        close_old_connections()
+        try:
+            self.build()
+        except Exception as e:
+            logger.error(f"重建在售车辆快照失败: {str(e)}")
+        finally:
+            self.refreshing = False
+            close_old_connections()
+
+    def _schedule_refresh(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        _executor.submit(self._refresh_task)
+
+    def start(self):
+        """在后台构建快照（进程启动时调用）"""
+        if settings.LISTING_SNAPSHOT_ENABLED and self.built_at is None:
+            self._schedule_refresh()
+
+    def ensure_fresh(self):
+        """
+        快照可用时读取新的变更记录并返回True；尚未构建时在后台构建并返回False，
+        到期或已删除行过多时在后台重建，重建期间继续使用当前快照
+        """
+        if self.built_at is None:
+            self.start()
+            return False
+        if self._stale():
+            self._schedule_refresh()
+        self.poll()
+        return True
+
+    def _sort_order(self, field, columns, size):
+        """按列升序排列的行号，缓存到下次写入行"""
+        version = self.version
+        cached = self.sort_orders.get(field)
+        if cached is not None and cached[0] == version and len(cached[1]) == size:
+            return cached[1]
+        order = np.argsort(columns[field][:size], kind='stable')
+        self.sort_orders[field] = (version, order)
+        return order
+
+    def select(self, conditions, ordering='-created_at'):
+        """
+        按筛选条件（见 vehicles.filters，字段须为快照中的列）和排序字段（可加'-'前缀表示降序）
+        返回满足条件的车辆ID数组
+        """
+        # 先取引用再取行数，扩容替换数组时仍读到一致的数据
+        columns, active, dictionaries = self.columns, self.active, self.dictionaries
+        size = min(self.size, len(active))
+        mask = active[:size].copy()
+        for field, kind, value in conditions:
+            column = columns[field][:size]
+            if kind == 'in':
+                if field in CATEGORY_FIELDS:
+                    value = [_encode(field, item) for item in value]
+                elif field in DICTIONARY_FIELDS:
+                    value = [dictionaries[field].get(item, MISSING) for item in value]
+                mask &= np.isin(column, value)
+            else:
+                lower, upper = value
+                if lower is not None:
+                    mask &= column >= float(lower)
+                if upper is not None:
+                    mask &= column <= float(upper)
+
+        field = ordering.lstrip('-')
+        if field == 'created_at' and self.ordered:
+            rows = np.flatnonzero(mask)
+        else:
+            order = self._sort_order(field, columns, size)
+            rows = order[mask[order]]
+        if ordering.startswith('-'):
+            rows = rows[::-1]
+        return columns['id'][rows]
+
+
+class SnapshotResults:
+    """按快照得到的车辆ID数组延迟读取车辆，分页器切片时只查询当前页的车辆"""
+
+    def __init__(self, vehicle_ids, queryset):
+        self.vehicle_ids = vehicle_ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.vehicle_ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self.queryset.get(pk=int(self.vehicle_ids[index]))
+        page_ids = self.vehicle_ids[index].tolist()
+        vehicles = self.queryset.in_bulk(page_ids)
+        # 快照与数据库之间有短暂延迟，已不满足条件的车辆不返回
+        return [vehicles[vehicle_id] for vehicle_id in page_ids if vehicle_id in vehicles]
+
+
+listing_snapshot = ListingSnapshot(
+    poll_interval=settings.LISTING_SNAPSHOT_POLL_INTERVAL,
+    refresh_interval=settings.LISTING_SNAPSHOT_REFRESH_INTERVAL,
+    compact_ratio=settings.LISTING_SNAPSHOT_COMPACT_RATIO,
+    retention=settings.LISTING_CHANGE_RETENTION,
+)
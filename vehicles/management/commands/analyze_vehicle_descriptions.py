@@ -0,0 +1,66 @@
+"""
+车况描述分析回填管理命令
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from vehicles.description_analysis import ANALYSIS_VERSION, analyze_vehicles
+from vehicles.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = '并行分析尚未分析（或规则版本已更新）的车辆描述，保存提取的标签和车况信息'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.DESCRIPTION_ANALYSIS_WORKERS,
+            help='并行线程数（调用AI时可适当调大）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批提交到线程池的车辆数',
+        )
+        parser.add_argument(
+            '--with-ai',
+            action='store_true',
+            default=None,
+            help='在本地规则之外调用AI生成分析摘要（默认按DESCRIPTION_ANALYSIS_USE_AI设置）',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='重新分析全部车辆，包括描述未变化的车辆',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError('--workers 和 --batch-size 必须大于0')
+
+        vehicles = Vehicle.objects.all()
+        if not options['force']:
+            # 描述变化的车辆已由保存时的后台任务处理，这里补充从未分析过或规则版本过旧的车辆
+            vehicles = vehicles.filter(
+                Q(description_analysis__version__isnull=True) | Q(description_analysis__version__lt=ANALYSIS_VERSION)
+            )
+
+        analyzed = failed = 0
+        last_id = 0
+        while True:
+            vehicle_ids = list(
+                vehicles.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not vehicle_ids:
+                break
+            results = analyze_vehicles(
+                vehicle_ids, workers=options['workers'], use_ai=options['with_ai'], force=options['force']
+            )
+            analyzed += sum(1 for result in results.values() if result is not None)
+            failed += sum(1 for result in results.values() if result is None)
+            last_id = vehicle_ids[-1]
+            self.stdout.write(f'已处理 {analyzed + failed} 辆')
+        self.stdout.write(self.style.SUCCESS(f'描述分析完成：成功 {analyzed} 辆，失败或跳过 {failed} 辆'))
@@ -0,0 +1,47 @@
+"""
+协同过滤相似车辆计算管理命令
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from vehicles.recommender import compute_neighbors, last_computed_at
+
+
+class Command(BaseCommand):
+    help = '根据收藏和浏览记录计算每辆车的相似车辆（建议定时执行：每小时增量计算，每天全量计算一次）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='全量重算所有车辆（默认只重算上次计算之后有新行为影响到的车辆）',
+        )
+        parser.add_argument('--since', help='增量计算的起始时间（ISO格式），默认为上次计算的时间')
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=settings.RECOMMENDER_TOP_K,
+            help='每辆车保存的相似车辆数',
+        )
+
+    def handle(self, *args, **options):
+        if options['top_k'] <= 0:
+            raise CommandError('--top-k 必须大于0')
+
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"无法解析时间: {options['since']}")
+        elif not options['full']:
+            since = last_computed_at()
+            if since is None:
+                self.stdout.write('没有已保存的计算结果，执行全量计算')
+
+        stats = compute_neighbors(since=None if options['full'] else since, top_k=options['top_k'])
+        mode = '全量' if stats['mode'] == 'full' else '增量'
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode}计算完成: {stats['users']} 个用户，{stats['vehicles']} 辆车，"
+            f"重算 {stats['recomputed']} 辆，保存 {stats['neighbors']} 条相似车辆"
+        ))
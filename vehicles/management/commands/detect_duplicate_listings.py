@@ -0,0 +1,47 @@
+"""
+重复车源检测管理命令
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from vehicles.models import Vehicle, VehiclePhoto
+from vehicles.duplicates import hash_photos
+from vehicles.duplicate_detection import flag_vehicle
+
+
+class Command(BaseCommand):
+    help = '为尚未计算感知哈希的车辆照片补算哈希，并重新标记待审核车辆中的疑似重复车源'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.PHOTO_HASH_WORKERS,
+            help='计算照片哈希的并行线程数',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='每批提交到线程池的照片数',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始计算照片感知哈希..')
+        hashed = failed = 0
+        last_id = 0
+        while True:
+            photos = list(
+                VehiclePhoto.objects.filter(phash='', id__gt=last_id).order_by('id')[:options['batch_size']]
+            )
+            if not photos:
+                break
+            results = hash_photos(photos, workers=options['workers'])
+            hashed += sum(1 for value in results.values() if value is not None)
+            failed += sum(1 for value in results.values() if value is None)
+            last_id = photos[-1].id
+        self.stdout.write(f'照片哈希完成：成功 {hashed} 张，失败 {failed} 张')
+
+        vehicle_ids = Vehicle.objects.filter(review_status='pending').values_list('id', flat=True)
+        flagged = sum(1 for vehicle_id in vehicle_ids if flag_vehicle(vehicle_id))
+        self.stdout.write(self.style.SUCCESS(f'重复检测完成！共 {flagged} 个待审核车辆疑似重复'))
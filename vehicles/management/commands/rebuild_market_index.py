@@ -0,0 +1,14 @@
+"""
+市场可比价格索引重建管理命令
+"""
+from django.core.management.base import BaseCommand
+
+from vehicles.market_index import rebuild
+
+
+class Command(BaseCommand):
+    help = '由在售车辆和近期成交订单全量重建市场可比价格统计（建议定时执行，如每天一次）'
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'市场可比价格已重建: {count} 个分组'))
@@ -0,0 +1,62 @@
+"""
+车辆定价模型训练管理命令
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicles.pricing_model import PriceModel, evaluate, model_cache, training_data
+
+
+class Command(BaseCommand):
+    help = '用已成交订单和在售车辆重新训练定价模型并保存（建议定时执行，如每天一次）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alpha', type=float, default=settings.PRICE_MODEL_ALPHA, help='L2正则化强度')
+        parser.add_argument(
+            '--min-samples',
+            type=int,
+            default=settings.PRICE_MODEL_MIN_SAMPLES,
+            help='样本数少于该值时不训练',
+        )
+        parser.add_argument(
+            '--holdout',
+            type=float,
+            default=0.2,
+            help='用于评估的留出样本比例，0表示不评估',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='只训练和评估，不保存模型',
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options['holdout'] < 1:
+            raise CommandError('--holdout 必须在 [0, 1) 范围内')
+
+        records, prices, weights = training_data()
+        self.stdout.write(f'训练样本: {len(records)} 条')
+        if len(records) < options['min_samples']:
+            raise CommandError(f'训练样本不足：{len(records)} < {options["min_samples"]}')
+
+        min_category_count = settings.PRICE_MODEL_MIN_CATEGORY_COUNT
+        if options['holdout']:
+            metrics = evaluate(
+                records, prices, weights, options['alpha'], min_category_count, holdout=options['holdout']
+            )
+            if metrics:
+                self.stdout.write(
+                    f"留出评估: {metrics['test_samples']} 条，平均绝对百分比误差 {metrics['mape']:.2%}，"
+                    f"90%区间覆盖率 {metrics['coverage']:.2%}"
+                )
+
+        model = PriceModel.fit(records, prices, weights, options['alpha'], min_category_count)
+        self.stdout.write(f"模型 {model.version}: 对数价格残差标准差 {model.sigma:.4f}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('试运行，未保存模型'))
+            return
+
+        model.save(settings.PRICE_MODEL_PATH)
+        model_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'定价模型已保存: {settings.PRICE_MODEL_PATH}'))
@@ -0,0 +1,310 @@
+"""
+市场可比价格索引
+按 (品牌, 规范化车型名, 年份区间, 里程区间) 汇总在售车辆的标价和近期已完成订单的成交价，
+保存中位价、四分位价、样本数和近期价格变化率（MarketComparable）。
+车辆或订单变更后在后台线程中只重算受影响的分组；读取时按分组键查缓存，未命中时按唯一索引查一行，
+序列化车辆列表时整页的分组一次读取（lookup_many）。
+bulk_update等不触发信号的批量修改由 rebuild_market_index 命令定期全量重建修正
+"""
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'market_comp:generation'
+STATS_KEY = 'market_comp:{}:{}'
+MODEL_NAME_SEPARATORS = str.maketrans('', '', ' \t-_/.·')
+# 计算近期价格变化率时两个时间段各自需要的最少样本数
+MIN_TREND_SAMPLES = 3
+WRITE_BATCH_SIZE = 500
+LISTED_FIELDS = ('brand_id', 'model_name', 'year', 'mileage', 'price', 'listed_at', 'created_at')
+SOLD_FIELDS = (
+    'vehicle__brand_id', 'vehicle__model_name', 'vehicle__year', 'vehicle__mileage', 'price', 'completed_at'
+)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='market-index')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def normalize_model_name(name):
+    """规范化车型名：全角转半角、转小写、去除空白和常见分隔符"""
+    return unicodedata.normalize('NFKC', name or '').lower().translate(MODEL_NAME_SEPARATORS)[:100]
+
+
+def comparable_key(brand_id, model_name, year, mileage):
+    """可比分组键，信息不全时返回None"""
+    model_key = normalize_model_name(model_name)
+    if not brand_id or not model_key or year is None or mileage is None:
+        return None
+    year_band = int(year) // settings.MARKET_YEAR_BAND * settings.MARKET_YEAR_BAND
+    mileage_band = max(int(mileage), 0) // settings.MARKET_MILEAGE_BAND * settings.MARKET_MILEAGE_BAND
+    return brand_id, model_key, year_band, mileage_band
+
+
+def vehicle_key(vehicle):
+    return comparable_key(vehicle.brand_id, vehicle.model_name, vehicle.year, vehicle.mileage)
+
+
+def _generation():
+    return cache.get(GENERATION_KEY, 0)
+
+
+def _cache_key(key, generation):
+    digest = hashlib.md5('|'.join(map(str, key)).encode('utf-8')).hexdigest()
+    return STATS_KEY.format(generation, digest)
+
+
+def _stats_dict(comparable):
+    return {
+        'count': comparable.count,
+        'listed_count': comparable.listed_count,
+        'sold_count': comparable.sold_count,
+        'median_price': float(comparable.median_price),
+        'q1_price': float(comparable.q1_price),
+        'q3_price': float(comparable.q3_price),
+        'trend': comparable.trend,
+    }
+
+
+def _sufficient(stats):
+    return stats if stats.get('count', 0) >= settings.MARKET_MIN_COMPARABLES else None
+
+
+def lookup(key):
+    """
+    读取分组统计，样本数不足MARKET_MIN_COMPARABLES时返回None
+    结果（包括不存在的分组）写入缓存，分组重算时更新
+    """
+    from .models import MarketComparable
+
+    if key is None:
+        return None
+    cache_key = _cache_key(key, _generation())
+    stats = cache.get(cache_key)
+    if stats is None:
+        brand_id, model_key, year_band, mileage_band = key
+        comparable = MarketComparable.objects.filter(
+            brand_id=brand_id, model_key=model_key, year_band=year_band, mileage_band=mileage_band
+        ).first()
+        stats = _stats_dict(comparable) if comparable else {}
+        cache.set(cache_key, stats, settings.MARKET_CACHE_TTL)
+    return _sufficient(stats)
+
+
+def lookup_many(keys):
+    """
+    批量读取分组统计：一次cache.get_many，未命中的分组用一次查询读取并写回缓存；
+    返回 {分组键: 统计}，样本数不足的分组为None
+    """
+    from .models import MarketComparable
+
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return {}
+    generation = _generation()
+    cache_keys = {key: _cache_key(key, generation) for key in keys}
+    cached = cache.get_many(cache_keys.values())
+    found = {key: cached[cache_key] for key, cache_key in cache_keys.items() if cache_key in cached}
+
+    missing = keys - found.keys()
+    if missing:
+        rows = MarketComparable.objects.filter(
+            brand_id__in={key[0] for key in missing}, model_key__in={key[1] for key in missing},
+            year_band__in={key[2] for key in missing}, mileage_band__in={key[3] for key in missing},
+        )
+        loaded = {key: {} for key in missing}
+        for comparable in rows:
+            key = (comparable.brand_id, comparable.model_key, comparable.year_band, comparable.mileage_band)
+            if key in loaded:
+                loaded[key] = _stats_dict(comparable)
+        cache.set_many({cache_keys[key]: stats for key, stats in loaded.items()}, settings.MARKET_CACHE_TTL)
+        found.update(loaded)
+    return {key: _sufficient(stats) for key, stats in found.items()}
+
+
+def vehicle_stats(vehicle):
+    return lookup(vehicle_key(vehicle))
+
+
+def vehicles_stats(vehicles):
+    """一组车辆的分组统计 {车辆ID: 统计}，供序列化列表时一次读取"""
+    keys = {vehicle.pk: vehicle_key(vehicle) for vehicle in vehicles}
+    stats = lookup_many(keys.values())
+    return {pk: stats.get(key) for pk, key in keys.items()}
+
+
+def spec_stats(vehicle_data):
+    """按品牌名、车型名、年份和里程（如AI定价的输入数据）读取分组统计"""
+    from .models import CarBrand
+
+    brand = str(vehicle_data.get('brand') or '').strip()
+    try:
+        year = int(float(vehicle_data.get('year')))
+        mileage = int(float(vehicle_data.get('mileage')))
+    except (TypeError, ValueError):
+        return None
+    if not brand:
+        return None
+    brand_id = CarBrand.objects.filter(name__iexact=brand).values_list('id', flat=True).first()
+    return lookup(comparable_key(brand_id, vehicle_data.get('model'), year, mileage))
+
+
+def market_position(price, stats):
+    """标价相对市场的位置：低于下四分位为below_market，高于上四分位为above_market，其余为fair"""
+    if stats is None or price is None:
+        return None
+    price = float(price)
+    if price < stats['q1_price']:
+        return 'below_market'
+    if price > stats['q3_price']:
+        return 'above_market'
+    return 'fair'
+
+
+def _samples(listed_rows, sold_rows):
+    """将车辆和订单数据整理为 {分组键: [(价格, 时间, 是否成交), ...]}"""
+    groups = defaultdict(list)
+    for brand_id, model_name, year, mileage, price, listed_at, created_at in listed_rows:
+        key = comparable_key(brand_id, model_name, year, mileage)
+        if key is not None:
+            groups[key].append((float(price), listed_at or created_at, False))
+    for brand_id, model_name, year, mileage, price, completed_at in sold_rows:
+        key = comparable_key(brand_id, model_name, year, mileage)
+        if key is not None:
+            groups[key].append((float(price), completed_at, True))
+    return groups
+
+
+def _trend(samples, now):
+    """最近MARKET_TREND_DAYS天与之前同样长度时间段的中位价变化率，样本不足时返回None"""
+    period = timedelta(days=settings.MARKET_TREND_DAYS)
+    recent = [price for price, at, _ in samples if at and at >= now - period]
+    previous = [price for price, at, _ in samples if at and now - 2 * period <= at < now - period]
+    if len(recent) < MIN_TREND_SAMPLES or len(previous) < MIN_TREND_SAMPLES:
+        return None
+    return round(float(np.median(recent) / np.median(previous) - 1), 4)
+
+
+def _comparable(key, samples, now):
+    from .models import MarketComparable
+
+    brand_id, model_key, year_band, mileage_band = key
+    prices = np.array([price for price, _, _ in samples], dtype=float)
+    q1, median, q3 = np.percentile(prices, [25, 50, 75])
+    sold_count = sum(1 for _, _, sold in samples if sold)
+    return MarketComparable(
+        brand_id=brand_id, model_key=model_key, year_band=year_band, mileage_band=mileage_band,
+        count=len(samples), listed_count=len(samples) - sold_count, sold_count=sold_count,
+        median_price=Decimal(f'{median:.2f}'), q1_price=Decimal(f'{q1:.2f}'), q3_price=Decimal(f'{q3:.2f}'),
+        trend=_trend(samples, now), updated_at=now,
+    )
+
+
+def _listed_vehicles():
+    from .models import Vehicle
+
+    return Vehicle.objects.filter(status='listed', review_status='approved', price__gt=0)
+
+
+def _completed_orders(now):
+    from orders.models import Order
+
+    start = now - timedelta(days=settings.MARKET_ORDER_HISTORY_DAYS)
+    return Order.objects.filter(status='completed', price__gt=0, completed_at__gte=start)
+
+
+def refresh_groups(keys):
+    """重算指定分组：每个分组按品牌、年份和里程范围查询样本，再按规范化车型名过滤"""
+    from .models import MarketComparable
+
+    now = timezone.now()
+    generation = _generation()
+    for key in keys:
+        brand_id, model_key, year_band, mileage_band = key
+        year_range = (year_band, year_band + settings.MARKET_YEAR_BAND - 1)
+        mileage_range = (mileage_band, mileage_band + settings.MARKET_MILEAGE_BAND - 1)
+        listed = _listed_vehicles().filter(
+            brand_id=brand_id, year__range=year_range, mileage__range=mileage_range
+        ).values_list(*LISTED_FIELDS)
+        sold = _completed_orders(now).filter(
+            vehicle__brand_id=brand_id, vehicle__year__range=year_range, vehicle__mileage__range=mileage_range
+        ).values_list(*SOLD_FIELDS)
+        samples = _samples(listed, sold).get(key)
+
+        lookup_fields = {
+            'brand_id': brand_id, 'model_key': model_key, 'year_band': year_band, 'mileage_band': mileage_band,
+        }
+        if samples:
+            comparable = _comparable(key, samples, now)
+            MarketComparable.objects.update_or_create(
+                **lookup_fields,
+                defaults={field: getattr(comparable, field) for field in (
+                    'count', 'listed_count', 'sold_count', 'median_price', 'q1_price', 'q3_price', 'trend'
+                )},
+            )
+            stats = _stats_dict(comparable)
+        else:
+            MarketComparable.objects.filter(**lookup_fields).delete()
+            stats = {}
+        cache.set(_cache_key(key, generation), stats, settings.MARKET_CACHE_TTL)
+
+
+def rebuild():
+    """全量重建：一次读取全部样本，替换整张表并切换缓存代数，返回分组数"""
+    from .models import MarketComparable
+
+    now = timezone.now()
+    groups = _samples(
+        _listed_vehicles().values_list(*LISTED_FIELDS).iterator(),
+        _completed_orders(now).values_list(*SOLD_FIELDS).iterator(),
+    )
+    comparables = [_comparable(key, samples, now) for key, samples in groups.items()]
+    with transaction.atomic():
+        MarketComparable.objects.all().delete()
+        MarketComparable.objects.bulk_create(comparables, batch_size=WRITE_BATCH_SIZE)
+
+    generation = _generation() + 1
+    cache.set_many(
+        {_cache_key(key, generation): _stats_dict(comparable) for key, comparable in zip(groups, comparables)},
+        settings.MARKET_CACHE_TTL,
+    )
+    cache.set(GENERATION_KEY, generation, timeout=None)
+    return len(comparables)
+
+
+def _refresh_task():
+    close_old_connections()
+    try:
+        with _pending_lock:
+            keys = list(_pending)
+            _pending.clear()
+        refresh_groups(keys)
+    except Exception as e:
+        logger.error(f"更新市场可比价格失败: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def schedule_refresh(keys):
+    """在后台线程中重算分组；同一分组的多次变更在执行前合并"""
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return
+    with _pending_lock:
+        submit = not _pending
+        _pending.update(keys)
+    if submit:
+        _executor.submit(_refresh_task)
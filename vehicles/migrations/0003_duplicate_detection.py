@@ -0,0 +1,69 @@
+# Generated by Django 4.2 on 2026-10-19 01:51
+
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+VIN_CONFUSABLES = str.maketrans({'I': '1', 'O': '0', 'Q': '0'})
+
+
+def normalize_vin(vin):
+    """迁移时的VIN规范化规则（复制自 vehicles.duplicates，后续修改该函数不影响本迁移）"""
+    if not vin or vin.upper().startswith('AUTO-'):
+        return ''
+    return re.sub(r'[^0-9A-Z]', '', vin.upper()).translate(VIN_CONFUSABLES)
+
+
+def fill_vin_normalized(apps, schema_editor):
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    batch = []
+    for vehicle in Vehicle.objects.only('id', 'vin').order_by('id').iterator(chunk_size=BATCH_SIZE):
+        vehicle.vin_normalized = normalize_vin(vehicle.vin)
+        batch.append(vehicle)
+        if len(batch) >= BATCH_SIZE:
+            Vehicle.objects.bulk_update(batch, ['vin_normalized'])
+            batch = []
+    if batch:
+        Vehicle.objects.bulk_update(batch, ['vin_normalized'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0002_vehicle_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='vin_normalized',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=30, verbose_name='规范化VIN码'),
+        ),
+        migrations.AddField(
+            model_name='vehiclephoto',
+            name='phash',
+            field=models.CharField(blank=True, default='', max_length=16, verbose_name='感知哈希'),
+        ),
+        migrations.AddField(
+            model_name='vehiclephoto',
+            name='phash_band0',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='vehiclephoto',
+            name='phash_band1',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='vehiclephoto',
+            name='phash_band2',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='vehiclephoto',
+            name='phash_band3',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(fill_vin_normalized, migrations.RunPython.noop),
+    ]
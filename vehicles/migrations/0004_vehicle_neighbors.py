@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-19 02:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0003_duplicate_detection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='相似度')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='排名')),
+                ('updated_at', models.DateTimeField(verbose_name='计算时间')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='vehicles.vehicle', verbose_name='相似车辆')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='vehicles.vehicle', verbose_name='车辆')),
+            ],
+            options={
+                'verbose_name': '相似车辆',
+                'verbose_name_plural': '相似车辆',
+                'db_table': 'vehicle_neighbors',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='vehicleneighbor',
+            index=models.Index(fields=['vehicle', 'rank'], name='vehicle_nei_vehicle_65d600_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicleneighbor',
+            index=models.Index(fields=['updated_at'], name='vehicle_nei_updated_523457_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vehicleneighbor',
+            unique_together={('vehicle', 'neighbor')},
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-19 02:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0004_vehicle_neighbors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketComparable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_key', models.CharField(max_length=100, verbose_name='规范化车型名')),
+                ('year_band', models.IntegerField(verbose_name='年份区间起点')),
+                ('mileage_band', models.IntegerField(verbose_name='里程区间起点(km)')),
+                ('count', models.IntegerField(default=0, verbose_name='样本数')),
+                ('listed_count', models.IntegerField(default=0, verbose_name='在售样本数')),
+                ('sold_count', models.IntegerField(default=0, verbose_name='成交样本数')),
+                ('median_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='中位价')),
+                ('q1_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='下四分位价')),
+                ('q3_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='上四分位价')),
+                ('trend', models.FloatField(blank=True, null=True, verbose_name='近期价格变化率')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='market_comparables', to='vehicles.carbrand', verbose_name='品牌')),
+            ],
+            options={
+                'verbose_name': '市场可比价格',
+                'verbose_name_plural': '市场可比价格',
+                'db_table': 'market_comparables',
+                'unique_together': {('brand', 'model_key', 'year_band', 'mileage_band')},
+            },
+        ),
+    ]
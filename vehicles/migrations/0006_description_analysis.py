@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-19 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0005_market_comparables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='accident_level',
+            field=models.CharField(blank=True, choices=[('none', '无事故'), ('minor', '轻微事故'), ('major', '重大事故')], db_index=True, default='', max_length=10, verbose_name='事故情况'),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='description_analysis',
+            field=models.JSONField(blank=True, default=dict, verbose_name='描述分析结果'),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='description_analyzed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='描述分析时间'),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='owner_count',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, null=True, verbose_name='车主数'),
+        ),
+    ]
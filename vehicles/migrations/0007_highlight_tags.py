@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-19 02:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from vehicles.tags import sync_vehicle_tags
+
+
+def fill_vehicle_tags(apps, schema_editor):
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    HighlightTag = apps.get_model('vehicles', 'HighlightTag')
+    VehicleTag = apps.get_model('vehicles', 'VehicleTag')
+    for vehicle_id, highlights in Vehicle.objects.values_list('id', 'highlights').iterator():
+        sync_vehicle_tags(vehicle_id, highlights, HighlightTag, VehicleTag)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0006_description_analysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HighlightTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='标签名')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '亮点标签',
+                'verbose_name_plural': '亮点标签',
+                'db_table': 'highlight_tags',
+            },
+        ),
+        migrations.CreateModel(
+            name='VehicleTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vehicle_links', to='vehicles.highlighttag', verbose_name='标签')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='vehicles.vehicle', verbose_name='车辆')),
+            ],
+            options={
+                'verbose_name': '车辆标签',
+                'verbose_name_plural': '车辆标签',
+                'db_table': 'vehicle_tags',
+            },
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='vehicles', through='vehicles.VehicleTag', to='vehicles.highlighttag', verbose_name='标签'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicletag',
+            index=models.Index(fields=['tag', 'vehicle'], name='vehicle_tag_tag_id_de8491_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vehicletag',
+            unique_together={('vehicle', 'tag')},
+        ),
+        migrations.RunPython(fill_vehicle_tags, migrations.RunPython.noop),
+    ]
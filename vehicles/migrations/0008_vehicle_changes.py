@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-19 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0007_highlight_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehicle_id', models.IntegerField(verbose_name='车辆ID')),
+                ('changed_at', models.DateTimeField(auto_now_add=True, verbose_name='变更时间')),
+            ],
+            options={
+                'verbose_name': '车辆变更记录',
+                'verbose_name_plural': '车辆变更记录',
+                'db_table': 'vehicle_changes',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='vehiclechange',
+            index=models.Index(fields=['changed_at'], name='vehicle_cha_changed_1ede17_idx'),
+        ),
+    ]
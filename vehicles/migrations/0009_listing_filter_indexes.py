@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-19 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0008_vehicle_changes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['review_status', 'status', '-created_at'], name='vehicles_review__13e359_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['review_status', 'status', 'price'], name='vehicles_review__6a1e0f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['review_status', 'status', 'year'], name='vehicles_review__8b14e0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['review_status', 'status', 'mileage'], name='vehicles_review__3685d4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['review_status', 'status', 'brand', 'price'], name='vehicles_review__f130b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['review_status', 'status', 'car_type', 'price'], name='vehicles_review__9d3305_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['review_status', 'status', 'fuel_type', 'transmission', 'price'], name='vehicles_review__a31e8e_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-19 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0009_listing_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='duplicate_flags',
+            field=models.JSONField(blank=True, default=list, verbose_name='重复检测结果'),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='is_suspected_duplicate',
+            field=models.BooleanField(default=False, verbose_name='疑似重复车源'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['review_status', 'is_suspected_duplicate'], name='vehicles_review__9aac04_idx'),
+        ),
+    ]
@@ -63,6 +63,22 @@ class CarType(models.Model):
         return self.name
 
 
+class HighlightTag(models.Model):
+    """
+    亮点标签，由车辆的highlights规范化而来，用于按标签筛选和统计
+    """
+    name = models.CharField(max_length=50, unique=True, verbose_name='标签名')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+
+    class Meta:
+        db_table = 'highlight_tags'
+        verbose_name = '亮点标签'
+        verbose_name_plural = '亮点标签'
+
+    def __str__(self):
+        return self.name
+
+
 class Vehicle(models.Model):
     """
     车辆信息模型
@@ -87,6 +103,7 @@ class Vehicle(models.Model):
 
     # 基本信息
     vin = models.CharField(max_length=30, unique=True, verbose_name='VIN码')
+    vin_normalized = models.CharField(max_length=30, blank=True, default='', db_index=True, verbose_name='规范化VIN码')
     brand = models.ForeignKey(CarBrand, on_delete=models.CASCADE, related_name='vehicles', verbose_name='品牌')
     car_type = models.ForeignKey(CarType, on_delete=models.SET_NULL, null=True, blank=True, related_name='vehicles', verbose_name='车型类型')
     model_name = models.CharField(max_length=100, verbose_name='车型名称')
@@ -106,6 +123,18 @@ class Vehicle(models.Model):
     # 描述信息
     description = models.TextField(verbose_name='车况描述')
     highlights = models.JSONField(default=list, verbose_name='亮点标签')
+    tags = models.ManyToManyField(HighlightTag, through='VehicleTag', related_name='vehicles', blank=True, verbose_name='标签')
+
+    # 车况描述分析结果（由后台任务根据描述生成）
+    ACCIDENT_LEVEL_CHOICES = (
+        ('none', '无事故'),
+        ('minor', '轻微事故'),
+        ('major', '重大事故'),
+    )
+    description_analysis = models.JSONField(default=dict, blank=True, verbose_name='描述分析结果')
+    accident_level = models.CharField(max_length=10, choices=ACCIDENT_LEVEL_CHOICES, blank=True, default='', db_index=True, verbose_name='事故情况')
+    owner_count = models.PositiveSmallIntegerField(null=True, blank=True, db_index=True, verbose_name='车主数')
+    description_analyzed_at = models.DateTimeField(null=True, blank=True, verbose_name='描述分析时间')
 
     # 卖家信息
     seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vehicles', verbose_name='卖家')
@@ -116,6 +145,9 @@ class Vehicle(models.Model):
     # 状态信息
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', verbose_name='车辆状态')
     review_status = models.CharField(max_length=20, choices=REVIEW_STATUS_CHOICES, default='pending', verbose_name='审核状态')
+    # 重复车源检测结果：VIN规范化后相同或照片感知哈希相近的其他车辆
+    is_suspected_duplicate = models.BooleanField(default=False, verbose_name='疑似重复车源')
+    duplicate_flags = models.JSONField(default=list, blank=True, verbose_name='重复检测结果')
     review_notes = models.TextField(null=True, blank=True, verbose_name='审核备注')
 
     # 统计信息
@@ -137,11 +169,51 @@ class Vehicle(models.Model):
             models.Index(fields=['seller', 'status']),
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['-view_count']),
+            models.Index(fields=['created_at']),
+            # 公开列表（审核通过且在售）常用的筛选组合：等值条件在前，区间或排序字段在后
+            models.Index(fields=['review_status', 'status', '-created_at']),
+            models.Index(fields=['review_status', 'status', 'price']),
+            models.Index(fields=['review_status', 'status', 'year']),
+            models.Index(fields=['review_status', 'status', 'mileage']),
+            models.Index(fields=['review_status', 'status', 'brand', 'price']),
+            models.Index(fields=['review_status', 'status', 'car_type', 'price']),
+            models.Index(fields=['review_status', 'status', 'fuel_type', 'transmission', 'price']),
+            # 审核队列按疑似重复筛选
+            models.Index(fields=['review_status', 'is_suspected_duplicate']),
         ]
 
     def __str__(self):
         return f"{self.brand.name} {self.model_name} ({self.year})"
 
+    def save(self, *args, **kwargs):
+        from .duplicates import normalize_vin
+
+        self.vin_normalized = normalize_vin(self.vin)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'vin' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'vin_normalized'}
+        super().save(*args, **kwargs)
+
+
+class VehicleTag(models.Model):
+    """
+    车辆与亮点标签的关联，保存车辆时与highlights同步
+    """
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='tag_links', verbose_name='车辆')
+    tag = models.ForeignKey(HighlightTag, on_delete=models.CASCADE, related_name='vehicle_links', verbose_name='标签')
+
+    class Meta:
+        db_table = 'vehicle_tags'
+        verbose_name = '车辆标签'
+        verbose_name_plural = '车辆标签'
+        unique_together = ('vehicle', 'tag')
+        indexes = [
+            models.Index(fields=['tag', 'vehicle']),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle_id} - {self.tag_id}"
+
 
 class VehiclePhoto(models.Model):
     """
@@ -153,6 +225,13 @@ class VehiclePhoto(models.Model):
     order = models.IntegerField(default=0, verbose_name='排序')
     is_main = models.BooleanField(default=False, verbose_name='是否为主图')
 
+    # 感知哈希（64位dHash的十六进制）及其4个16位分段，分段用于多索引哈希检索相似图片
+    phash = models.CharField(max_length=16, blank=True, default='', verbose_name='感知哈希')
+    phash_band0 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    phash_band1 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    phash_band2 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    phash_band3 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='上传时间')
 
     class Meta:
@@ -209,6 +288,55 @@ class VehiclePriceHistory(models.Model):
         ordering = ['-changed_at']
 
 
+class MarketComparable(models.Model):
+    """
+    市场可比价格统计
+    按 品牌、规范化车型名、年份区间、里程区间 分组，汇总在售车辆标价和近期成交价
+    """
+    brand = models.ForeignKey(CarBrand, on_delete=models.CASCADE, related_name='market_comparables', verbose_name='品牌')
+    model_key = models.CharField(max_length=100, verbose_name='规范化车型名')
+    year_band = models.IntegerField(verbose_name='年份区间起点')
+    mileage_band = models.IntegerField(verbose_name='里程区间起点(km)')
+
+    count = models.IntegerField(default=0, verbose_name='样本数')
+    listed_count = models.IntegerField(default=0, verbose_name='在售样本数')
+    sold_count = models.IntegerField(default=0, verbose_name='成交样本数')
+    median_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='中位价')
+    q1_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='下四分位价')
+    q3_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='上四分位价')
+    trend = models.FloatField(null=True, blank=True, verbose_name='近期价格变化率')
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'market_comparables'
+        verbose_name = '市场可比价格'
+        verbose_name_plural = '市场可比价格'
+        unique_together = ('brand', 'model_key', 'year_band', 'mileage_band')
+
+    def __str__(self):
+        return f"{self.brand_id} {self.model_key} {self.year_band} {self.mileage_band}: {self.median_price}"
+
+
+class VehicleChange(models.Model):
+    """
+    车辆变更记录：在售列表相关字段变化或车辆删除后追加一行，各进程的在售车辆快照按ID顺序读取增量
+    """
+    vehicle_id = models.IntegerField(verbose_name='车辆ID')
+    changed_at = models.DateTimeField(auto_now_add=True, verbose_name='变更时间')
+
+    class Meta:
+        db_table = 'vehicle_changes'
+        verbose_name = '车辆变更记录'
+        verbose_name_plural = '车辆变更记录'
+        indexes = [
+            models.Index(fields=['changed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle_id} @ {self.changed_at}"
+
+
 class Favorite(models.Model):
     """
     用户收藏模型
@@ -232,6 +360,30 @@ class Favorite(models.Model):
         return f"{self.user.username}收藏了{self.vehicle.model_name}"
 
 
+class VehicleNeighbor(models.Model):
+    """
+    协同过滤的相似车辆：基于收藏和浏览行为计算的物品相似度，每辆车保存得分最高的前K个
+    """
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='neighbors', verbose_name='车辆')
+    neighbor = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='+', verbose_name='相似车辆')
+    score = models.FloatField(verbose_name='相似度')
+    rank = models.PositiveSmallIntegerField(verbose_name='排名')
+    updated_at = models.DateTimeField(verbose_name='计算时间')
+
+    class Meta:
+        db_table = 'vehicle_neighbors'
+        verbose_name = '相似车辆'
+        verbose_name_plural = '相似车辆'
+        unique_together = ('vehicle', 'neighbor')
+        indexes = [
+            models.Index(fields=['vehicle', 'rank']),
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle_id} -> {self.neighbor_id} ({self.score:.3f})"
+
+
 class Review(models.Model):
     """
     评价/点评模型
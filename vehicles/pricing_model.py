@@ -0,0 +1,363 @@
+"""
+车辆定价模型
+以已成交订单的成交价为主要目标（在售车辆的标价以较低权重补充样本），由品牌、车型类型、燃油类型、
+变速箱、车龄和里程构造特征，在对数价格上用NumPy求带L2正则的最小二乘闭式解。
+预测区间由残差方差和参数不确定性（x^T A^-1 x）给出；模型保存为npz文件，
+各进程按文件修改时间缓存加载，批量估价为一次矩阵运算
+"""
+import json
+import logging
+import os
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MODEL_VERSION = 'ridge-v1'
+CATEGORICAL_FIELDS = ('brand', 'car_type', 'fuel_type', 'transmission')
+RECORD_FIELDS = CATEGORICAL_FIELDS + ('year', 'mileage')
+OTHER = '__other__'
+ESTIMATE_FIELDS = [
+    'suggested_price', 'min_price', 'max_price', 'confidence_score',
+    'pricing_model', 'pricing_reason', 'updated_at',
+]
+MAX_STORED_PRICE = 99999999.99
+
+# 90%预测区间对应的标准正态分位数
+Z_90 = 1.6449
+
+
+def _category(value):
+    return OTHER if value is None or value == '' else str(value)
+
+
+def vehicle_record(vehicle, reference_year=None):
+    """由车辆实例构造特征记录（只使用外键ID，不触发查询）"""
+    return {
+        'brand': vehicle.brand_id,
+        'car_type': vehicle.car_type_id,
+        'fuel_type': vehicle.fuel_type,
+        'transmission': vehicle.transmission,
+        'year': vehicle.year,
+        'mileage': vehicle.mileage,
+        'reference_year': reference_year or timezone.now().year,
+    }
+
+
+def _numeric_matrix(records):
+    age = np.array([max(0, r['reference_year'] - r['year']) for r in records], dtype=float)
+    mileage = np.array([max(0, r['mileage'] or 0) for r in records], dtype=float) / 10000
+    return np.column_stack([
+        age,
+        age ** 2,
+        np.log1p(mileage),
+        mileage / np.maximum(age, 1),
+    ])
+
+
+def training_data():
+    """
+    收集训练样本，返回 (记录列表, 价格数组, 权重数组)
+    已完成订单按成交时的车龄计算；在售车辆按当前车龄计算，权重为PRICE_MODEL_LISTING_WEIGHT
+    """
+    from orders.models import Order
+    from .models import Vehicle
+
+    fields = ('brand_id', 'car_type_id', 'fuel_type', 'transmission', 'year', 'mileage')
+    current_year = timezone.now().year
+    records, prices, weights = [], [], []
+
+    orders = Order.objects.filter(status='completed', price__gt=0).values_list(
+        'price', 'completed_at', *(f'vehicle__{field}' for field in fields)
+    )
+    for price, completed_at, *values in orders.iterator():
+        record = dict(zip(RECORD_FIELDS, values))
+        record['reference_year'] = completed_at.year if completed_at else current_year
+        records.append(record)
+        prices.append(float(price))
+        weights.append(1.0)
+
+    listing_weight = settings.PRICE_MODEL_LISTING_WEIGHT
+    if listing_weight > 0:
+        listings = Vehicle.objects.filter(status='listed', review_status='approved', price__gt=0).values_list(
+            'price', *fields
+        )
+        for price, *values in listings.iterator():
+            record = dict(zip(RECORD_FIELDS, values))
+            record['reference_year'] = current_year
+            records.append(record)
+            prices.append(float(price))
+            weights.append(listing_weight)
+
+    return records, np.array(prices, dtype=float), np.array(weights, dtype=float)
+
+
+class PriceModel:
+    """
+    对数价格上的岭回归模型
+    vocab为各类别特征的取值列表（出现次数不足的取值归入OTHER），mean/scale用于数值特征标准化，
+    inverse_gram为 (X^T W X + alpha*I)^-1，用于计算预测方差
+    """
+
+    def __init__(self, vocab, mean, scale, coef, inverse_gram, sigma, meta):
+        self.vocab = vocab
+        self.mean = mean
+        self.scale = scale
+        self.coef = coef
+        self.inverse_gram = inverse_gram
+        self.sigma = sigma
+        self.meta = meta
+        self._index = {
+            field: {value: position for position, value in enumerate(values)}
+            for field, values in vocab.items()
+        }
+
+    @property
+    def version(self):
+        return f"{MODEL_VERSION}-{self.meta['trained_at']}"
+
+    def design_matrix(self, records):
+        """构造设计矩阵：截距、标准化后的数值特征、各类别特征的独热编码"""
+        numeric = (_numeric_matrix(records) - self.mean) / self.scale
+        width = 1 + numeric.shape[1] + sum(len(values) for values in self.vocab.values())
+        matrix = np.zeros((len(records), width))
+        matrix[:, 0] = 1.0
+        matrix[:, 1:1 + numeric.shape[1]] = numeric
+
+        offset = 1 + numeric.shape[1]
+        rows = np.arange(len(records))
+        for field in CATEGORICAL_FIELDS:
+            index = self._index[field]
+            other = index[OTHER]
+            columns = np.fromiter(
+                (index.get(_category(record[field]), other) for record in records), dtype=int, count=len(records)
+            )
+            matrix[rows, offset + columns] = 1.0
+            offset += len(index)
+        return matrix
+
+    @classmethod
+    def fit(cls, records, prices, weights, alpha, min_category_count):
+        if len(records) == 0:
+            raise ValueError('没有可用的训练样本')
+
+        vocab = {}
+        for field in CATEGORICAL_FIELDS:
+            values, counts = np.unique([_category(record[field]) for record in records], return_counts=True)
+            vocab[field] = sorted(str(value) for value, count in zip(values, counts) if count >= min_category_count)
+            vocab[field] = [value for value in vocab[field] if value != OTHER] + [OTHER]
+
+        numeric = _numeric_matrix(records)
+        mean = numeric.mean(axis=0)
+        scale = numeric.std(axis=0)
+        scale[scale == 0] = 1.0
+
+        model = cls(vocab, mean, scale, coef=None, inverse_gram=None, sigma=None, meta={})
+        matrix = model.design_matrix(records)
+        target = np.log(prices)
+
+        # 截距不参与正则化
+        penalty = np.full(matrix.shape[1], float(alpha))
+        penalty[0] = 0.0
+        weighted = matrix * weights[:, None]
+        gram = matrix.T @ weighted
+        inverse_gram = np.linalg.pinv(gram + np.diag(penalty))
+        coef = inverse_gram @ (weighted.T @ target)
+
+        residuals = target - matrix @ coef
+        effective_params = float(np.trace(inverse_gram @ gram))
+        dof = max(1.0, weights.sum() - effective_params)
+        sigma = float(np.sqrt((weights * residuals ** 2).sum() / dof))
+
+        model.coef = coef
+        model.inverse_gram = inverse_gram
+        model.sigma = sigma
+        model.meta = {
+            'trained_at': timezone.now().strftime('%Y%m%dT%H%M%S'),
+            'samples': int(len(records)),
+            'alpha': float(alpha),
+            'sigma': sigma,
+        }
+        return model
+
+    def predict(self, records):
+        """
+        批量估价，返回 (价格, 区间下限, 区间上限, 置信度) 四个数组
+        置信度为1减去90%预测区间的相对半宽，样本稀少的类别参数不确定性大，区间更宽、置信度更低
+        """
+        if not records:
+            empty = np.array([])
+            return empty, empty, empty, empty
+        matrix = self.design_matrix(records)
+        log_price = matrix @ self.coef
+        leverage = np.einsum('ij,jk,ik->i', matrix, self.inverse_gram, matrix)
+        spread = Z_90 * self.sigma * np.sqrt(1 + np.maximum(leverage, 0))
+
+        price = np.exp(log_price)
+        low = np.exp(log_price - spread)
+        high = np.exp(log_price + spread)
+        confidence = np.clip(1 - (high - low) / (2 * price), 0, 1)
+        return price, low, high, confidence
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.tmp.npz'
+        np.savez(
+            temp_path,
+            mean=self.mean,
+            scale=self.scale,
+            coef=self.coef,
+            inverse_gram=self.inverse_gram,
+            header=np.array(json.dumps({'vocab': self.vocab, 'sigma': self.sigma, 'meta': self.meta})),
+        )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(str(data['header']))
+            return cls(
+                vocab=header['vocab'],
+                mean=data['mean'],
+                scale=data['scale'],
+                coef=data['coef'],
+                inverse_gram=data['inverse_gram'],
+                sigma=header['sigma'],
+                meta=header['meta'],
+            )
+
+
+def evaluate(records, prices, weights, alpha, min_category_count, holdout=0.2, seed=0):
+    """
+    随机留出holdout比例的样本评估模型，返回留出样本的平均绝对百分比误差和90%区间的实际覆盖率
+    """
+    order = np.random.default_rng(seed).permutation(len(records))
+    split = int(len(records) * (1 - holdout))
+    train_index, test_index = order[:split], order[split:]
+    if len(test_index) == 0 or len(train_index) == 0:
+        return None
+
+    model = PriceModel.fit(
+        [records[i] for i in train_index], prices[train_index], weights[train_index],
+        alpha=alpha, min_category_count=min_category_count,
+    )
+    price, low, high, _ = model.predict([records[i] for i in test_index])
+    actual = prices[test_index]
+    return {
+        'test_samples': int(len(test_index)),
+        'mape': float(np.mean(np.abs(price - actual) / actual)),
+        'coverage': float(np.mean((actual >= low) & (actual <= high))),
+    }
+
+
+class ModelCache:
+    """
+    进程内的模型缓存：每隔check_interval秒检查一次模型文件的修改时间，
+    文件被重新训练的命令替换后自动重新加载
+    """
+
+    def __init__(self, path, check_interval):
+        self.path = str(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._model = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._model
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return self._model
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                self._model, self._mtime = None, None
+                return None
+            if mtime != self._mtime:
+                try:
+                    self._model = PriceModel.load(self.path)
+                    self._mtime = mtime
+                except (OSError, ValueError, KeyError) as e:
+                    logger.error(f"加载定价模型失败: {str(e)}")
+            return self._model
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = 0.0
+
+
+model_cache = ModelCache(settings.PRICE_MODEL_PATH, settings.PRICE_MODEL_RELOAD_INTERVAL)
+
+
+def estimate_records(records):
+    """
+    为一批特征记录估价（一次矩阵运算），返回与records顺序一致的字典列表；
+    模型尚未训练时返回None
+    """
+    model = model_cache.get()
+    if model is None:
+        return None
+    price, low, high, confidence = model.predict(records)
+    return [
+        {
+            'price': round(float(price[i]), 2),
+            'min_price': round(float(low[i]), 2),
+            'max_price': round(float(high[i]), 2),
+            'confidence': round(float(confidence[i]), 2),
+            'model_version': model.version,
+            'reason': f"定价模型基于{model.meta['samples']}个成交及在售样本，按品牌、车型类型、车龄、里程、"
+                      f"燃油类型和变速箱估算，价格区间为90%预测区间",
+        }
+        for i in range(len(records))
+    ]
+
+
+def estimate_prices(vehicles):
+    """为一批车辆估价，见estimate_records"""
+    reference_year = timezone.now().year
+    return estimate_records([vehicle_record(vehicle, reference_year) for vehicle in vehicles])
+
+
+def _decimal_price(value):
+    # VehiclePrice的价格字段最多10位数字（含2位小数）
+    return Decimal(str(min(round(value, 2), MAX_STORED_PRICE)))
+
+
+def save_estimates(vehicles, suggestions, batch_size=500):
+    """
+    将估价写入车辆的VehiclePrice记录：已有记录bulk_update，缺失的bulk_create；
+    vehicles需通过select_related('price_info')加载，返回 (更新数, 新建数)
+    """
+    from .models import VehiclePrice
+
+    now = timezone.now()
+    to_update, to_create = [], []
+    for vehicle, suggestion in zip(vehicles, suggestions):
+        try:
+            price_info = vehicle.price_info
+        except VehiclePrice.DoesNotExist:
+            price_info = VehiclePrice(vehicle=vehicle)
+            to_create.append(price_info)
+        else:
+            to_update.append(price_info)
+        price_info.suggested_price = _decimal_price(suggestion['price'])
+        price_info.min_price = _decimal_price(suggestion['min_price'])
+        price_info.max_price = _decimal_price(suggestion['max_price'])
+        price_info.confidence_score = suggestion['confidence']
+        price_info.pricing_model = suggestion['model_version']
+        price_info.pricing_reason = suggestion['reason']
+        # bulk_update不会触发auto_now
+        price_info.updated_at = now
+
+    VehiclePrice.objects.bulk_update(to_update, ESTIMATE_FIELDS, batch_size=batch_size)
+    VehiclePrice.objects.bulk_create(to_create, batch_size=batch_size)
+    return len(to_update), len(to_create)
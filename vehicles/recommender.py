@@ -0,0 +1,245 @@
+"""
+基于物品的协同过滤推荐
+由收藏和浏览记录构造稀疏的用户-车辆矩阵，按列归一化后用稀疏矩阵乘法计算车辆间的余弦相似度
+（按共同用户数收缩，避免只有一两个共同用户的车辆对得分虚高），每辆车保存得分最高的前K辆在售车辆。
+增量计算只重算上次计算之后有新行为的车辆及与其有共同用户的车辆；取消收藏、浏览记录过期等变化由定期全量计算修正。
+“看了又看”和个性化推荐只查询已保存的相似车辆，不调用AI接口
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from scipy import sparse
+
+from users.models import UserBrowsingHistory
+from .models import Favorite, Vehicle, VehicleNeighbor
+
+logger = logging.getLogger(__name__)
+
+FAVORITE_WEIGHT = 3.0
+VIEW_WEIGHT = 1.0
+# 浏览时长带来的额外权重上限，浏览DURATION_CAP_SECONDS秒及以上时取满
+DURATION_BONUS = 1.0
+DURATION_CAP_SECONDS = 300
+# 每次相乘的行数，限制全量计算时相似度矩阵的内存占用
+SIMILARITY_CHUNK_ROWS = 2000
+WRITE_BATCH_SIZE = 1000
+
+
+def view_weight(duration):
+    return VIEW_WEIGHT + DURATION_BONUS * min(max(duration or 0, 0), DURATION_CAP_SECONDS) / DURATION_CAP_SECONDS
+
+
+def _listed_vehicles():
+    return Vehicle.objects.filter(status='listed', review_status='approved')
+
+
+def interactions():
+    """有效的收藏和最近的浏览记录，返回 (用户ID, 车辆ID, 权重) 三个NumPy数组"""
+    existing = Vehicle.objects.values('id')
+    users, items, weights = [], [], []
+    for user_id, vehicle_id in Favorite.objects.filter(is_active=True).values_list('user_id', 'vehicle_id'):
+        users.append(user_id)
+        items.append(vehicle_id)
+        weights.append(FAVORITE_WEIGHT)
+
+    start = timezone.now() - timedelta(days=settings.RECOMMENDER_VIEW_HISTORY_DAYS)
+    views = UserBrowsingHistory.objects.filter(browse_time__gte=start, vehicle_id__in=existing)
+    for user_id, vehicle_id, duration in views.values_list('user_id', 'vehicle_id', 'duration'):
+        users.append(user_id)
+        items.append(vehicle_id)
+        weights.append(view_weight(duration))
+    return (
+        np.asarray(users, dtype=np.int64),
+        np.asarray(items, dtype=np.int64),
+        np.asarray(weights, dtype=np.float64),
+    )
+
+
+def build_matrix(user_ids, item_ids, weights):
+    """用户-车辆稀疏矩阵（同一用户对同一车辆的权重相加），返回 (CSR矩阵, 各列对应的车辆ID)"""
+    _, user_index = np.unique(user_ids, return_inverse=True)
+    items, item_index = np.unique(item_ids, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (weights, (user_index, item_index)), shape=(int(user_index.max(initial=-1)) + 1, len(items))
+    )
+    matrix.sum_duplicates()
+    return matrix, items
+
+
+def touched_items(since):
+    """since之后有新收藏或浏览的车辆ID"""
+    favorites = Favorite.objects.filter(created_at__gte=since).values_list('vehicle_id', flat=True)
+    views = UserBrowsingHistory.objects.filter(browse_time__gte=since).values_list('vehicle_id', flat=True)
+    return set(favorites) | set(views)
+
+
+def affected_columns(matrix, items, touched):
+    """需要重算的列：有新行为的车辆，以及与其有共同用户（相似度会随之变化）的车辆"""
+    columns = np.flatnonzero(np.isin(items, list(touched)))
+    if not len(columns):
+        return columns
+    users = np.unique(matrix[:, columns].nonzero()[0])
+    return np.unique(matrix[users].nonzero()[1])
+
+
+def similarity_rows(matrix, columns, shrinkage):
+    """
+    指定列与所有列的余弦相似度（len(columns) x 车辆数的稀疏矩阵），
+    按 共同用户数 / (共同用户数 + shrinkage) 收缩
+    """
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    norms[norms == 0] = 1.0
+    normalized = (matrix @ sparse.diags(1.0 / norms)).tocsc()
+    similarity = (normalized[:, columns].T @ normalized).tocsr()
+    if shrinkage > 0:
+        binary = (matrix > 0).astype(np.float64).tocsc()
+        support = (binary[:, columns].T @ binary).tocsr()
+        support.data = support.data / (support.data + shrinkage)
+        similarity = similarity.multiply(support).tocsr()
+    return similarity
+
+
+def top_neighbors(similarity, row_items, items, candidates, top_k, min_score):
+    """每行取得分最高的top_k个候选车辆，返回 {车辆ID: [(相似车辆ID, 得分), ...]}"""
+    result = {}
+    for row, vehicle_id in enumerate(row_items):
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        columns = similarity.indices[start:end]
+        scores = similarity.data[start:end]
+        keep = candidates[columns] & (items[columns] != vehicle_id) & (scores >= min_score)
+        columns, scores = columns[keep], scores[keep]
+        if len(scores) > top_k:
+            selected = np.argpartition(-scores, top_k)[:top_k]
+            columns, scores = columns[selected], scores[selected]
+        order = np.lexsort((items[columns], -scores))
+        if len(order):
+            result[int(vehicle_id)] = list(zip(items[columns[order]].tolist(), scores[order].tolist()))
+    return result
+
+
+def last_computed_at():
+    return VehicleNeighbor.objects.aggregate(latest=Max('updated_at'))['latest']
+
+
+def compute_neighbors(since=None, top_k=None, min_score=None, shrinkage=None):
+    """
+    计算并保存相似车辆。since为None时全量计算，否则只重算since之后有新行为影响到的车辆；
+    返回 {'mode', 'users', 'vehicles', 'recomputed', 'neighbors'} 统计
+    """
+    top_k = top_k or settings.RECOMMENDER_TOP_K
+    min_score = settings.RECOMMENDER_MIN_SCORE if min_score is None else min_score
+    shrinkage = settings.RECOMMENDER_SUPPORT_SHRINKAGE if shrinkage is None else shrinkage
+    # 以开始时间作为本次的计算时间，计算期间产生的行为由下次增量计算处理
+    computed_at = timezone.now()
+
+    matrix, items = build_matrix(*interactions())
+    listed = set(_listed_vehicles().values_list('id', flat=True))
+    candidates = np.isin(items, list(listed))
+
+    if since is None:
+        columns = np.arange(len(items))
+        replaced = None
+    else:
+        touched = touched_items(since)
+        columns = affected_columns(matrix, items, touched)
+        # 有新行为但已不在矩阵中的车辆（如浏览记录指向已删除的车辆）也清除旧结果
+        replaced = set(items[columns].tolist()) | touched
+
+    neighbors = {}
+    for offset in range(0, len(columns), SIMILARITY_CHUNK_ROWS):
+        chunk = columns[offset:offset + SIMILARITY_CHUNK_ROWS]
+        similarity = similarity_rows(matrix, chunk, shrinkage)
+        neighbors.update(top_neighbors(similarity, items[chunk], items, candidates, top_k, min_score))
+
+    count = save_neighbors(neighbors, computed_at, replaced)
+    stats = {
+        'mode': 'full' if since is None else 'incremental',
+        'users': matrix.shape[0],
+        'vehicles': len(items),
+        'recomputed': len(columns),
+        'neighbors': count,
+    }
+    logger.info(f"相似车辆计算完成: {stats}")
+    return stats
+
+
+def save_neighbors(neighbors, computed_at, replaced=None):
+    """替换相似车辆结果，replaced为None时替换全部，否则只替换这些车辆的结果"""
+    rows = [
+        VehicleNeighbor(
+            vehicle_id=vehicle_id, neighbor_id=neighbor_id, score=score, rank=rank, updated_at=computed_at
+        )
+        for vehicle_id, ranked in neighbors.items()
+        for rank, (neighbor_id, score) in enumerate(ranked, 1)
+    ]
+    with transaction.atomic():
+        if replaced is None:
+            VehicleNeighbor.objects.all().delete()
+        else:
+            replaced = list(replaced)
+            for offset in range(0, len(replaced), WRITE_BATCH_SIZE):
+                VehicleNeighbor.objects.filter(vehicle_id__in=replaced[offset:offset + WRITE_BATCH_SIZE]).delete()
+        VehicleNeighbor.objects.bulk_create(rows, batch_size=WRITE_BATCH_SIZE)
+    return len(rows)
+
+
+def _listed_neighbors(vehicle_ids):
+    return VehicleNeighbor.objects.filter(
+        vehicle_id__in=vehicle_ids,
+        neighbor__status='listed',
+        neighbor__review_status='approved',
+    )
+
+
+def also_viewed(vehicle_id, limit):
+    """看了这辆车的用户还看了：在售相似车辆ID，按相似度排序"""
+    return list(
+        _listed_neighbors([vehicle_id]).order_by('rank').values_list('neighbor_id', flat=True)[:limit]
+    )
+
+
+def user_seeds(user):
+    """用户最近收藏和浏览的车辆及其权重"""
+    count = settings.RECOMMENDER_SEED_COUNT
+    seeds = defaultdict(float)
+    favorites = Favorite.objects.filter(user=user, is_active=True).order_by('-created_at')
+    for vehicle_id in favorites.values_list('vehicle_id', flat=True)[:count]:
+        seeds[vehicle_id] += FAVORITE_WEIGHT
+    views = UserBrowsingHistory.objects.filter(user=user).order_by('-browse_time')
+    for vehicle_id, duration in views.values_list('vehicle_id', 'duration')[:count]:
+        seeds[vehicle_id] += view_weight(duration)
+    return seeds
+
+
+def personalized(user, limit):
+    """
+    个性化推荐：按用户最近收藏和浏览的车辆，累加其相似车辆的 行为权重 x 相似度，
+    排除用户已收藏或浏览过的车辆；返回 (车辆ID列表, 用户已有行为的车辆ID集合)
+    """
+    seeds = user_seeds(user)
+    if not seeds:
+        return [], set()
+    scores = defaultdict(float)
+    for vehicle_id, neighbor_id, score in _listed_neighbors(list(seeds)).values_list(
+        'vehicle_id', 'neighbor_id', 'score'
+    ):
+        if neighbor_id not in seeds:
+            scores[neighbor_id] += seeds[vehicle_id] * score
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [vehicle_id for vehicle_id, _ in ranked[:limit]], set(seeds)
+
+
+def popular(limit, exclude=()):
+    """热门在售车辆ID，用于新用户或协同过滤结果不足时补足"""
+    return list(
+        _listed_vehicles()
+        .exclude(id__in=list(exclude))
+        .order_by('-view_count', '-created_at')
+        .values_list('id', flat=True)[:limit]
+    )
@@ -1,5 +1,6 @@
 ﻿from rest_framework import serializers
 from .models import CarBrand, CarType, Vehicle, VehiclePhoto, VehiclePrice, Review, Favorite
+from .market_index import market_position, vehicle_stats
 
 class CarBrandSerializer(serializers.ModelSerializer):
     class Meta:
@@ -27,6 +28,7 @@ class VehicleSerializer(serializers.ModelSerializer):
     photos = VehiclePhotoSerializer(many=True, read_only=True)
     price_info = VehiclePriceSerializer(read_only=True, allow_null=True)
     main_photo = serializers.SerializerMethodField()
+    market_position = serializers.SerializerMethodField()
     status_display = serializers.CharField(source='get_status_display', read_only=True)
 
     class Meta:
@@ -49,6 +51,9 @@ class VehicleSerializer(serializers.ModelSerializer):
             'first_owner_date',
             'description',
             'highlights',
+            'description_analysis',
+            'accident_level',
+            'owner_count',
             'price',
             'status',
             'status_display',
@@ -58,6 +63,7 @@ class VehicleSerializer(serializers.ModelSerializer):
             'main_photo',
             'photos',
             'price_info',
+            'market_position',
             'seller',
             'created_at',
             'updated_at',
@@ -76,6 +82,16 @@ class VehicleSerializer(serializers.ModelSerializer):
                 return url
         return url
 
+    def get_market_position(self, obj):
+        """
+        标价相对同款可比车辆的位置：below_market / fair / above_market，可比样本不足时为None
+        序列化列表时视图在上下文market_stats中传入批量读取的统计 {车辆ID: 统计}
+        """
+        market_stats = self.context.get('market_stats')
+        if market_stats is not None and obj.pk in market_stats:
+            return market_position(obj.price, market_stats[obj.pk])
+        return market_position(obj.price, vehicle_stats(obj))
+
 class ReviewSerializer(serializers.ModelSerializer):
     reviewer_name = serializers.CharField(source='reviewer.username', read_only=True)
 
@@ -0,0 +1,195 @@
+"""
+车辆相关信号处理器
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import market_index
+from .description_analysis import schedule_analysis
+from .duplicate_detection import flag_vehicle, schedule_photo_check
+from .listing_snapshot import LOAD_FIELDS, record_changes
+from .models import Vehicle, VehiclePhoto
+from .similarity_index import similarity_index
+from .tags import sync_vehicle_tags
+
+VEHICLE_MARKET_FIELDS = ('brand_id', 'model_name', 'year', 'mileage', 'price', 'status', 'review_status')
+ORDER_MARKET_FIELDS = ('status', 'price', 'vehicle_id', 'completed_at')
+LISTING_FIELDS = LOAD_FIELDS + ('status', 'review_status')
+
+
+@receiver(post_save, sender=Vehicle)
+def update_similarity_index(sender, instance, **kwargs):
+    """车辆保存的事务提交后更新本进程的相似车辆索引"""
+    transaction.on_commit(lambda: similarity_index.upsert(instance))
+
+
+@receiver(post_delete, sender=Vehicle)
+def remove_from_similarity_index(sender, instance, **kwargs):
+    vehicle_id = instance.pk
+    transaction.on_commit(lambda: similarity_index.remove(vehicle_id))
+
+
+def _field_state(instance, fields):
+    """实例加载时指定字段的值；字段被延迟加载时返回None（视为未知）"""
+    if not instance.pk or instance.get_deferred_fields() & set(fields):
+        return None
+    return tuple(getattr(instance, field) for field in fields)
+
+
+def _refresh_on_commit(keys):
+    transaction.on_commit(lambda: market_index.schedule_refresh(keys))
+
+
+@receiver(post_init, sender=Vehicle)
+def remember_vehicle_market_state(sender, instance, **kwargs):
+    instance._market_state = _field_state(instance, VEHICLE_MARKET_FIELDS)
+    instance._market_key = market_index.vehicle_key(instance) if instance._market_state else None
+
+
+@receiver(post_save, sender=Vehicle)
+def update_vehicle_market_comparables(sender, instance, created, **kwargs):
+    """车辆的车型、年份、里程、标价或状态变化时重算新旧分组"""
+    state = _field_state(instance, VEHICLE_MARKET_FIELDS)
+    if not created and state == getattr(instance, '_market_state', None):
+        return
+    _refresh_on_commit({getattr(instance, '_market_key', None), market_index.vehicle_key(instance)})
+    instance._market_state = state
+    instance._market_key = market_index.vehicle_key(instance)
+
+
+@receiver(post_delete, sender=Vehicle)
+def remove_vehicle_market_comparables(sender, instance, **kwargs):
+    _refresh_on_commit({market_index.vehicle_key(instance)})
+
+
+@receiver(post_init, sender=Vehicle)
+def remember_vehicle_listing_state(sender, instance, **kwargs):
+    instance._listing_state = _field_state(instance, LISTING_FIELDS)
+
+
+@receiver(post_save, sender=Vehicle)
+def record_vehicle_listing_change(sender, instance, created, **kwargs):
+    """在售状态或列表筛选、排序用到的字段变化时写入变更记录，各进程据此更新在售车辆快照"""
+    state = _field_state(instance, LISTING_FIELDS)
+    if not created and state == getattr(instance, '_listing_state', None):
+        return
+    instance._listing_state = state
+    record_changes([instance.pk])
+
+
+@receiver(post_delete, sender=Vehicle)
+def record_vehicle_listing_removal(sender, instance, **kwargs):
+    record_changes([instance.pk])
+
+
+def sync_listing_bulk_update(vehicles):
+    """
+    bulk_update不会触发信号，批量修改已加载车辆的状态、价格等字段后调用：
+    按加载时记录的状态合并需要重算的市场可比价格分组，更新相似车辆索引并写入在售快照的变更记录
+    """
+    vehicles = list(vehicles)
+    keys = set()
+    changed = []
+    for vehicle in vehicles:
+        market_state = _field_state(vehicle, VEHICLE_MARKET_FIELDS)
+        if market_state != getattr(vehicle, '_market_state', None):
+            keys.update({getattr(vehicle, '_market_key', None), market_index.vehicle_key(vehicle)})
+            vehicle._market_state = market_state
+            vehicle._market_key = market_index.vehicle_key(vehicle)
+        listing_state = _field_state(vehicle, LISTING_FIELDS)
+        if listing_state != getattr(vehicle, '_listing_state', None):
+            vehicle._listing_state = listing_state
+            changed.append(vehicle.pk)
+
+    if keys:
+        _refresh_on_commit(keys)
+    record_changes(changed)
+
+    def update_similarity_index():
+        for vehicle in vehicles:
+            similarity_index.upsert(vehicle)
+
+    transaction.on_commit(update_similarity_index)
+
+
+@receiver(post_init, sender=Vehicle)
+def remember_vehicle_description(sender, instance, **kwargs):
+    if instance.pk and 'description' not in instance.get_deferred_fields():
+        instance._analyzed_description = instance.description
+    else:
+        instance._analyzed_description = None
+
+
+@receiver(post_save, sender=Vehicle)
+def analyze_vehicle_description(sender, instance, created, update_fields=None, **kwargs):
+    """车辆创建或描述修改后在后台分析描述"""
+    if update_fields is not None and 'description' not in update_fields:
+        return
+    if not created and instance.description == instance._analyzed_description:
+        return
+    instance._analyzed_description = instance.description
+    vehicle_id = instance.pk
+    transaction.on_commit(lambda: schedule_analysis(vehicle_id))
+
+
+@receiver(post_init, sender=Vehicle)
+def remember_vehicle_highlights(sender, instance, **kwargs):
+    if instance.pk and 'highlights' not in instance.get_deferred_fields():
+        # 保存副本，原地修改列表后仍能识别变化
+        instance._synced_highlights = list(instance.highlights or [])
+    else:
+        instance._synced_highlights = None
+
+
+@receiver(post_save, sender=Vehicle)
+def update_vehicle_tags(sender, instance, created, update_fields=None, **kwargs):
+    """highlights变化时同步标签关联表"""
+    if update_fields is not None and 'highlights' not in update_fields:
+        return
+    highlights = list(instance.highlights or [])
+    if not created and highlights == instance._synced_highlights:
+        return
+    sync_vehicle_tags(instance.pk, highlights)
+    instance._synced_highlights = highlights
+
+
+@receiver(post_save, sender=Vehicle)
+def check_vehicle_duplicates(sender, instance, created, **kwargs):
+    """新提交的车辆在事务提交后按规范化VIN检测重复车源"""
+    if created:
+        vehicle_id = instance.pk
+        transaction.on_commit(lambda: flag_vehicle(vehicle_id))
+
+
+@receiver(post_save, sender=VehiclePhoto)
+def check_photo_duplicates(sender, instance, created, **kwargs):
+    """新上传的车辆照片在事务提交后进入后台重复检测"""
+    if created:
+        photo_id = instance.pk
+        transaction.on_commit(lambda: schedule_photo_check(photo_id))
+
+
+@receiver(post_init, sender='orders.Order')
+def remember_order_market_state(sender, instance, **kwargs):
+    instance._market_state = _field_state(instance, ORDER_MARKET_FIELDS)
+
+
+@receiver(post_save, sender='orders.Order')
+def update_order_market_comparables(sender, instance, created, **kwargs):
+    """订单完成（或已完成订单的成交价变化、订单被撤销完成）时重算车辆所在分组"""
+    old_state = getattr(instance, '_market_state', None)
+    state = _field_state(instance, ORDER_MARKET_FIELDS)
+    instance._market_state = state
+    if created:
+        was_completed = False
+    elif old_state is None:
+        # 加载时状态未知，按可能已完成处理
+        was_completed = True
+    elif old_state == state:
+        return
+    else:
+        was_completed = old_state[0] == 'completed'
+    if instance.status != 'completed' and not was_completed:
+        return
+    _refresh_on_commit({market_index.vehicle_key(instance.vehicle)})
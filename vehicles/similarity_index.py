@@ -0,0 +1,239 @@
+"""
+相似车辆检索索引
+每个进程在内存中保存所有在售车辆的特征：年份、对数里程、对数价格标准化后的连续数值矩阵，
+以及品牌、车型类型、燃油类型、变速箱的类别编码矩阵，按特征分行存储（每个特征是一段连续的NumPy数组）。
+车辆之间的距离为加权独热编码向量的欧氏距离平方：连续特征差的平方和，加上每个不同类别的固定罚分
+（独热编码下两个不同类别的距离平方为 2 x 权重^2），因此无需展开独热矩阵，一次检索只需几次向量运算。
+车辆保存、删除后由信号就地更新本进程的索引（下架的车辆标记删除），
+定期从数据库重建，重建时清除已删除的行并同步其他进程中的变更
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_WEIGHTS = np.array([1.0, 0.8, 1.2], dtype=np.float32)  # 年份、对数里程、对数价格
+CATEGORY_FIELDS = ('brand_id', 'car_type_id', 'fuel_type', 'transmission')
+CATEGORY_WEIGHTS = np.array([1.0, 0.7, 0.5, 0.3], dtype=np.float32)
+CATEGORY_PENALTIES = 2 * CATEGORY_WEIGHTS ** 2
+FUEL_TYPES = ('gasoline', 'diesel', 'electric', 'hybrid')
+TRANSMISSIONS = ('manual', 'auto', 'cvt')
+LOAD_FIELDS = ('id', 'year', 'mileage', 'price') + CATEGORY_FIELDS
+MISSING = -1
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='similar-index')
+
+
+def _choice_code(choices, value):
+    return choices.index(value) if value in choices else MISSING
+
+
+def _raw_numeric(year, mileage, price):
+    return [float(year or 0), np.log1p(max(float(mileage or 0), 0.0)), np.log(max(float(price or 0), 1.0))]
+
+
+def _raw_codes(brand_id, car_type_id, fuel_type, transmission):
+    return [
+        MISSING if brand_id is None else brand_id,
+        MISSING if car_type_id is None else car_type_id,
+        _choice_code(FUEL_TYPES, fuel_type),
+        _choice_code(TRANSMISSIONS, transmission),
+    ]
+
+
+def _row(values):
+    """由 LOAD_FIELDS 顺序的字段值得到 (车辆ID, 连续特征, 类别编码)"""
+    vehicle_id, year, mileage, price, *categories = values
+    return vehicle_id, _raw_numeric(year, mileage, price), _raw_codes(*categories)
+
+
+def _vehicle_row(vehicle):
+    return _row([getattr(vehicle, field) for field in LOAD_FIELDS])
+
+
+def _scaled(raw_numeric, mean, scale):
+    return ((np.asarray(raw_numeric, dtype=np.float64) - mean) * scale).astype(np.float32)
+
+
+def _listed(vehicle):
+    return vehicle.status == 'listed' and vehicle.review_status == 'approved'
+
+
+class SimilarityIndex:
+    """
+    相似车辆索引：ids、active 与 numeric、codes 的各列按车辆对齐，前size个有效；
+    追加时容量不足则成倍扩容（替换为新数组，正在检索的线程仍持有旧数组）
+    """
+
+    def __init__(self, refresh_interval, compact_ratio):
+        self.refresh_interval = refresh_interval
+        self.compact_ratio = compact_ratio
+        self.lock = threading.RLock()
+        self.built_at = None
+        self.refreshing = False
+        # 后台重建期间的变更，重建完成后重放，避免被重建前读取的数据覆盖
+        self.replay = []
+        self._reset(np.zeros(0, dtype=np.int64), np.zeros((0, 3)), np.zeros((0, 4)))
+
+    def _reset(self, ids, raw_numeric, codes):
+        capacity = max(len(ids), 16)
+        numeric = np.asarray(raw_numeric, dtype=np.float64).reshape(-1, 3)
+        self.mean = numeric.mean(axis=0) if len(numeric) else np.zeros(3)
+        std = numeric.std(axis=0) if len(numeric) else np.ones(3)
+        self.scale = NUMERIC_WEIGHTS / np.where(std > 0, std, 1.0)
+
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.numeric = np.zeros((3, capacity), dtype=np.float32)
+        self.codes = np.full((4, capacity), MISSING, dtype=np.int32)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.size = len(ids)
+        self.ids[:self.size] = ids
+        self.numeric[:, :self.size] = self._scale(numeric).T
+        self.codes[:, :self.size] = np.asarray(codes, dtype=np.int32).reshape(-1, 4).T
+        self.active[:self.size] = True
+        self.positions = {int(vehicle_id): row for row, vehicle_id in enumerate(ids)}
+        self.deleted = 0
+
+    def _scale(self, raw_numeric):
+        return _scaled(raw_numeric, self.mean, self.scale)
+
+    def build(self):
+        """从数据库重建索引（同时清除已删除的行）"""
+        from .models import Vehicle
+
+        rows = [
+            _row(values) for values in
+            Vehicle.objects.filter(status='listed', review_status='approved').values_list(*LOAD_FIELDS)
+        ]
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        numeric = [row[1] for row in rows]
+        codes = [row[2] for row in rows]
+        with self.lock:
+            self._reset(ids, numeric, codes)
+            self.built_at = time.monotonic()
+        logger.info(f"相似车辆索引已重建: {len(ids)} 辆在售车辆")
+
+    def _grow(self):
+        capacity = len(self.ids) * 2
+        for name in ('ids', 'numeric', 'codes', 'active'):
+            current = getattr(self, name)
+            grown = np.zeros(current.shape[:-1] + (capacity,), dtype=current.dtype)
+            grown[..., :self.size] = current[..., :self.size]
+            setattr(self, name, grown)
+
+    def upsert(self, vehicle):
+        """车辆保存后更新索引：在售车辆写入（已存在时原地覆盖），其余状态标记删除"""
+        if self.built_at is None:
+            return
+        if not _listed(vehicle):
+            self.remove(vehicle.pk)
+            return
+        vehicle_id, numeric, codes = _vehicle_row(vehicle)
+        with self.lock:
+            if self.refreshing:
+                self.replay.append(vehicle)
+            row = self.positions.get(vehicle_id)
+            if row is None:
+                if self.size == len(self.ids):
+                    self._grow()
+                row = self.size
+                self.ids[row] = vehicle_id
+                self.positions[vehicle_id] = row
+                self.size += 1
+            self.numeric[:, row] = self._scale(numeric)
+            self.codes[:, row] = codes
+            self.active[row] = True
+
+    def remove(self, vehicle_id):
+        with self.lock:
+            if self.refreshing:
+                self.replay.append(vehicle_id)
+            row = self.positions.pop(vehicle_id, None)
+            if row is not None:
+                self.active[row] = False
+                self.deleted += 1
+
+    def _stale(self):
+        if self.built_at is None:
+            return True
+        if time.monotonic() - self.built_at >= self.refresh_interval:
+            return True
+        return self.deleted > max(self.size * self.compact_ratio, 100)
+
+    def _refresh_task(self):
+        close_old_connections()
+        try:
+            self.build()
+        except Exception as e:
+            logger.error(f"重建相似车辆索引失败: {str(e)}")
+        finally:
+            with self.lock:
+                self.refreshing = False
+                replay, self.replay = self.replay, []
+                for change in replay:
+                    if isinstance(change, int):
+                        self.remove(change)
+                    else:
+                        self.upsert(change)
+            close_old_connections()
+
+    def ensure_fresh(self):
+        """首次使用时同步构建；之后到期或已删除行过多时在后台重建，重建期间继续使用当前索引"""
+        if self.built_at is None:
+            with self.lock:
+                if self.built_at is None:
+                    self.build()
+            return
+        if self._stale() and not self.refreshing:
+            with self.lock:
+                if self.refreshing:
+                    return
+                self.refreshing = True
+                self.replay = []
+            _executor.submit(self._refresh_task)
+
+    def similar(self, vehicle, limit):
+        """与给定车辆最相似的在售车辆ID（不含自身），按距离升序"""
+        self.ensure_fresh()
+        # 在锁内一次取出数组引用、行数和缩放参数：扩容和重建逐个替换这些属性，
+        # 分别读取可能得到长度不一致的数组或新旧不同的缩放；计算在锁外进行
+        with self.lock:
+            ids, numeric, codes, active = self.ids, self.numeric, self.codes, self.active
+            size, mean, scale = self.size, self.mean, self.scale
+        if not size:
+            return []
+        vehicle_id, raw_numeric, raw_codes = _vehicle_row(vehicle)
+        query_numeric = _scaled(raw_numeric, mean, scale)
+
+        # 逐个特征累加到同一个缓冲区，避免生成 车辆数 x 特征数 的中间矩阵
+        distances = np.empty(size, dtype=np.float32)
+        buffer = np.empty(size, dtype=np.float32)
+        for feature in range(3):
+            np.subtract(numeric[feature, :size], query_numeric[feature], out=buffer)
+            np.multiply(buffer, buffer, out=buffer)
+            if feature:
+                distances += buffer
+            else:
+                distances[:] = buffer
+        for feature, code in enumerate(raw_codes):
+            distances += CATEGORY_PENALTIES[feature] * (codes[feature, :size] != code)
+        distances[~active[:size]] = np.inf
+        distances[ids[:size] == vehicle_id] = np.inf
+
+        limit = min(limit, size)
+        candidates = np.argpartition(distances, limit - 1)[:limit]
+        candidates = candidates[np.argsort(distances[candidates], kind='stable')]
+        candidates = candidates[np.isfinite(distances[candidates])]
+        return ids[candidates].tolist()
+
+
+similarity_index = SimilarityIndex(
+    refresh_interval=settings.SIMILAR_INDEX_REFRESH_INTERVAL,
+    compact_ratio=settings.SIMILAR_INDEX_COMPACT_RATIO,
+)
@@ -0,0 +1,86 @@
+"""
+亮点标签索引
+车辆的highlights（JSON列表）规范化后写入标签表和车辆-标签关联表，
+按标签筛选和统计标签数量走 (tag, vehicle) 索引，不需要扫描JSON字段
+"""
+import unicodedata
+
+from django.db.models import Count
+
+TAG_MAX_LENGTH = 50
+
+
+def normalize_tag(value):
+    """规范化标签：全角转半角、合并空白，超长截断；非字符串或空标签返回空字符串"""
+    if not isinstance(value, str):
+        return ''
+    return ' '.join(unicodedata.normalize('NFKC', value).split())[:TAG_MAX_LENGTH]
+
+
+def normalize_tags(values):
+    """规范化并去重，保持原有顺序"""
+    if not isinstance(values, (list, tuple)):
+        return []
+    names = (normalize_tag(value) for value in values)
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def sync_vehicle_tags(vehicle_id, highlights, tag_model=None, link_model=None):
+    """按highlights更新车辆的标签关联，只增删有变化的行；迁移中传入历史模型"""
+    from .models import HighlightTag, VehicleTag
+
+    tag_model = tag_model or HighlightTag
+    link_model = link_model or VehicleTag
+
+    names = normalize_tags(highlights)
+    tag_ids = dict(tag_model.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = [name for name in names if name not in tag_ids]
+    if missing:
+        tag_model.objects.bulk_create([tag_model(name=name) for name in missing], ignore_conflicts=True)
+        tag_ids.update(tag_model.objects.filter(name__in=missing).values_list('name', 'id'))
+
+    wanted = set(tag_ids.values())
+    current = set(link_model.objects.filter(vehicle_id=vehicle_id).values_list('tag_id', flat=True))
+    if current - wanted:
+        link_model.objects.filter(vehicle_id=vehicle_id, tag_id__in=current - wanted).delete()
+    if wanted - current:
+        link_model.objects.bulk_create(
+            [link_model(vehicle_id=vehicle_id, tag_id=tag_id) for tag_id in wanted - current],
+            ignore_conflicts=True,
+        )
+
+
+def parse_tags(value):
+    """解析查询参数中逗号分隔的标签"""
+    return normalize_tags((value or '').replace('，', ',').split(','))
+
+
+def filter_by_tags(queryset, names, match_all=True):
+    """
+    按标签筛选车辆：match_all为True时须包含全部标签（AND），否则包含任一标签（OR）。
+    先在关联表上按标签ID取车辆ID（走 (tag, vehicle) 索引），再作为子查询过滤
+    """
+    from .models import HighlightTag, VehicleTag
+
+    tag_ids = list(HighlightTag.objects.filter(name__in=names).values_list('id', flat=True))
+    if match_all and len(tag_ids) < len(names):
+        return queryset.none()
+    vehicle_ids = VehicleTag.objects.filter(tag_id__in=tag_ids).values('vehicle_id')
+    if match_all and len(tag_ids) > 1:
+        vehicle_ids = vehicle_ids.annotate(matched=Count('tag_id')).filter(matched=len(tag_ids))
+    return queryset.filter(id__in=vehicle_ids.values('vehicle_id'))
+
+
+def tag_counts(queryset, limit=None):
+    """统计queryset中各标签的车辆数，按数量降序，返回 [{'name': 标签, 'count': 数量}, ...]"""
+    from .models import VehicleTag
+
+    counts = (
+        VehicleTag.objects.filter(vehicle_id__in=queryset.order_by().values('id'))
+        .values('tag__name')
+        .annotate(count=Count('vehicle_id'))
+        .order_by('-count', 'tag__name')
+    )
+    if limit:
+        counts = counts[:limit]
+    return [{'name': row['tag__name'], 'count': row['count']} for row in counts]
@@ -0,0 +1,210 @@
+"""
+车辆模块测试
+"""
+import io
+import shutil
+import tempfile
+from datetime import date
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from users.models import User
+from .duplicate_detection import flag_vehicle
+from .duplicates import hash_photo
+from .filters import CHOICE_FILTERS, ID_FILTERS, RANGE_FILTERS, condition_q, parse_conditions
+from .market_index import vehicle_key, vehicles_stats
+from .models import CarBrand, MarketComparable, Vehicle, VehiclePhoto
+from .serializers import VehicleSerializer
+
+
+def create_vehicle(seller, brand, vin, **fields):
+    values = {
+        'model_name': 'Corolla', 'year': 2020, 'color': '白色', 'transmission': 'auto',
+        'emission_standard': 'euro6', 'fuel_type': 'gasoline', 'mileage': 30000,
+        'plate_date': date(2020, 6, 1), 'description': '一手车，按时保养', 'price': 98000,
+        'status': 'pending_review', 'review_status': 'pending',
+    }
+    values.update(fields)
+    return Vehicle.objects.create(seller=seller, brand=brand, vin=vin, **values)
+
+
+def gradient_image(name, shift=0):
+    image = Image.new('RGB', (64, 48))
+    image.putdata([((x * 4 + shift) % 256, y * 5, 128) for y in range(48) for x in range(64)])
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class DuplicateListingTests(TestCase):
+    """疑似重复车源标记在管理后台的车辆审核队列上"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.brand = CarBrand.objects.create(name='丰田', country='日本')
+        self.seller = User.objects.create_user(username='seller01', password='Passw0rd!123')
+        self.other_seller = User.objects.create_user(username='seller02', password='Passw0rd!123')
+        self.admin = User.objects.create_user(username='admin01', password='Passw0rd!123', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.original = create_vehicle(
+            self.seller, self.brand, 'LVGBE40K8GP123456', status='listed', review_status='approved'
+        )
+
+    def review_queue(self, **params):
+        response = self.client.get('/api/admin/vehicle-reviews/', params)
+        self.assertEqual(response.status_code, 200)
+        return {item['id']: item for item in response.data['results']}
+
+    def test_vin_variant_is_flagged_on_submission(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            duplicate = create_vehicle(self.other_seller, self.brand, 'lvgbe40k8gp-I23456')
+            clean = create_vehicle(self.other_seller, self.brand, 'LFV2A21K5F3012345')
+
+        queue = self.review_queue(suspected_duplicate='true')
+        self.assertEqual(list(queue), [duplicate.id])
+        flags = queue[duplicate.id]['duplicate_flags']
+        self.assertEqual(flags[0]['type'], 'vin')
+        self.assertEqual(flags[0]['vehicle_id'], self.original.id)
+        self.assertFalse(flags[0]['same_seller'])
+        self.assertIn(clean.id, self.review_queue())
+
+    def test_reused_photo_is_flagged(self):
+        original_photo = VehiclePhoto.objects.create(vehicle=self.original, image=gradient_image('a.png'))
+        hash_photo(original_photo)
+
+        duplicate = create_vehicle(self.other_seller, self.brand, 'LFV2A21K5F3054321')
+        photo = VehiclePhoto.objects.create(vehicle=duplicate, image=gradient_image('b.png', shift=1))
+        # 与后台线程中的照片检测相同的步骤
+        hash_photo(photo)
+        flags = flag_vehicle(duplicate.id)
+
+        self.assertEqual(flags[0]['type'], 'photo')
+        self.assertEqual(flags[0]['matched_photo_id'], original_photo.id)
+        queue = self.review_queue(suspected_duplicate='true')
+        self.assertEqual(queue[duplicate.id]['duplicate_flags'], flags)
+
+    def test_reviewed_vehicles_are_not_flagged(self):
+        self.assertEqual(flag_vehicle(self.original.id), [])
+        self.original.refresh_from_db()
+        self.assertFalse(self.original.is_suspected_duplicate)
+
+
+class MarketStatsPrefetchTests(TestCase):
+    """序列化车辆列表时整页的市场可比统计一次读取"""
+
+    def setUp(self):
+        cache.clear()
+        brand = CarBrand.objects.create(name='丰田', country='日本')
+        seller = User.objects.create_user(username='seller01', password='Passw0rd!123')
+        self.vehicles = [
+            create_vehicle(seller, brand, f'LVGBE40K8GP12345{index}', model_name=f'Model{index}', price=price)
+            for index, price in enumerate((80000, 100000, 130000, 100000))
+        ]
+        # 最后一辆车的分组样本不足
+        for vehicle, count in zip(self.vehicles, (10, 10, 10, 2)):
+            brand_id, model_key, year_band, mileage_band = vehicle_key(vehicle)
+            MarketComparable.objects.create(
+                brand_id=brand_id, model_key=model_key, year_band=year_band, mileage_band=mileage_band,
+                count=count, listed_count=count, median_price=100000, q1_price=90000, q3_price=110000,
+            )
+
+    def test_page_stats_are_read_in_one_query(self):
+        with self.assertNumQueries(1):
+            stats = vehicles_stats(self.vehicles)
+        with self.assertNumQueries(0):
+            self.assertEqual(vehicles_stats(self.vehicles), stats)
+        self.assertIsNone(stats[self.vehicles[3].id])
+
+        serializer = VehicleSerializer(self.vehicles, many=True, context={'market_stats': stats})
+        with self.assertNumQueries(0):
+            positions = [serializer.child.get_market_position(vehicle) for vehicle in self.vehicles]
+        self.assertEqual(positions, ['below_market', 'fair', 'above_market', None])
+
+
+class ConditionFilterTests(TestCase):
+    """车况筛选参数在 parse_conditions 中校验，不合法时返回400"""
+
+    def setUp(self):
+        brand = CarBrand.objects.create(name='丰田', country='日本')
+        seller = User.objects.create_user(username='seller01', password='Passw0rd!123')
+        listed = {'status': 'listed', 'review_status': 'approved'}
+        self.clean = create_vehicle(seller, brand, 'LVGBE40K8GP123450', accident_level='none', owner_count=1, **listed)
+        self.minor = create_vehicle(seller, brand, 'LVGBE40K8GP123451', accident_level='minor', owner_count=3, **listed)
+
+    def listing(self, **params):
+        return self.client.get('/api/vehicles/', params)
+
+    def test_invalid_values_return_400(self):
+        for params, name in (({'max_owners': 'abc'}, 'max_owners'), ({'max_owners': '-1'}, 'max_owners'),
+                             ({'accident': 'none,severe'}, 'accident')):
+            response = self.listing(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(name, response.json())
+
+    def test_valid_values_filter_the_listing(self):
+        response = self.listing(max_owners='2')
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.clean.id])
+        response = self.listing(accident='minor,major')
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.minor.id])
+
+
+class ListingIndexTests(TestCase):
+    """公开列表的常用筛选组合和排序使用预期的 (review_status, status, ...) 复合索引"""
+
+    # (查询参数, 排序, 预期索引)：排序默认为 -created_at；没有专用索引的条件（变速箱单独筛选、排放标准、颜色）
+    # 按排序字段的索引读取
+    COMBINATIONS = (
+        ('', '-created_at', 'vehicles_review__13e359_idx'),
+        ('', 'price', 'vehicles_review__6a1e0f_idx'),
+        ('', 'mileage', 'vehicles_review__3685d4_idx'),
+        ('min_price=50000&max_price=100000', 'price', 'vehicles_review__6a1e0f_idx'),
+        ('year_min=2015&year_max=2020', '-created_at', 'vehicles_review__8b14e0_idx'),
+        ('min_mileage=10000&max_mileage=60000', 'mileage', 'vehicles_review__3685d4_idx'),
+        ('brand=1', 'price', 'vehicles_review__f130b8_idx'),
+        ('brand=1&min_price=50000&max_price=100000', '-created_at', 'vehicles_review__f130b8_idx'),
+        ('car_type=1&min_price=50000', 'price', 'vehicles_review__9d3305_idx'),
+        ('fuel_type=gasoline&transmission=auto', 'price', 'vehicles_review__a31e8e_idx'),
+        ('fuel_type=gasoline&transmission=auto&max_price=100000', '-created_at', 'vehicles_review__a31e8e_idx'),
+        ('transmission=auto', '-created_at', 'vehicles_review__13e359_idx'),
+        ('emission_standard=euro6', '-created_at', 'vehicles_review__13e359_idx'),
+        ('color=白色', 'price', 'vehicles_review__6a1e0f_idx'),
+    )
+
+    def test_combinations_cover_every_filter(self):
+        params = set()
+        for query, _, _ in self.COMBINATIONS:
+            params.update(QueryDict(query))
+        expected = {lower for _, _, lower, _, _ in RANGE_FILTERS} | {name for name, _ in ID_FILTERS} | set(CHOICE_FILTERS)
+        self.assertLessEqual(expected, params)
+        index_names = {index.name for index in Vehicle._meta.indexes}
+        for _, _, index in self.COMBINATIONS:
+            self.assertIn(index, index_names)
+
+    def test_combinations_use_expected_index(self):
+        listed = Vehicle.objects.filter(review_status='approved', status='listed')
+        for query, ordering, index in self.COMBINATIONS:
+            with self.subTest(query=query, ordering=ordering):
+                queryset = listed
+                for condition in parse_conditions(QueryDict(query)).values():
+                    queryset = queryset.filter(condition_q(*condition))
+                # 各数据库的执行计划格式不同，只检查其中的索引名
+                plan = queryset.order_by(ordering).explain()
+                self.assertIn(index, plan)
@@ -1,14 +1,23 @@
 ﻿from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from django.conf import settings
 from django.db.models import Q
 from django.utils import timezone
 from django.http import QueryDict
 import uuid
 import json
 from datetime import date
+from users.search_trends import record_search, search_trends
+from . import recommender
+from .facets import cached_facets
+from .filters import condition_q, parse_conditions
+from .market_index import vehicles_stats
+from .listing_snapshot import SORT_FIELDS, SnapshotResults, listing_snapshot
+from .similarity_index import similarity_index
+from .tags import filter_by_tags, parse_tags, tag_counts
 from .models import CarBrand, CarType, Vehicle, VehiclePhoto, VehiclePrice, Review, Favorite
 from .serializers import (
     CarBrandSerializer, CarTypeSerializer, VehicleSerializer,
@@ -27,6 +36,10 @@ class CarTypeViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = CarTypeSerializer
     permission_classes = [AllowAny]
 
+# 只能由数据库完成的筛选（关键词、标签、车况描述分析结果），带有这些参数时列表不使用快照
+SNAPSHOT_UNSUPPORTED_PARAMS = ("search", "tags", "accident", "max_owners")
+
+
 class VehicleViewSet(viewsets.ModelViewSet):
     serializer_class = VehicleSerializer
     permission_classes = [AllowAny]
@@ -40,6 +53,16 @@ class VehicleViewSet(viewsets.ModelViewSet):
             return VehicleCreateSerializer
         return VehicleSerializer
 
+    def get_serializer(self, *args, **kwargs):
+        """序列化多辆车辆时一次读取全部车辆的市场可比统计，通过上下文传给序列化器"""
+        if kwargs.get('many') and args and self.get_serializer_class() is VehicleSerializer:
+            vehicles = list(args[0])
+            kwargs.setdefault('context', {
+                **self.get_serializer_context(), 'market_stats': vehicles_stats(vehicles),
+            })
+            args = (vehicles, *args[1:])
+        return super().get_serializer(*args, **kwargs)
+
     def get_permissions(self):
         """设置权限：查看允许任何人，创建和编辑需要登录和权限"""
         # 对于以下操作需要认证：
@@ -50,8 +73,84 @@ class VehicleViewSet(viewsets.ModelViewSet):
             self.action in ['create', 'update', 'partial_update', 'destroy']):
             from rest_framework.permissions import IsAuthenticated
             return [IsAuthenticated()]
+        if self.action == 'zero_result_searches':
+            return [IsAdminUser()]
         return super().get_permissions()
 
+    def list(self, request, *args, **kwargs):
+        vehicle_ids = self._snapshot_ids()
+        if vehicle_ids is None:
+            response = super().list(request, *args, **kwargs)
+        else:
+            # 筛选、排序在快照上完成，只读取当前页的车辆
+            results = SnapshotResults(vehicle_ids, self.get_queryset())
+            page = self.paginate_queryset(results)
+            if page is None:
+                response = Response(self.get_serializer(results[:], many=True).data)
+            else:
+                response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        self._record_search(request, response)
+        return response
+
+    def _snapshot_ids(self):
+        """公开列表的筛选条件和排序都能在在售车辆快照上完成时，返回排好序的车辆ID数组，否则返回None"""
+        request = self.request
+        if request.path.startswith("/api/seller/") or self.action != "list":
+            return None
+        if any(request.query_params.get(name) for name in SNAPSHOT_UNSUPPORTED_PARAMS):
+            return None
+        ordering = request.query_params.get("ordering") or "-created_at"
+        if ordering.lstrip("-") not in SORT_FIELDS:
+            return None
+        conditions = self._filter_conditions()
+        if not settings.LISTING_SNAPSHOT_ENABLED or not listing_snapshot.ensure_fresh():
+            return None
+        return listing_snapshot.select(conditions.values(), ordering)
+
+    def _record_search(self, request, response):
+        """异步记录公开列表中的关键词搜索及结果数量"""
+        keyword = request.query_params.get("search")
+        if not keyword or response.status_code != status.HTTP_200_OK:
+            return
+        if request.path.startswith("/api/seller/"):
+            return
+
+        page = getattr(self.paginator, 'page', None) if self.paginator else None
+        if page is not None:
+            result_count = page.paginator.count
+        else:
+            result_count = len(response.data)
+
+        search_params = {
+            key: value for key, value in request.query_params.items()
+            if key not in ('search', 'page', 'page_size')
+        }
+        record_search(request.user, keyword, search_params, result_count)
+
+    @action(detail=False, methods=['get'])
+    def trending_searches(self, request):
+        """热门搜索词 GET /api/vehicles/trending_searches/?window=day&limit=10"""
+        return self._search_trend_response(request, search_trends.top_searches)
+
+    @action(detail=False, methods=['get'])
+    def zero_result_searches(self, request):
+        """零结果搜索词报告（管理员） GET /api/vehicles/zero_result_searches/?window=day"""
+        return self._search_trend_response(request, search_trends.top_zero_result_searches)
+
+    def _search_trend_response(self, request, report):
+        window = request.query_params.get('window', 'day')
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            limit = 10
+
+        try:
+            items = report(window, limit)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'window': window, 'results': items})
+
     def perform_update(self, serializer):
         """确保只有车辆所有者可以编辑"""
         vehicle = self.get_object()
@@ -157,6 +256,13 @@ class VehicleViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Return vehicles for public listings or seller-specific management."""
+        queryset = self._listing_queryset()
+        for condition in self._facet_filters().values():
+            queryset = queryset.filter(condition)
+        return queryset.select_related("brand", "car_type", "seller").prefetch_related("photos").order_by("-created_at")
+
+    def _listing_queryset(self):
+        """公开列表或卖家自己的车辆，应用分面维度以外的筛选条件"""
         request = self.request
         user = request.user
         is_seller_context = request.path.startswith("/api/seller/") or request.path.endswith("/my_vehicles/")
@@ -171,23 +277,11 @@ class VehicleViewSet(viewsets.ModelViewSet):
         else:
             queryset = Vehicle.objects.filter(review_status="approved", status="listed")
 
-        brand_id = request.query_params.get("brand")
-        if brand_id:
-            queryset = queryset.filter(brand_id=brand_id)
-
-        min_price = request.query_params.get("min_price")
-        max_price = request.query_params.get("max_price")
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
-
-        year_min = request.query_params.get("year_min")
-        year_max = request.query_params.get("year_max")
-        if year_min:
-            queryset = queryset.filter(year__gte=year_min)
-        if year_max:
-            queryset = queryset.filter(year__lte=year_max)
+        # 亮点标签筛选：?tags=a,b，tag_mode=all（默认，须包含全部标签）或any（包含任一标签）
+        tags = parse_tags(request.query_params.get("tags"))
+        if tags:
+            match_all = request.query_params.get("tag_mode", "all") != "any"
+            queryset = filter_by_tags(queryset, tags, match_all=match_all)
 
         search_query = request.query_params.get("search")
         if search_query:
@@ -200,8 +294,17 @@ class VehicleViewSet(viewsets.ModelViewSet):
                     Q(description__icontains=search_query) |
                     Q(vin__icontains=search_query)
                 )
+        return queryset
 
-        return queryset.select_related("brand", "car_type", "seller").prefetch_related("photos").order_by("-created_at")
+    def _filter_conditions(self):
+        """
+        列表筛选条件 {条件名: (字段, 'in', 取值列表) 或 (字段, 'range', (下限, 上限))}，参数不合法时返回400；
+        分面统计时每个分面不应用自身的条件
+        """
+        return parse_conditions(self.request.query_params)
+
+    def _facet_filters(self):
+        return {name: condition_q(*condition) for name, condition in self._filter_conditions().items()}
 
     @action(detail=True, methods=['post'])
     def favorite(self, request, pk=None):
@@ -249,6 +352,75 @@ class VehicleViewSet(viewsets.ModelViewSet):
         serializer = VehiclePhotoSerializer(photos, many=True)
         return Response(serializer.data)
 
+    def _limit_param(self, request, default=10, maximum=50):
+        try:
+            return max(1, min(int(request.query_params.get('limit', default)), maximum))
+        except ValueError:
+            return default
+
+    def _vehicles_by_ids(self, vehicle_ids):
+        """按给定顺序序列化在售车辆"""
+        vehicles = Vehicle.objects.filter(id__in=vehicle_ids).select_related(
+            "brand", "car_type", "seller"
+        ).prefetch_related("photos").in_bulk()
+        ordered = [vehicles[vehicle_id] for vehicle_id in vehicle_ids if vehicle_id in vehicles]
+        context = {**self.get_serializer_context(), 'market_stats': vehicles_stats(ordered)}
+        return VehicleSerializer(ordered, many=True, context=context).data
+
+    @action(detail=True, methods=['get'])
+    def also_viewed(self, request, pk=None):
+        """看了这辆车的用户还看了 GET /api/vehicles/{id}/also_viewed/?limit=10"""
+        vehicle = self.get_object()
+        vehicle_ids = recommender.also_viewed(vehicle.id, self._limit_param(request))
+        return Response({'results': self._vehicles_by_ids(vehicle_ids)})
+
+    @action(detail=False, methods=['get'])
+    def tag_facets(self, request):
+        """
+        标签统计 GET /api/vehicles/tag_facets/?limit=30
+        按当前的其他筛选条件统计各亮点标签的车辆数
+        """
+        limit = self._limit_param(request, default=30, maximum=200)
+        return Response({'results': tag_counts(self.get_queryset(), limit)})
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        分面统计 GET /api/vehicles/facets/?brand=1&min_price=50000
+        返回品牌、车型类型、燃油类型、变速箱、排放标准和价格、年份、里程区间的车辆数，
+        每个分面按除自身以外的当前筛选条件统计
+        """
+        params = [
+            (key, values) for key, values in request.query_params.lists()
+            if key not in ("page", "page_size", "ordering")
+        ]
+        # 卖家后台统计的是自己的车辆，缓存按卖家区分
+        if request.path.startswith("/api/seller/"):
+            params.append(("seller", [request.user.pk]))
+        return Response(cached_facets(self._listing_queryset(), self._facet_filters(), params))
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """配置相近的在售车辆 GET /api/vehicles/{id}/similar/?limit=10"""
+        vehicle = self.get_object()
+        vehicle_ids = similarity_index.similar(vehicle, self._limit_param(request))
+        return Response({'results': self._vehicles_by_ids(vehicle_ids)})
+
+    @action(detail=False, methods=['get'])
+    def recommended(self, request):
+        """
+        个性化推荐 GET /api/vehicles/recommended/?limit=10
+        根据当前用户的收藏和浏览记录推荐，未登录或结果不足时用热门在售车辆补足
+        """
+        limit = self._limit_param(request)
+        vehicle_ids, seen = [], set()
+        if request.user.is_authenticated:
+            vehicle_ids, seen = recommender.personalized(request.user, limit)
+        source = 'collaborative' if vehicle_ids else 'popular'
+        if len(vehicle_ids) < limit:
+            vehicle_ids += recommender.popular(limit - len(vehicle_ids), exclude=seen | set(vehicle_ids))
+        return Response({'source': source, 'results': self._vehicles_by_ids(vehicle_ids)})
+
 class VehiclePhotoViewSet(viewsets.ModelViewSet):
     serializer_class = VehiclePhotoSerializer
     permission_classes = [IsAuthenticated]